@@ -1,64 +1,231 @@
 # A2A_client.py (Verbose Version)
+import argparse
 import asyncio
+import json
 import os
-import sys # <-- NEW: Import sys to read command-line arguments
-from a2a_utils import A2ASimpleClient
+import time
+import uuid
+from a2a_utils import A2ASimpleClient, percentile
+from replica_pool import ReplicaPool
 
 # --- Configuration ---
 DLAI_LOCAL_URL = os.getenv("DLAI_LOCAL_URL", "http://127.0.0.1:{port}/")
 ORCHESTRATOR_PORT = 10030
 ORCHESTRATOR_URL = DLAI_LOCAL_URL.format(port=ORCHESTRATOR_PORT)
+# Other orchestrator replicas to balance prompts over, as comma-separated ports or URLs.
+ORCHESTRATOR_REPLICAS = os.getenv("ORCHESTRATOR_REPLICAS", "")
 
 
-async def run_client():
-    # --- NEW: Check for --verbose flag ---
-    is_verbose = "--verbose" in sys.argv
-    
+def orchestrator_replica_pools() -> list[ReplicaPool]:
+    replicas = [entry.strip() for entry in ORCHESTRATOR_REPLICAS.split(",") if entry.strip()]
+    if not replicas:
+        return []
+    urls = [DLAI_LOCAL_URL.format(port=entry) if entry.isdigit() else entry for entry in replicas]
+    return [ReplicaPool("orchestrator", ORCHESTRATOR_URL, urls, expected_card_name="Orchestrator Agent")]
+
+
+async def stream_response(a2a_client: A2ASimpleClient, user_prompt: str, context_id: str | None = None):
+    """Prints status updates and answer text as the agents produce them."""
+    last_state = None
+    answer_started = False
+    mid_line = False
+    async for event in a2a_client.create_task_stream(
+        agent_url=ORCHESTRATOR_URL, message=user_prompt, context_id=context_id
+    ):
+        if event.kind == "status":
+            if event.state != last_state or event.text:
+                detail = f" {event.text.strip()}" if event.text.strip() else ""
+                if mid_line:
+                    print()
+                    mid_line = False
+                print(f"   [{event.elapsed:6.2f}s] ({event.state}){detail}")
+                last_state = event.state
+        elif event.kind == "artifact":
+            if not answer_started:
+                print("\n----------------- [FINAL ANSWER] -----------------")
+                answer_started = True
+            print(event.text, end="", flush=True)
+            mid_line = True
+        elif event.kind == "error":
+            print(f"\n{event.text}")
+        elif event.kind == "done":
+            ttft = f"{event.time_to_first_token:.2f}s" if event.time_to_first_token is not None else "n/a"
+            first_event = f"{event.time_to_first_event:.2f}s" if event.time_to_first_event is not None else "n/a"
+            print("\n--------------------------------------------------")
+            print(f"⏱️  First event: {first_event} | Time to first token: {ttft} | Total: {event.elapsed:.2f}s\n")
+
+
+def load_prompts(path: str) -> list[dict]:
+    """Reads a JSONL prompt file.
+
+    Each line is either a JSON string or an object with a "prompt" field, an
+    optional "id" and an optional "context_id" (prompts sharing one continue the
+    same conversation). Blank lines are skipped. Every line is checked before any
+    prompt is sent: a ValueError lists each invalid line as path:line_no.
+    """
+    prompts, problems = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                problems.append(f"{path}:{line_no}: invalid JSON ({e})")
+                continue
+            if isinstance(record, str):
+                record = {"prompt": record}
+            if not isinstance(record, dict):
+                problems.append(f"{path}:{line_no}: expected a JSON string or object, got {type(record).__name__}")
+            elif not isinstance(record.get("prompt"), str) or not record["prompt"].strip():
+                problems.append(f'{path}:{line_no}: missing a non-empty "prompt" string')
+            elif not isinstance(record.get("context_id") or "", str):
+                problems.append(f'{path}:{line_no}: "context_id" must be a string')
+            else:
+                record.setdefault("id", line_no)
+                prompts.append(record)
+    if problems:
+        raise ValueError(f"{len(problems)} invalid line(s) in the prompt file:\n  " + "\n  ".join(problems))
+    return prompts
+
+
+async def run_batch(input_path: str, output_path: str, concurrency: int, verbose: bool = False):
+    """Replays a JSONL prompt file against the orchestrator with bounded concurrency.
+
+    One result line is appended to `output_path` as each prompt finishes, and a
+    throughput/latency summary is printed at the end.
+    """
+    try:
+        prompts = load_prompts(input_path)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"❌ {e}") from None
+    print("==================================================")
+    print("    🚀 A2A Batch Client Initialized 🚀")
+    print(f"   Connecting to Orchestrator at {ORCHESTRATOR_URL}")
+    print(f"   {len(prompts)} prompts from {input_path} | concurrency {concurrency}")
+    print(f"   Writing results to {output_path}")
+    print("==================================================")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def run_one(a2a_client: A2ASimpleClient, record: dict, out) -> None:
+        nonlocal errors
+        async with semaphore:
+            result = {"id": record["id"], "prompt": record["prompt"], "ok": False, "state": None}
+            started = time.perf_counter()
+            try:
+                async for event in a2a_client.create_task_stream(
+                    agent_url=ORCHESTRATOR_URL, message=record["prompt"], context_id=record.get("context_id")
+                ):
+                    if event.kind == "error":
+                        result["error"] = event.text
+                    elif event.kind == "done":
+                        result["ok"] = event.state not in ("failed", "rejected", "canceled")
+                        result["state"] = event.state
+                        result["response"] = event.text
+                        result["time_to_first_token"] = event.time_to_first_token
+            except Exception as e:
+                result["error"] = f"{e.__class__.__name__}: {e}"
+            result["latency"] = time.perf_counter() - started
+
+        latencies.append(result["latency"])
+        if not result["ok"]:
+            errors += 1
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        status = "✅" if result["ok"] else "❌"
+        print(f"{status}  [{len(latencies)}/{len(prompts)}] id={record['id']} in {result['latency']:.2f}s")
+
+    started = time.perf_counter()
+    async with A2ASimpleClient(verbose=verbose, max_connections=concurrency,
+                               replica_pools=orchestrator_replica_pools()) as a2a_client:
+        with open(output_path, "w", encoding="utf-8") as out:
+            await asyncio.gather(*(run_one(a2a_client, record, out) for record in prompts))
+    wall_time = time.perf_counter() - started
+
+    print("----------------- [BATCH SUMMARY] ----------------")
+    print(f"   Requests:   {len(prompts)} ({errors} errors)")
+    print(f"   Wall time:  {wall_time:.2f}s")
+    print(f"   Throughput: {len(prompts) / wall_time if wall_time else 0:.2f} req/s")
+    if latencies:
+        print(f"   Latency:    p50 {percentile(latencies, 50):.2f}s | "
+              f"p95 {percentile(latencies, 95):.2f}s | p99 {percentile(latencies, 99):.2f}s")
+    print("--------------------------------------------------")
+
+
+async def run_client(is_verbose: bool = False, is_streaming: bool = False):
+
     print("==================================================")
     print("    🚀 A2A Interactive Client Initialized 🚀")
     print(f"   Connecting to Orchestrator at {ORCHESTRATOR_URL}")
     if is_verbose:
         print("   (Verbose mode enabled)")
+    if is_streaming:
+        print("   (Streaming mode enabled)")
     print("==================================================")
     print("You can now enter prompts to interact with the agent system.")
     print("Type 'quit' or 'exit' to close the client.\n")
 
-    # Pass the verbose flag to the client
-    a2a_client = A2ASimpleClient(verbose=is_verbose)
+    # Pass the verbose flag to the client. The client keeps its connection
+    # and the orchestrator's Agent Card open across prompts, and every prompt
+    # belongs to one conversation, so the analyst sees the scout's saved list.
+    context_id = uuid.uuid4().hex
+    async with A2ASimpleClient(verbose=is_verbose, replica_pools=orchestrator_replica_pools()) as a2a_client:
+        while True:
+            try:
+                user_prompt = input("▶️  Enter your prompt: ")
 
-    while True:
-        try:
-            user_prompt = input("▶️  Enter your prompt: ")
+                if user_prompt.lower() in ["quit", "exit"]:
+                    print("👋  Exiting client. Goodbye!")
+                    break
 
-            if user_prompt.lower() in ["quit", "exit"]:
-                print("👋  Exiting client. Goodbye!")
-                break
+                if not user_prompt:
+                    continue
 
-            if not user_prompt:
-                continue
+                print("--------------------------------------------------")
+                print(f"💬  Sending prompt to Orchestrator: '{user_prompt}'") # More descriptive
+                print("⏳  Waiting for the multi-agent system to respond...")
+
+                if is_streaming:
+                    await stream_response(a2a_client, user_prompt, context_id)
+                    continue
 
-            print("--------------------------------------------------")
-            print(f"💬  Sending prompt to Orchestrator: '{user_prompt}'") # More descriptive
-            print("⏳  Waiting for the multi-agent system to respond...")
+                response = await a2a_client.create_task(
+                    agent_url=ORCHESTRATOR_URL,
+                    message=user_prompt,
+                    context_id=context_id,
+                )
 
-            response = await a2a_client.create_task(
-                agent_url=ORCHESTRATOR_URL,
-                message=user_prompt
-            )
+                print("\n✅  Orchestrator responded!")
+                print("----------------- [FINAL ANSWER] -----------------")
+                print(response)
+                print("--------------------------------------------------\n")
+
+            except KeyboardInterrupt:
+                print("\n👋  Exiting client. Goodbye!")
+                break
+            except Exception as e:
+                print(f"\n❌ An error occurred: {e}")
+                print("   Is the A2A_github_demo_simplified.py script still running?")
+                break
 
-            print("\n✅  Orchestrator responded!")
-            print("----------------- [FINAL ANSWER] -----------------")
-            print(response)
-            print("--------------------------------------------------\n")
 
-        except KeyboardInterrupt:
-            print("\n👋  Exiting client. Goodbye!")
-            break
-        except Exception as e:
-            print(f"\n❌ An error occurred: {e}")
-            print("   Is the A2A_github_demo_simplified.py script still running?")
-            break
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Send prompts to the A2A orchestrator.")
+    parser.add_argument("--verbose", action="store_true", help="Print raw A2A requests and responses.")
+    parser.add_argument("--stream", action="store_true", help="Stream status updates and answer text as they arrive.")
+    parser.add_argument("--batch", metavar="PROMPTS_JSONL", help="Replay prompts from a JSONL file instead of reading input().")
+    parser.add_argument("--output", default="batch_results.jsonl", help="Where batch mode writes one result per line.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum prompts in flight in batch mode.")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    asyncio.run(run_client())
\ No newline at end of file
+    args = parse_args()
+    if args.batch:
+        asyncio.run(run_batch(args.batch, args.output, max(1, args.concurrency), verbose=args.verbose))
+    else:
+        asyncio.run(run_client(is_verbose=args.verbose, is_streaming=args.stream))
\ No newline at end of file
@@ -1,41 +1,53 @@
-import os
+from __future__ import annotations
+
 import time
+MODULE_IMPORT_STARTED = time.perf_counter()
+
+import os
+import re
+import shlex
+import signal
 import json
 import asyncio
+import functools
+import importlib
 import threading
 import warnings
 import logging
 import traceback
-import uuid
-
-# --- Core A2A and ADK Imports ---
-from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryTaskStore
-from a2a.types import AgentCard, AgentCapabilities, AgentSkill, MessageSendParams, SendMessageRequest
-from a2a.client import A2AClient
-from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
-
-from google.adk.agents import Agent
-from google.adk.a2a.executor.a2a_agent_executor import (
-    A2aAgentExecutor,
-    A2aAgentExecutorConfig,
-)
-from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
-from google.adk.artifacts import InMemoryArtifactService
-from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-import google.generativeai as genai
-from google.adk.tools.mcp_tool.mcp_toolset import McpToolset, StdioServerParameters, StdioConnectionParams
-from google.adk.tools.function_tool import FunctionTool
-
-# --- Imports for Our Specific Use Case ---
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+# --- Light Imports ---
+# The ADK/A2A server stack, Gemini, MCP and Tavily take seconds to import, so they are
+# imported lazily by the role that needs them (see ROLE_MODULES in SECTION 4). The
+# launcher process itself never loads them.
 from dotenv import load_dotenv
 import uvicorn
-import httpx
 import nest_asyncio
-from tavily import TavilyClient
+import artifact_store
+import rate_limits
+import telemetry
+from cache_utils import TTLCache, normalize_query
+from agent_launcher import STARTUP_TIMINGS_PATH, AgentProcessSpec, AgentSupervisor, wait_for_agents
+
+if TYPE_CHECKING:
+    from a2a.types import AgentCard
+    from context_compaction import ContextCompactor
+    from google.adk.agents import Agent
+    from google.adk.agents.callback_context import CallbackContext
+    from google.adk.models.llm_request import LlmRequest
+    from google.adk.models.llm_response import LlmResponse
+    from google.adk.runners import InMemoryRunner, Runner
+    from mcp_pool import McpSessionPool
+    from prerouter import PreRouter
+    from rate_limited_llm import RateLimitedLlm
+    from replica_pool import ReplicaPool
+    from starlette.applications import Starlette
+    from tavily import TavilyClient
+
+MODULE_IMPORT_SECONDS = time.perf_counter() - MODULE_IMPORT_STARTED
 
 # --- Setup Logging and Warnings ---
 logging.basicConfig(level=logging.INFO)
@@ -52,60 +64,268 @@ nest_asyncio.apply()
 load_dotenv()
 
 # --- API Keys and Configuration ---
-MODEL_NAME = "gemini-2.5-flash" # Using a more advanced model for better analysis
+MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.5-flash") # Using a more advanced model for better analysis
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GITHUB_PERSONAL_ACCESS_TOKEN = os.getenv("GITHUB_TOKEN")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 DLAI_LOCAL_URL = os.getenv("DLAI_LOCAL_URL", "http://127.0.0.1:{port}/")
-OUTPUT_DIR = "output" # Directory to save local files
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output") # Directory to save local files
+ARTIFACT_IO_WORKERS = int(os.getenv("ARTIFACT_IO_WORKERS", "4")) # Threads doing file I/O for the file tools
+ARTIFACT_MAX_AGE_HOURS = float(os.getenv("ARTIFACT_MAX_AGE_HOURS", "168")) # Conversations' files not written to for longer are deleted; 0 keeps them
+
+# --- Tavily Search Settings ---
+TAVILY_SEARCH_DEPTH = os.getenv("TAVILY_SEARCH_DEPTH", "advanced") # "basic" is faster and cheaper
+TAVILY_CACHE_TTL = float(os.getenv("TAVILY_CACHE_TTL", "3600")) # Seconds a search result stays fresh
+TAVILY_CACHE_SIZE = int(os.getenv("TAVILY_CACHE_SIZE", "512"))
+TAVILY_CACHE_PATH = os.getenv("TAVILY_CACHE_PATH", "") # e.g. "cache/tavily.sqlite3"; empty keeps the cache in memory
+TAVILY_MAX_WORKERS = int(os.getenv("TAVILY_MAX_WORKERS", "4")) # Concurrent searches per tavily_search_batch call
+
+# --- Tool Result Compaction ---
+# Search results are cut down to title/url/snippet, deduplicated and trimmed to a per-tool
+# token budget before they reach the analyst's model; see context_compaction.py.
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "1") != "0"
+COMPACTION_BUDGETS = os.getenv("COMPACTION_BUDGETS", "tavily_search:1000,tavily_search_batch:2500,read_local_file:3000,read_file_section:800")
+COMPACTION_SNIPPET_CHARS = int(os.getenv("COMPACTION_SNIPPET_CHARS", "300")) # Characters of page content kept per search result
+COMPACTION_SUMMARIZE = os.getenv("COMPACTION_SUMMARIZE", "0") == "1" # Pick the sentences most relevant to the query instead of the first ones
 
-# --- A2A Agent Server Ports ---
-ORCHESTRATOR_PORT = 10030
-SCOUT_PORT = 10031
-ANALYST_PORT = 10032
+# --- Rate Limits & Retries ---
+# Every agent in a process shares one limiter per provider; calls queue by priority, so the
+# orchestrator's routing turn goes ahead of bulk analyst research. 0 disables a limit.
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "600")) # Gemini requests per minute across all agents
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GITHUB_RPM = float(os.getenv("GITHUB_RPM", "30")) # GitHub's search API allows 30 requests per minute per token
+GITHUB_MAX_CONCURRENCY = int(os.getenv("GITHUB_MAX_CONCURRENCY", "4"))
+TAVILY_RPM = float(os.getenv("TAVILY_RPM", "100"))
+TAVILY_MAX_CONCURRENCY = int(os.getenv("TAVILY_MAX_CONCURRENCY", "4"))
+RATE_LIMIT_STATE_DIR = os.getenv("RATE_LIMIT_STATE_DIR", "") # e.g. "storage/rate_limits"; shares the request budgets across processes
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4")) # Tries per call on 429s and transient errors
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1")) # Seconds; doubles per retry, with full jitter, unless the server sends Retry-After
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+
+# --- Analyst Execution Mode ---
+# "parallel" researches every repository in its own concurrent sub-task and merges the results;
+# "sequential" lets a single analyst LLM work through the list one repository at a time.
+ANALYST_MODE = os.getenv("ANALYST_MODE", "parallel")
+ANALYST_PARALLELISM = int(os.getenv("ANALYST_PARALLELISM", "5")) # Max repositories researched at once
+
+# --- Orchestrator Routing ---
+# "prerouter" routes clear-cut prompts with local rules and a small classifier and only asks
+# the LLM about ambiguous ones; "llm" sends every prompt to the LLM.
+ROUTER_MODE = os.getenv("ROUTER_MODE", "prerouter")
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE", "0.75")) # Min classifier probability to skip the LLM
+ROUTER_CACHE_SIZE = int(os.getenv("ROUTER_CACHE_SIZE", "1024")) # Routing decisions cached by normalized prompt
+ROUTER_TRAINING_PATH = os.getenv("ROUTER_TRAINING_PATH", "") # Optional JSONL of {"prompt": ..., "agent": ...} examples
+
+# --- Task & Session Storage ---
+# "memory" keeps tasks, sessions, artifacts and memories in unbounded in-process dicts;
+# "sqlite" persists them to one WAL-mode database per agent under STORAGE_DIR, with eviction.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", "4")) # SQLite connections per store
+STORAGE_MAX_ITEMS = int(os.getenv("STORAGE_MAX_ITEMS", "10000")) # Max tasks / sessions / artifact versions kept per agent
+STORAGE_MAX_AGE_HOURS = float(os.getenv("STORAGE_MAX_AGE_HOURS", "168")) # Older records are evicted
+STORAGE_HOT_SESSIONS = int(os.getenv("STORAGE_HOT_SESSIONS", "256")) # Active sessions kept in the in-process LRU cache
+
+# --- Request Coalescing & Admission Control ---
+# Identical prompts arriving while one is already running share its execution, and each
+# agent runs at most *_MAX_IN_FLIGHT requests at once with up to *_MAX_QUEUE waiting;
+# further requests fail fast with a retryable error. See admission.py. 0 disables a limit.
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "1") != "0"
+ORCHESTRATOR_MAX_IN_FLIGHT = int(os.getenv("ORCHESTRATOR_MAX_IN_FLIGHT", "16"))
+ORCHESTRATOR_MAX_QUEUE = int(os.getenv("ORCHESTRATOR_MAX_QUEUE", "32"))
+SCOUT_MAX_IN_FLIGHT = int(os.getenv("SCOUT_MAX_IN_FLIGHT", "8"))
+SCOUT_MAX_QUEUE = int(os.getenv("SCOUT_MAX_QUEUE", "16"))
+ANALYST_MAX_IN_FLIGHT = int(os.getenv("ANALYST_MAX_IN_FLIGHT", "16")) # Pipeline research requests count individually
+ANALYST_MAX_QUEUE = int(os.getenv("ANALYST_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "120")) # Seconds a request may wait for a slot before it is turned away
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "5")) # Seconds callers are told to wait before retrying
+
+# --- A2A Agent Server Ports & Workers ---
+ORCHESTRATOR_PORT = int(os.getenv("ORCHESTRATOR_PORT", "10030"))
+SCOUT_PORT = int(os.getenv("SCOUT_PORT", "10031"))
+ANALYST_PORT = int(os.getenv("ANALYST_PORT", "10032"))
+# Workers only apply with LAUNCH_MODE="processes"; more than one per agent needs
+# STORAGE_BACKEND="sqlite" so every worker sees the same tasks.
+ORCHESTRATOR_WORKERS = int(os.getenv("ORCHESTRATOR_WORKERS", "1"))
+SCOUT_WORKERS = int(os.getenv("SCOUT_WORKERS", "1"))
+ANALYST_WORKERS = int(os.getenv("ANALYST_WORKERS", "1"))
+
+# --- Agent Replicas ---
+# Extra replicas of the scout and analyst that the orchestrator balances its calls over:
+# least outstanding requests, health checks on the agent card, outlier ejection, and
+# multi-turn tasks kept on the replica that holds them (see replica_pool.py). Each entry
+# is either a local port, started by the launcher with LAUNCH_MODE="processes", or the
+# URL of a replica running elsewhere.
+SCOUT_REPLICAS = os.getenv("SCOUT_REPLICAS", "") # e.g. "10041,10042"
+ANALYST_REPLICAS = os.getenv("ANALYST_REPLICAS", "") # e.g. "10051,http://10.0.0.7:10032/"
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "10")) # Seconds between agent card checks; 0 disables them
+REPLICA_FAILURE_THRESHOLD = int(os.getenv("REPLICA_FAILURE_THRESHOLD", "3")) # Consecutive failures before a replica is ejected
+REPLICA_EJECTION_TIME = float(os.getenv("REPLICA_EJECTION_TIME", "30")) # Seconds of the first ejection; doubles on repeats
+
+# --- Launcher ---
+# "threads" runs every agent in this process; "processes" runs each agent as its own
+# supervised uvicorn process that is restarted if it crashes.
+LAUNCH_MODE = os.getenv("LAUNCH_MODE", "threads")
+AGENT_DRAIN_TIMEOUT = float(os.getenv("AGENT_DRAIN_TIMEOUT", "30")) # Seconds in-flight requests get to finish on shutdown
+AGENT_MAX_RESTARTS = int(os.getenv("AGENT_MAX_RESTARTS", "5")) # Crashes per minute before an agent is given up on
+AGENT_STARTUP_TIMEOUT = float(os.getenv("AGENT_STARTUP_TIMEOUT", "120")) # Seconds to wait for every agent card to be served
+STARTUP_REPORT_PATH = os.getenv("STARTUP_REPORT_PATH", "") # e.g. "output/startup_times.jsonl"; appends one report per launch
 
 # --- GitHub MCP Server Connection (Only for Scout) ---
-github_server_params = StdioServerParameters(
-    command="docker",
-    args=[
+# GITHUB_MCP_COMMAND replaces the Docker command, e.g. "python fake_github_mcp_server.py" for local runs.
+GITHUB_MCP_COMMAND = os.getenv("GITHUB_MCP_COMMAND", "")
+GITHUB_MCP_POOL_MIN = int(os.getenv("GITHUB_MCP_POOL_MIN", "1")) # Warm MCP server processes kept ready
+GITHUB_MCP_POOL_MAX = int(os.getenv("GITHUB_MCP_POOL_MAX", "4")) # Max concurrent MCP server processes
+GITHUB_MCP_HEALTH_INTERVAL = float(os.getenv("GITHUB_MCP_HEALTH_INTERVAL", "30")) # Seconds between idle-session pings
+GITHUB_SEARCH_CACHE_TTL = float(os.getenv("GITHUB_SEARCH_CACHE_TTL", "600")) # Seconds a search_repositories result is reused
+
+if GITHUB_MCP_COMMAND:
+    github_mcp_command, *github_mcp_args = shlex.split(GITHUB_MCP_COMMAND)
+else:
+    github_mcp_command = "docker"
+    github_mcp_args = [
         "run", "--rm", "-i",
-        "-e", f"GITHUB_PERSONAL_ACCESS_TOKEN={GITHUB_PERSONAL_ACCESS_TOKEN}",
+        "-e", "GITHUB_PERSONAL_ACCESS_TOKEN",  # forwarded from the docker client's env, not the command line
         "ghcr.io/github/github-mcp-server:main"
-    ],
-    timeout=120
-)
-github_connection_params = StdioConnectionParams(server_params=github_server_params)
+    ]
 
-# Create output directory if it doesn't exist
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+@functools.cache
+def get_github_mcp_pool() -> McpSessionPool:
+    """Pre-started server processes are leased to concurrent scout tool calls instead of
+    launching a new container per session. Only the scout builds this pool."""
+    from mcp import StdioServerParameters
+    from mcp_pool import McpSessionPool
+
+    github_server_params = StdioServerParameters(
+        command=github_mcp_command,
+        args=github_mcp_args,
+        # Only what the server needs; the MCP client adds HOME, USER and the like.
+        env={"GITHUB_PERSONAL_ACCESS_TOKEN": GITHUB_PERSONAL_ACCESS_TOKEN or "", "PATH": os.environ.get("PATH", "")},
+    )
+    return McpSessionPool(
+        github_server_params,
+        min_size=GITHUB_MCP_POOL_MIN,
+        max_size=GITHUB_MCP_POOL_MAX,
+        timeout=120,
+        health_check_interval=GITHUB_MCP_HEALTH_INTERVAL,
+    )
+
+# --- Shared Rate Limiters (see rate_limits.py) ---
+RATE_LIMITS = {
+    "gemini": (GEMINI_RPM, GEMINI_MAX_CONCURRENCY),
+    "github": (GITHUB_RPM, GITHUB_MAX_CONCURRENCY),
+    "tavily": (TAVILY_RPM, TAVILY_MAX_CONCURRENCY),
+}
+# Queue priority of each agent's model calls; the analyst and its researchers are bulk work.
+AGENT_PRIORITIES = {
+    "team_lead_agent": rate_limits.INTERACTIVE,
+    "github_scout_agent": rate_limits.NORMAL,
+}
+retry_policy = rate_limits.RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+
+@functools.cache
+def get_rate_limiter(provider: str) -> rate_limits.RateLimiter:
+    rate_per_minute, max_concurrency = RATE_LIMITS[provider]
+    state_path = os.path.join(RATE_LIMIT_STATE_DIR, f"{provider}.json") if RATE_LIMIT_STATE_DIR else None
+    return rate_limits.RateLimiter(provider, rate_per_minute, max_concurrency, state_path=state_path)
+
+def rate_limited_model() -> RateLimitedLlm:
+    """MODEL_NAME behind the shared Gemini limiter. Each agent gets its own instance, so the
+    underlying client belongs to the event loop that agent is served on."""
+    from rate_limited_llm import RateLimitedLlm
+
+    return RateLimitedLlm(
+        model=MODEL_NAME,
+        limiter=get_rate_limiter("gemini"),
+        priorities=AGENT_PRIORITIES,
+        retry_policy=retry_policy,
+    )
+
+# Files are kept per conversation under OUTPUT_DIR; see artifact_store.py.
+local_artifacts = artifact_store.ArtifactStore(OUTPUT_DIR, max_workers=ARTIFACT_IO_WORKERS,
+                                               max_age=ARTIFACT_MAX_AGE_HOURS * 3600)
 
 
 # SECTION 2: CUSTOM LOCAL TOOLS (New)
 print("--- Section 2: Defining Custom Local & Web Search Tools ---")
 
 # --- Define the raw Python functions ---
-def save_file_locally(filename: str, content: str) -> str:
+# Files belong to the current conversation's namespace, and only that conversation reads them.
+def _artifact_namespace() -> str:
+    return artifact_store.current_namespace() or "shared"
+
+async def save_file_locally(filename: str, content: str) -> str:
     """Saves text content to a local file in the 'output' directory."""
-    filepath = os.path.join(OUTPUT_DIR, filename)
+    namespace = _artifact_namespace()
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(content)
-        return f"Successfully saved file to {filepath}"
+        saved = await local_artifacts.save(namespace, filename, content)
     except Exception as e:
         return f"Error saving file: {e}"
+    if saved.deduplicated:
+        return f"Successfully saved file to {saved.path} (identical content was already stored)"
+    return f"Successfully saved file to {saved.path}"
 
-def read_local_file(filename: str) -> str:
+async def read_local_file(filename: str) -> str:
     """Reads text content from a local file in the 'output' directory."""
-    filepath = os.path.join(OUTPUT_DIR, filename)
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return f.read()
+        return await local_artifacts.read(_artifact_namespace(), filename)
     except FileNotFoundError:
-        return f"Error: File not found at {filepath}"
+        return f"Error: File not found at {local_artifacts.path(_artifact_namespace(), filename)}"
     except Exception as e:
         return f"Error reading file: {e}"
 
-def tavily_search(query: str) -> str:
+async def read_file_section(filename: str, section: str) -> str:
+    """
+    Reads only the part of a local file in the 'output' directory that mentions
+    `section`, e.g. one project's entry in 'repository_list.md', instead of the whole file.
+    """
+    try:
+        text = await local_artifacts.read_section(_artifact_namespace(), filename, section)
+    except FileNotFoundError:
+        return f"Error: File not found at {local_artifacts.path(_artifact_namespace(), filename)}"
+    except Exception as e:
+        return f"Error reading file: {e}"
+    return text if text is not None else f"Error: no section of {filename} mentions '{section}'."
+
+# One Tavily client (and its keep-alive HTTP session) is shared by every search,
+# and results are cached on the normalized query and search depth.
+_tavily_client = None
+_tavily_client_lock = threading.Lock()
+tavily_cache = TTLCache(maxsize=TAVILY_CACHE_SIZE, ttl=TAVILY_CACHE_TTL, path=TAVILY_CACHE_PATH or None)
+tavily_executor = ThreadPoolExecutor(max_workers=TAVILY_MAX_WORKERS, thread_name_prefix="tavily")
+
+def get_tavily_client() -> TavilyClient:
+    global _tavily_client
+    with _tavily_client_lock:
+        if _tavily_client is None:
+            from tavily import TavilyClient
+            _tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
+        return _tavily_client
+
+def use_tavily_client(client) -> None:
+    """Replaces the shared Tavily client, e.g. with fake_tavily.FakeTavilyClient for offline runs."""
+    global _tavily_client
+    with _tavily_client_lock:
+        _tavily_client = client
+
+def _cached_tavily_results(query: str) -> list:
+    cache_key = f"{TAVILY_SEARCH_DEPTH}:{normalize_query(query)}"
+    results = tavily_cache.get(cache_key)
+    if results is None:
+        # Waits its turn with the shared Tavily limiter and backs off on 429s before giving up.
+        response = rate_limits.call_with_retries_sync(
+            get_rate_limiter("tavily"),
+            lambda: get_tavily_client().search(query=query, search_depth=TAVILY_SEARCH_DEPTH),
+            priority=rate_limits.BULK,
+            policy=retry_policy,
+        )
+        results = response['results']
+        tavily_cache.set(cache_key, results)
+    return results
+
+# The search tools are async and run the blocking HTTP call in `tavily_executor`,
+# so a slow search never stalls the agent's event loop or other concurrent work.
+async def tavily_search(query: str) -> str:
     """
     Performs a web search using the Tavily API to get up-to-date information
     on a given topic, focusing on business and marketing insights.
@@ -113,16 +333,33 @@ def tavily_search(query: str) -> str:
     if not TAVILY_API_KEY:
         return "Tavily API key is not configured."
     try:
-        client = TavilyClient(api_key=TAVILY_API_KEY)
-        response = client.search(query=query, search_depth="advanced")
-        return json.dumps(response['results'])
+        results = await asyncio.wrap_future(tavily_executor.submit(_cached_tavily_results, query))
+        return json.dumps(results)
     except Exception as e:
         return f"Error during Tavily search: {e}"
 
-# --- Manually create FunctionTool instances from the functions ---
-save_file_locally_tool = FunctionTool(save_file_locally)
-read_local_file_tool = FunctionTool(read_local_file)
-tavily_search_tool = FunctionTool(tavily_search)
+async def tavily_search_batch(queries: list[str]) -> str:
+    """
+    Runs several Tavily web searches at once, e.g. all the research queries for
+    one project. Returns a JSON object mapping each query to its search results.
+    """
+    if not TAVILY_API_KEY:
+        return "Tavily API key is not configured."
+    # Drop queries that only differ in case or spacing; they would hit the same cache entry.
+    unique_queries = list({normalize_query(q): q for q in queries if q.strip()}.values())
+    outcomes = await asyncio.gather(
+        *(asyncio.wrap_future(tavily_executor.submit(_cached_tavily_results, q)) for q in unique_queries),
+        return_exceptions=True,
+    )
+    results = {}
+    for query, outcome in zip(unique_queries, outcomes):
+        if isinstance(outcome, Exception):
+            results[query] = f"Error during Tavily search: {outcome}"
+        else:
+            results[query] = outcome
+    return json.dumps(results)
+
+# The agent builders in SECTION 3 wrap these functions in FunctionTool instances.
 
 # ==============================================================================
 # SECTION 3: AGENT DEFINITIONS 智能体定义
@@ -130,130 +367,601 @@ tavily_search_tool = FunctionTool(tavily_search)
 print("--- Section 3: Defining Our Specialist Agents ---")
 
 # --- Agent 1: GitHub 探索智能体
-github_scout_agent = Agent(
-    model=MODEL_NAME,
-    name="github_scout_agent",
-    instruction="""You are a data scout. Your mission is to find GitHub repositories and save the findings locally in a readable format.
+@functools.cache
+def build_github_scout() -> tuple[Agent, AgentCard]:
+    from a2a.types import AgentCard, AgentCapabilities, AgentSkill
+    from google.adk.agents import Agent
+    from google.adk.tools.function_tool import FunctionTool
+    from mcp_pool import PooledMcpToolset
+
+    github_scout_agent = Agent(
+        model=rate_limited_model(),
+        name="github_scout_agent",
+        instruction="""You are a data scout. Your mission is to find GitHub repositories and save the findings locally in a readable format.
 1.  **Search:** Use the `search_repositories` tool to find the top 5 repositories matching the user's query.
 2.  **Format:** Convert the list of repositories into a human-readable Markdown list. For each repository, include its name, URL, and description.
 3.  **Save Locally:** Use the `save_file_locally` tool to save this Markdown list to the file named 'repository_list.md'.
-4.  **Confirm:** Respond to the user with a confirmation message: "Intelligence gathered. Top 5 repository details have been saved to output/repository_list.md." """,
-    tools=[
-        McpToolset(
-            connection_params=github_connection_params,
-            tool_filter=["search_repositories"], # Only needs search now
-        ),
-        save_file_locally_tool # Added local save tool
-    ],
-)
-github_scout_card = AgentCard(
-    name="GitHub Scout",
-    url=DLAI_LOCAL_URL.format(port=SCOUT_PORT),
-    description="Finds GitHub repositories and saves a readable list locally.",
-    version="2.0",
-    capabilities=AgentCapabilities(streaming=True),
-    default_input_modes=["text/plain"],
-    default_output_modes=["text/plain"],
-    skills=[AgentSkill(id="search_repos_local", name="Search and Save Repos", description="Searches for repositories and saves them to a local file.", tags=["github", "search", "local_save"])]
-)
+4.  **Confirm:** Respond to the user with a confirmation message: "Intelligence gathered. Top 5 repository details have been saved to [the path reported by save_file_locally]." """,
+        tools=[
+            PooledMcpToolset(
+                pool=get_github_mcp_pool(),
+                tool_filter=["search_repositories"], # Only needs search now
+                cached_tools=["search_repositories"],
+                cache_ttl=GITHUB_SEARCH_CACHE_TTL,
+                rate_limiter=get_rate_limiter("github"),
+                retry_policy=retry_policy,
+            ),
+            FunctionTool(save_file_locally) # Added local save tool
+        ],
+    )
+    github_scout_card = AgentCard(
+        name="GitHub Scout",
+        url=DLAI_LOCAL_URL.format(port=SCOUT_PORT),
+        description="Finds GitHub repositories and saves a readable list locally.",
+        version="2.0",
+        capabilities=AgentCapabilities(streaming=True),
+        default_input_modes=["text/plain"],
+        default_output_modes=["text/plain"],
+        skills=[AgentSkill(id="search_repos_local", name="Search and Save Repos", description="Searches for repositories and saves them to a local file.", tags=["github", "search", "local_save"])]
+    )
+    return github_scout_agent, github_scout_card
 
 
 # --- Agent 2: 商业分析师
-github_analyst_agent = Agent(
-    model=MODEL_NAME,
-    name="github_analyst_agent",
-    instruction="""You are a strategic business analyst. Your goal is to create a marketing plan for open-source projects.
-1.  **Read Briefing:** Use the `read_local_file` tool to read the 'repository_list.md' file. This contains the list of projects to analyze.
-2.  **Conduct Research:** For each project in the list, use the `tavily_search` tool to research its commercial potential. Use queries like "[project name] business use cases", "[project name] target audience", or "[project name] competitors".
-3.  **Synthesize & Plan:** Based on your research, create a comprehensive marketing plan in Markdown format. The plan should cover all projects from the list and include these sections for each:
-    *   **Project Overview:** Briefly describe the project.
+MARKETING_PLAN_SECTIONS = """    *   **Project Overview:** Briefly describe the project.
     *   **Target Audience:** Who are the ideal users or customers? (e.g., "Data Scientists at startups", "Enterprise DevOps teams").
     *   **Potential Business Models:** How could this project make money? (e.g., "SaaS offering", "Consulting services", "Paid enterprise features").
     *   **Key Messaging:** What is the core value proposition? (e.g., "The fastest way to build AI agents", "Secure and scalable infrastructure").
-    *   **Suggested Marketing Channels:** Where to reach the target audience? (e.g., "Content marketing on dev.to", "Sponsoring AI newsletters", "Presenting at KubeCon").
+    *   **Suggested Marketing Channels:** Where to reach the target audience? (e.g., "Content marketing on dev.to", "Sponsoring AI newsletters", "Presenting at KubeCon")."""
+
+GITHUB_REPO_URL_PATTERN = re.compile(r"https?://github\.com/([\w.-]+)/([\w.-]+)")
+# Candidate entry boundaries, tried from the coarsest to the finest.
+REPOSITORY_ENTRY_BOUNDARIES = [
+    re.compile(r"^#{1,6}\s"),    # Markdown headings
+    re.compile(r"^\d+[.)]\s"),   # top-level numbered list items
+    re.compile(r"^[-*+]\s"),     # top-level bullet list items
+]
+
+def _repository_urls(text: str) -> list[str]:
+    urls = []
+    for owner, name in GITHUB_REPO_URL_PATTERN.findall(text):
+        name = name.rstrip(".").removesuffix(".git")
+        url = f"https://github.com/{owner}/{name}"
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+def _primary_repository_url(block: str) -> str | None:
+    """The repository an entry is about: the first URL on its header line, else its first URL."""
+    header = block.strip().split("\n", 1)[0]
+    urls = _repository_urls(header) or _repository_urls(block)
+    return urls[0] if urls else None
+
+def parse_repository_list(markdown: str) -> list[dict]:
+    """Splits the scout's Markdown list into one entry per GitHub repository.
+
+    The scout's formatting varies between runs, so each boundary style is tried
+    in turn and the first one that splits the list into two or more entries with
+    different repositories wins. Other GitHub links in an entry, e.g. a related
+    project in the description, stay part of that entry. If no boundary fits,
+    each repository gets the line its URL appears on.
+    """
+    lines = markdown.splitlines()
+    for boundary in REPOSITORY_ENTRY_BOUNDARIES:
+        if sum(1 for line in lines if boundary.match(line)) < 2:
+            continue
+        blocks, current = [], []
+        for line in lines:
+            if boundary.match(line) and current:
+                blocks.append("\n".join(current))
+                current = []
+            current.append(line)
+        blocks.append("\n".join(current))
+
+        entries = [(block, _primary_repository_url(block)) for block in blocks]
+        entries = [(block, url) for block, url in entries if url]
+        if len(entries) >= 2 and len({url for _, url in entries}) == len(entries):
+            return [
+                {"name": url.removeprefix("https://github.com/"), "url": url, "entry": block.strip()}
+                for block, url in entries
+            ]
+
+    return [
+        {
+            "name": url.removeprefix("https://github.com/"),
+            "url": url,
+            "entry": next(line for line in lines if url.removeprefix("https://") in line).strip(),
+        }
+        for url in _repository_urls(markdown)
+    ]
+
+@functools.cache
+def get_context_compactor() -> ContextCompactor:
+    """Compacts the analyst's search and file tool results; see context_compaction.py."""
+    from context_compaction import ContextCompactor, parse_budgets
+
+    return ContextCompactor(
+        budgets=parse_budgets(COMPACTION_BUDGETS),
+        snippet_chars=COMPACTION_SNIPPET_CHARS,
+        summarize=COMPACTION_SUMMARIZE,
+    )
+
+def compaction_callback():
+    return get_context_compactor().after_tool_callback if COMPACTION_ENABLED else None
+
+# Researches a single repository; the parallel analyst runs one of these per entry.
+@functools.cache
+def get_repository_researcher_runner() -> InMemoryRunner:
+    from google.adk.agents import Agent
+    from google.adk.runners import InMemoryRunner
+    from google.adk.tools.function_tool import FunctionTool
+
+    repository_researcher_agent = Agent(
+        model=rate_limited_model(),
+        name="repository_researcher_agent",
+        instruction=f"""You are a strategic business analyst researching ONE open-source project for a marketing plan.
+1.  **Conduct Research:** Call the `tavily_search_batch` tool once with queries like "[project name] business use cases", "[project name] target audience" and "[project name] competitors". Use `tavily_search` only for a single follow-up query.
+2.  **Write the Section:** Write the Markdown section for this project only. Start it with a level-2 heading containing the project name, followed by:
+{MARKETING_PLAN_SECTIONS}
+3.  **Respond:** Reply with the Markdown section and nothing else.""",
+        tools=[FunctionTool(tavily_search_batch), FunctionTool(tavily_search)],
+        after_tool_callback=compaction_callback(),
+    )
+    telemetry.instrument_agent(repository_researcher_agent)
+    return InMemoryRunner(agent=repository_researcher_agent, app_name=repository_researcher_agent.name)
+
+async def _research_one_repository(repository: dict) -> str:
+    from google.genai import types as genai_types
+
+    repository_researcher_runner = get_repository_researcher_runner()
+    session_service = repository_researcher_runner.session_service
+    app_name = repository_researcher_runner.app_name
+    session = await session_service.create_session(app_name=app_name, user_id="github_analyst_agent")
+    prompt = f"Research this project and write its marketing plan section:\n\n{repository['entry']}"
+    section = ""
+    try:
+        async for event in repository_researcher_runner.run_async(
+            user_id="github_analyst_agent",
+            session_id=session.id,
+            new_message=genai_types.Content(role="user", parts=[genai_types.Part(text=prompt)]),
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                section = "".join(part.text or "" for part in event.content.parts)
+    finally:
+        # Each sub-task gets a throwaway session so the researcher's memory stays bounded.
+        await session_service.delete_session(app_name=app_name, user_id="github_analyst_agent", session_id=session.id)
+    return section.strip() or f"## {repository['name']}\n\n_No analysis was produced for this project._"
+
+async def research_repositories_in_parallel(list_filename: str, plan_filename: str) -> str:
+    """
+    Researches every repository in a saved repository list at the same time and
+    saves the combined marketing plan. Reads `list_filename` from the 'output'
+    directory, runs one research task per repository, and writes the merged
+    per-project sections to `plan_filename`.
+    """
+    briefing = await read_local_file(list_filename)
+    if briefing.startswith("Error"):
+        return briefing
+    repositories = parse_repository_list(briefing)
+    if not repositories:
+        return f"Error: no GitHub repositories were found in {list_filename}."
+
+    semaphore = asyncio.Semaphore(ANALYST_PARALLELISM)
+    timings: dict[str, float] = {}
+
+    async def research(repository: dict) -> str:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                return await _research_one_repository(repository)
+            except Exception as e:
+                return f"## {repository['name']}\n\n_Research failed: {e}_"
+            finally:
+                timings[repository["name"]] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sections = await asyncio.gather(*(research(repository) for repository in repositories))
+    elapsed = time.perf_counter() - started
+
+    plan = "# Marketing Plan\n\n" + "\n\n---\n\n".join(sections) + "\n"
+    saved = await save_file_locally(plan_filename, plan)
+    per_repository = ", ".join(f"{name} ({seconds:.1f}s)" for name, seconds in timings.items())
+    return (f"{saved}. Researched {len(repositories)} repositories in {elapsed:.1f}s "
+            f"with up to {ANALYST_PARALLELISM} at a time: {per_repository}")
+
+async def handle_pipeline_request(callback_context: CallbackContext, llm_request: LlmRequest) -> LlmResponse | None:
+    """Answers the orchestrator pipeline's structured requests (see pipeline.py) without
+    an analyst LLM turn: researching one repository, or saving the merged plan. A request
+    that cannot be carried out fails the task, with the reason as its error message."""
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai import types as genai_types
+    from pipeline import decode_pipeline_request
+
+    last = llm_request.contents[-1] if llm_request.contents else None
+    if last is None or last.role != "user" or any(part.function_response for part in last.parts or []):
+        return None
+    request = decode_pipeline_request(callback_context.run_config.custom_metadata if callback_context.run_config else None)
+    if request is None:
+        return None
+
+    if request["action"] == "research":
+        repository = request.get("repository")
+        if not isinstance(repository, dict) or not all(isinstance(repository.get(k), str) for k in ("name", "entry")):
+            return LlmResponse(error_code="PIPELINE_RESEARCH_FAILED",
+                               error_message="Malformed research request: 'repository' needs a 'name' and an 'entry'.")
+        try:
+            text = await _research_one_repository(repository)
+        except Exception as e:
+            return LlmResponse(error_code="PIPELINE_RESEARCH_FAILED", error_message=f"{repository['name']}: {e}")
+    elif request["action"] == "save_plan":
+        if not all(isinstance(request.get(k), str) for k in ("filename", "plan")):
+            return LlmResponse(error_code="PIPELINE_SAVE_FAILED",
+                               error_message="Malformed save_plan request: it needs a 'filename' and a 'plan'.")
+        try:
+            saved = await local_artifacts.save(_artifact_namespace(), request["filename"], request["plan"])
+        except Exception as e:
+            return LlmResponse(error_code="PIPELINE_SAVE_FAILED", error_message=f"Error saving file: {e}")
+        text = f"Successfully saved file to {saved.path}"
+    else:
+        return LlmResponse(error_code="PIPELINE_UNKNOWN_ACTION",
+                           error_message=f"Unknown pipeline action '{request['action']}'.")
+    return LlmResponse(content=genai_types.Content(role="model", parts=[genai_types.Part(text=text)]))
+
+@functools.cache
+def build_github_analyst() -> tuple[Agent, AgentCard]:
+    from a2a.types import AgentCard, AgentCapabilities, AgentSkill
+    from google.adk.agents import Agent
+    from google.adk.tools.function_tool import FunctionTool
+
+    if ANALYST_MODE == "parallel":
+        github_analyst_agent = Agent(
+            model=rate_limited_model(),
+            name="github_analyst_agent",
+            instruction="""You are a strategic business analyst. Your goal is to create a marketing plan for open-source projects.
+1.  **Research & Plan:** Call the `research_repositories_in_parallel` tool with list_filename 'repository_list.md' and plan_filename 'marketing_plan.md'. It researches every project in the list at the same time and saves the merged marketing plan.
+2.  **Confirm:** If the tool reports an error, tell the user what went wrong. Otherwise respond to the user: "Business analysis complete. The marketing plan has been saved to [the path reported by the tool]." """,
+            tools=[FunctionTool(research_repositories_in_parallel)],
+            before_model_callback=handle_pipeline_request,
+        )
+    else:
+        github_analyst_agent = Agent(
+            model=rate_limited_model(),
+            name="github_analyst_agent",
+            instruction=f"""You are a strategic business analyst. Your goal is to create a marketing plan for open-source projects.
+1.  **Read Briefing:** Use the `read_local_file` tool to read the 'repository_list.md' file. This contains the list of projects to analyze.
+2.  **Conduct Research:** For each project in the list, use `read_file_section` with 'repository_list.md' and the project name if you need to look at its entry again instead of re-reading the whole file. Use the `tavily_search_batch` tool once to research its commercial potential, passing all of its queries together, e.g. ["[project name] business use cases", "[project name] target audience", "[project name] competitors"]. Use `tavily_search` only for a single follow-up query.
+3.  **Synthesize & Plan:** Based on your research, create a comprehensive marketing plan in Markdown format. The plan should cover all projects from the list and include these sections for each:
+{MARKETING_PLAN_SECTIONS}
 4.  **Save Final Work:** Use the `save_file_locally` tool to save the complete marketing plan to 'marketing_plan.md'.
-5.  **Confirm:** Respond to the user: "Business analysis complete. The marketing plan has been saved to output/marketing_plan.md." """,
-    tools=[
-        read_local_file_tool,   
-        save_file_locally_tool, 
-        tavily_search_tool      # 使用实例
-    ],
-)
-github_analyst_card = AgentCard(
-    name="GitHub Analyst",
-    url=DLAI_LOCAL_URL.format(port=ANALYST_PORT),
-    description="Analyzes a local list of repositories to create a detailed marketing plan.",
-    version="2.0",
-    capabilities=AgentCapabilities(streaming=True),
-    default_input_modes=["text/plain"],
-    default_output_modes=["text/plain"],
-    skills=[AgentSkill(id="create_marketing_plan", name="Create Marketing Plan", description="Generates a marketing plan from a local repo list.", tags=["business", "analysis", "marketing"])]
-)
+5.  **Confirm:** Respond to the user: "Business analysis complete. The marketing plan has been saved to [the path reported by save_file_locally]." """,
+            tools=[
+                FunctionTool(read_local_file),
+                FunctionTool(read_file_section),
+                FunctionTool(save_file_locally),
+                FunctionTool(tavily_search),     # 使用实例
+                FunctionTool(tavily_search_batch),
+            ],
+            before_model_callback=handle_pipeline_request,
+            after_tool_callback=compaction_callback(),
+        )
+    github_analyst_card = AgentCard(
+        name="GitHub Analyst",
+        url=DLAI_LOCAL_URL.format(port=ANALYST_PORT),
+        description="Analyzes a local list of repositories to create a detailed marketing plan.",
+        version="2.0",
+        capabilities=AgentCapabilities(streaming=True),
+        default_input_modes=["text/plain"],
+        default_output_modes=["text/plain"],
+        skills=[AgentSkill(id="create_marketing_plan", name="Create Marketing Plan", description="Generates a marketing plan from a local repo list.", tags=["business", "analysis", "marketing"])]
+    )
+    return github_analyst_agent, github_analyst_card
 
 
 # --- Agent 3: 项目总监
-remote_github_scout = RemoteA2aAgent(
-    name="github_repository_scout",
-    description="Use this agent for tasks involving **searching or finding** repositories. It will find repositories and save the list to a local file for the analyst to use later.",
-    agent_card=DLAI_LOCAL_URL.format(port=SCOUT_PORT).strip('/') + AGENT_CARD_WELL_KNOWN_PATH,
-)
-remote_github_analyst = RemoteA2aAgent(
-    name="github_repository_analyst",
-    description="Use this agent for tasks involving **analyzing, creating reports, or generating a marketing plan** from a pre-existing local list of repositories.",
-    agent_card=DLAI_LOCAL_URL.format(port=ANALYST_PORT).strip('/') + AGENT_CARD_WELL_KNOWN_PATH,
-)
-
-orchestrator_agent = Agent(
-    model=MODEL_NAME,
-    name="team_lead_agent",
-    instruction="""You are an expert AI Orchestrator. Your job is to delegate a user's request to the single most appropriate specialist agent. You do not perform tasks yourself.
+@functools.cache
+def get_orchestrator_router() -> PreRouter:
+    """The orchestrator's routing fast path; see prerouter.py."""
+    from prerouter import DEFAULT_TRAINING_EXAMPLES, PreRouter
+
+    training_examples = list(DEFAULT_TRAINING_EXAMPLES)
+    if ROUTER_TRAINING_PATH:
+        training_examples += PreRouter.load_training_examples(ROUTER_TRAINING_PATH)
+    return PreRouter(
+        agents=["github_repository_scout", "github_repository_analyst", "repository_pipeline"],
+        training_examples=training_examples,
+        threshold=ROUTER_CONFIDENCE,
+        cache_size=ROUTER_CACHE_SIZE,
+    )
+
+def parse_replicas(spec: str) -> tuple[list[int], list[str]]:
+    """Splits a *_REPLICAS setting into local ports and remote replica URLs."""
+    ports, urls = [], []
+    for entry in filter(None, (entry.strip() for entry in spec.split(","))):
+        if entry.isdigit():
+            ports.append(int(entry))
+        else:
+            urls.append(entry)
+    return ports, urls
+
+@functools.cache
+def get_replica_pools() -> list[ReplicaPool]:
+    """One pool per specialist that has replicas, shared by every remote call the orchestrator makes."""
+    from replica_pool import ReplicaPool
+
+    pools = []
+    # A replica only counts as healthy while it serves the card of the agent it stands in for.
+    for name, card_name, port, spec in (("github_repository_scout", "GitHub Scout", SCOUT_PORT, SCOUT_REPLICAS),
+                                        ("github_repository_analyst", "GitHub Analyst", ANALYST_PORT, ANALYST_REPLICAS)):
+        ports, urls = parse_replicas(spec)
+        if ports or urls:
+            pools.append(ReplicaPool(
+                name,
+                DLAI_LOCAL_URL.format(port=port),
+                [DLAI_LOCAL_URL.format(port=replica_port) for replica_port in ports] + urls,
+                expected_card_name=card_name,
+                health_interval=REPLICA_HEALTH_INTERVAL,
+                failure_threshold=REPLICA_FAILURE_THRESHOLD,
+                ejection_time=REPLICA_EJECTION_TIME,
+            ))
+    return pools
+
+@functools.cache
+def build_orchestrator() -> tuple[Agent, AgentCard]:
+    import httpx
+    from a2a.client import ClientConfig, ClientFactory
+    from a2a.types import AgentCard, AgentCapabilities, AgentSkill
+    from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
+    from google.adk.agents import Agent
+    from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
+    from pipeline import RepositoryPipelineAgent
+    from replica_pool import LoadBalancingTransport
+
+    # The orchestrator calls its specialists over `message/stream`, so their status
+    # updates are relayed to the caller as they happen instead of after the whole run.
+    # Every call carries the current trace, so the specialists' spans join the orchestrator's,
+    # and the conversation's artifact namespace, so the scout and analyst share files.
+    # Calls to a specialist with replicas are balanced over them.
+    replica_pools = get_replica_pools()
+    remote_agent_http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(600.0),
+        event_hooks={"request": [telemetry.inject_trace_headers, artifact_store.inject_namespace_header]},
+        transport=LoadBalancingTransport(replica_pools) if replica_pools else None,
+    )
+    remote_agent_client_factory = ClientFactory(ClientConfig(streaming=True, httpx_client=remote_agent_http_client))
+    remote_github_scout = RemoteA2aAgent(
+        name="github_repository_scout",
+        description="Use this agent for tasks involving **searching or finding** repositories. It will find repositories and save the list to a local file for the analyst to use later.",
+        agent_card=DLAI_LOCAL_URL.format(port=SCOUT_PORT).strip('/') + AGENT_CARD_WELL_KNOWN_PATH,
+        a2a_client_factory=remote_agent_client_factory,
+        httpx_client=remote_agent_http_client,
+    )
+    remote_github_analyst = RemoteA2aAgent(
+        name="github_repository_analyst",
+        description="Use this agent for tasks involving **analyzing, creating reports, or generating a marketing plan** from a pre-existing local list of repositories.",
+        agent_card=DLAI_LOCAL_URL.format(port=ANALYST_PORT).strip('/') + AGENT_CARD_WELL_KNOWN_PATH,
+        a2a_client_factory=remote_agent_client_factory,
+        httpx_client=remote_agent_http_client,
+    )
+    # Runs both specialists for one request, researching repositories while the scout is still working.
+    repository_pipeline = RepositoryPipelineAgent(
+        name="repository_pipeline",
+        description="Use this agent when a single request asks to **both find repositories and analyze them** or create a marketing plan for them.",
+        scout_url=DLAI_LOCAL_URL.format(port=SCOUT_PORT),
+        analyst_url=DLAI_LOCAL_URL.format(port=ANALYST_PORT),
+        parallelism=ANALYST_PARALLELISM,
+        replica_pools=replica_pools,
+    )
+
+    orchestrator_agent = Agent(
+        model=rate_limited_model(),
+        name="team_lead_agent",
+        instruction="""You are an expert AI Orchestrator. Your job is to delegate a user's request to the single most appropriate specialist agent. You do not perform tasks yourself.
 
 **Your Specialist Agents:**
 1.  `github_repository_scout`: Use for **searching and discovering** repositories. This agent finds repos and saves a list locally.
 2.  `github_repository_analyst`: Use for **analyzing or creating a marketing plan**. This agent reads the local list and generates a report.
+3.  `repository_pipeline`: Use when one request asks to **find repositories and then analyze them**. It runs the scout and the analyst together and returns the finished marketing plan.
 
 **Your Decision Process:**
 -   If the prompt is about **finding** or **searching** for repos (e.g., "Find the top repos for 'AI agents'"), delegate to `github_repository_scout`.
 -   If the prompt is about **analyzing** a list or **creating a report/plan** (e.g., "Analyze the saved list", "Create the marketing plan"), delegate to `github_repository_analyst`.
+-   If the prompt asks for **both** (e.g., "Find the top 5 'AI agent' repos and create a marketing plan for them"), delegate to `repository_pipeline`.
 
-You only call one agent per user request. Do not chain agents.
+You only call one agent per user request. Do not chain agents yourself; `repository_pipeline` does the chaining.
 """,
-    sub_agents=[remote_github_scout, remote_github_analyst],
-)
-orchestrator_card = AgentCard(
-    name="Orchestrator Agent",
-    url=DLAI_LOCAL_URL.format(port=ORCHESTRATOR_PORT),
-    description="The main coordinator that helps you find and analyze GitHub projects.",
-    version="2.0",
-    capabilities=AgentCapabilities(streaming=True),
-    default_input_modes=["text/plain"],
-    default_output_modes=["text/plain", "application/json"],
-    skills=[AgentSkill(id="find_and_analyze", name="Find and Analyze Repos", description="Coordinates a search and analysis workflow.", tags=["orchestration", "workflow", "github"])]
-)
+        sub_agents=[remote_github_scout, remote_github_analyst, repository_pipeline],
+        before_model_callback=get_orchestrator_router().before_model_callback if ROUTER_MODE == "prerouter" else None,
+        after_model_callback=get_orchestrator_router().after_model_callback if ROUTER_MODE == "prerouter" else None,
+    )
+    orchestrator_card = AgentCard(
+        name="Orchestrator Agent",
+        url=DLAI_LOCAL_URL.format(port=ORCHESTRATOR_PORT),
+        description="The main coordinator that helps you find and analyze GitHub projects.",
+        version="2.0",
+        capabilities=AgentCapabilities(streaming=True),
+        default_input_modes=["text/plain"],
+        default_output_modes=["text/plain", "application/json"],
+        skills=[AgentSkill(id="find_and_analyze", name="Find and Analyze Repos", description="Coordinates a search and analysis workflow.", tags=["orchestration", "workflow", "github"])]
+    )
+    return orchestrator_agent, orchestrator_card
 
 
 # ==============================================================================
 # SECTION 4: A2A SERVER INFRASTRUCTURE
 # ==============================================================================
 servers = []
-def create_agent_a2a_server(agent: Agent, agent_card: AgentCard) -> A2AStarletteApplication:
 
+# Admission limits (max in flight, max queued) per agent name.
+ADMISSION_LIMITS = {
+    "team_lead_agent": (ORCHESTRATOR_MAX_IN_FLIGHT, ORCHESTRATOR_MAX_QUEUE),
+    "github_scout_agent": (SCOUT_MAX_IN_FLIGHT, SCOUT_MAX_QUEUE),
+    "github_analyst_agent": (ANALYST_MAX_IN_FLIGHT, ANALYST_MAX_QUEUE),
+}
+
+# Modules each role needs, imported up front by create_role_app so their cost shows
+# up as its own phase in the startup report.
+SERVER_MODULES = [
+    "a2a.server.apps",
+    "a2a.server.request_handlers",
+    "a2a.server.tasks",
+    "admission",
+    "google.adk.a2a.executor.a2a_agent_executor",
+    "google.adk.runners",
+    "starlette.applications",
+]
+ROLE_MODULES = {
+    "scout": ["google.adk.agents", "google.adk.tools.function_tool", "mcp", "mcp_pool", "rate_limited_llm"],
+    "analyst": ["google.adk.agents", "google.adk.tools.function_tool", "google.genai", "tavily", "pipeline", "context_compaction", "rate_limited_llm"],
+    "orchestrator": ["google.adk.agents", "google.adk.agents.remote_a2a_agent", "a2a.client", "prerouter", "pipeline", "rate_limited_llm", "replica_pool"],
+}
+
+def create_agent_stores(agent_name: str) -> dict:
+    """Builds the task store and the runner's session, artifact and memory services
+    for one agent, according to STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "memory":
+        from a2a.server.tasks import InMemoryTaskStore
+        from google.adk.artifacts import InMemoryArtifactService
+        from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
+        from google.adk.sessions import InMemorySessionService
+        return {
+            "task_store": InMemoryTaskStore(),
+            "session_service": InMemorySessionService(),
+            "artifact_service": InMemoryArtifactService(),
+            "memory_service": InMemoryMemoryService(),
+        }
+    if STORAGE_BACKEND != "sqlite":
+        raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}', expected 'memory' or 'sqlite'.")
+    from sqlite_stores import PooledSqliteSessionService, SqliteArtifactService, SqliteMemoryService, SqliteTaskStore
+    os.makedirs(STORAGE_DIR, exist_ok=True)
+    db_path = os.path.join(STORAGE_DIR, f"{agent_name}.sqlite3")
+    limits = dict(pool_size=STORAGE_POOL_SIZE, max_age=STORAGE_MAX_AGE_HOURS * 3600)
+    return {
+        "task_store": SqliteTaskStore(db_path, max_tasks=STORAGE_MAX_ITEMS, **limits),
+        "session_service": PooledSqliteSessionService(
+            db_path, max_sessions=STORAGE_MAX_ITEMS, hot_cache_size=STORAGE_HOT_SESSIONS, **limits),
+        "artifact_service": SqliteArtifactService(db_path, max_artifacts=STORAGE_MAX_ITEMS, **limits),
+        "memory_service": SqliteMemoryService(db_path, pool_size=2, max_age=STORAGE_MAX_AGE_HOURS * 3600),
+    }
+
+def agent_lifespan(runner: Runner, stores: dict, startup_timings: dict, on_shutdown: tuple = ()):
+    """Warms up the agent's pooled toolsets when its server starts and closes
+    every toolset (and the MCP processes behind them) and storage pool when it stops,
+    then awaits each of `on_shutdown`."""
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        started = time.perf_counter()
+        for toolset in runner.agent.tools:
+            # Toolsets with a start() hook (e.g. the pooled MCP toolset) pre-start their sessions.
+            if hasattr(toolset, "start"):
+                await toolset.start()
+        startup_timings["warmup"] = time.perf_counter() - started
+        try:
+            yield
+        finally:
+            await runner.close()
+            for store in stores.values():
+                if hasattr(store, "pool"):
+                    await store.pool.close()
+            for close in on_shutdown:
+                await close()
+    return lifespan
+
+def create_agent_a2a_server(agent: Agent, agent_card: AgentCard, startup_timings: dict | None = None,
+                            on_shutdown: tuple = ()) -> Starlette:
+    from a2a.server.apps import A2AStarletteApplication
+    from admission import AdmissionController, CoalescingRequestHandler
+    from google.adk.a2a.executor.a2a_agent_executor import A2aAgentExecutor, A2aAgentExecutorConfig
+    from google.adk.runners import Runner
+    from starlette.responses import JSONResponse
+
+    startup_timings = {} if startup_timings is None else startup_timings
+    telemetry.instrument_agent(agent)
+    telemetry.append_callback(agent, "before_agent_callback", artifact_store.bind_session_namespace)
+    stores = create_agent_stores(agent.name)
     runner = Runner(
         app_name=agent.name,
         agent=agent,
-        artifact_service=InMemoryArtifactService(),
-        session_service=InMemorySessionService(),
-        memory_service=InMemoryMemoryService(),
+        artifact_service=stores["artifact_service"],
+        session_service=stores["session_service"],
+        memory_service=stores["memory_service"],
     )
     config = A2aAgentExecutorConfig()
     executor = A2aAgentExecutor(runner=runner,config=config)
-    request_handler = DefaultRequestHandler(
+    max_in_flight, max_queue = ADMISSION_LIMITS.get(agent.name, (0, 0))
+    request_handler = CoalescingRequestHandler(
         agent_executor=executor,
-        task_store=InMemoryTaskStore(),
+        task_store=stores["task_store"],
+        agent_name=agent.name,
+        admission=AdmissionController(agent.name, max_in_flight, max_queue,
+                                      queue_timeout=ADMISSION_QUEUE_TIMEOUT, retry_after=ADMISSION_RETRY_AFTER),
+        coalesce=COALESCE_REQUESTS,
     )
-    return A2AStarletteApplication(agent_card=agent_card, http_handler=request_handler)
+    a2a_app = A2AStarletteApplication(agent_card=agent_card, http_handler=request_handler)
+    app = a2a_app.build(lifespan=agent_lifespan(runner, stores, startup_timings, on_shutdown))
+    app.add_route(STARTUP_TIMINGS_PATH, lambda request: JSONResponse(startup_timings), methods=["GET"])
+    # Serves /metrics and /traces, and traces every request this agent handles.
+    telemetry.add_telemetry_routes(app, agent.name)
+    app.add_middleware(artifact_store.NamespaceMiddleware)
+    return app
+
+def create_role_app(role: str, build_agent, on_shutdown: tuple = ()) -> Starlette:
+    """Imports what `role` needs, builds its agent and server, and records how long each phase took."""
+    startup_timings = {}
+    started = time.perf_counter()
+    for module in SERVER_MODULES + ROLE_MODULES[role]:
+        importlib.import_module(module)
+    startup_timings["imports"] = MODULE_IMPORT_SECONDS + time.perf_counter() - started
+    started = time.perf_counter()
+    agent, agent_card = build_agent()
+    app = create_agent_a2a_server(agent, agent_card, startup_timings, on_shutdown)
+    startup_timings["build"] = time.perf_counter() - started
+    return app
+
+# --- App factories, importable by uvicorn as "A2A_github_demo_simplified:create_scout_app" ---
+def create_scout_app() -> Starlette:
+    return create_role_app("scout", build_github_scout)
+
+def create_analyst_app() -> Starlette:
+    from starlette.responses import JSONResponse
+
+    app = create_role_app("analyst", build_github_analyst)
+    app.add_route("/compaction-stats", lambda request: JSONResponse(get_context_compactor().stats), methods=["GET"])
+    return app
+
+def create_orchestrator_app() -> Starlette:
+    from starlette.responses import JSONResponse
+
+    # The replica pools' health checks run on this server's event loop, so they stop with it.
+    app = create_role_app("orchestrator", build_orchestrator,
+                          on_shutdown=tuple(pool.close for pool in get_replica_pools()))
+    app.add_route("/router-stats", lambda request: JSONResponse(get_orchestrator_router().stats), methods=["GET"])
+    app.add_route("/replica-stats", lambda request: JSONResponse({pool.name: pool.stats for pool in get_replica_pools()}),
+                  methods=["GET"])
+    return app
 
-def run_agent_in_background(create_agent_function, port, name):
+MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
+# Agent processes import this module from its own directory, wherever the launcher was started.
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENT_PROCESS_SPECS = [
+    AgentProcessSpec("GitHub Scout", f"{MODULE_NAME}:create_scout_app", SCOUT_PORT, SCOUT_WORKERS,
+                     app_dir=MODULE_DIR),
+    AgentProcessSpec("GitHub Analyst", f"{MODULE_NAME}:create_analyst_app", ANALYST_PORT, ANALYST_WORKERS,
+                     app_dir=MODULE_DIR),
+    AgentProcessSpec("Orchestrator", f"{MODULE_NAME}:create_orchestrator_app", ORCHESTRATOR_PORT, ORCHESTRATOR_WORKERS,
+                     app_dir=MODULE_DIR),
+]
+# Local replica ports from SCOUT_REPLICAS / ANALYST_REPLICAS; only started with LAUNCH_MODE="processes".
+REPLICA_PROCESS_SPECS = [
+    *(AgentProcessSpec(f"GitHub Scout :{port}", f"{MODULE_NAME}:create_scout_app", port, SCOUT_WORKERS,
+                       app_dir=MODULE_DIR)
+      for port in parse_replicas(SCOUT_REPLICAS)[0]),
+    *(AgentProcessSpec(f"GitHub Analyst :{port}", f"{MODULE_NAME}:create_analyst_app", port, ANALYST_WORKERS,
+                       app_dir=MODULE_DIR)
+      for port in parse_replicas(ANALYST_REPLICAS)[0]),
+]
+AGENT_URLS = {spec.name: DLAI_LOCAL_URL.format(port=spec.port) for spec in AGENT_PROCESS_SPECS}
+
+def run_agent_in_background(create_agent_function, port, name, stop: threading.Event | None = None):
 
     def run():
         loop = asyncio.new_event_loop()
@@ -261,57 +969,125 @@ def run_agent_in_background(create_agent_function, port, name):
         try:
             print(f"🚀 Starting '{name}' agent on port {port}...")
             app = create_agent_function()
-            config = uvicorn.Config(app.build(), host="0.0.0.0", port=port, log_level="info", loop="asyncio")
+            config = uvicorn.Config(app, host="0.0.0.0", port=port, log_level="info", loop="asyncio",
+                                    timeout_graceful_shutdown=int(AGENT_DRAIN_TIMEOUT))
             server = uvicorn.Server(config)
             servers.append(server)
+            # A shutdown requested while the app was being built has already drained `servers`.
+            if stop is not None and stop.is_set():
+                return
             loop.run_until_complete(server.serve())
         except Exception as e:
             print(f"❌ FATAL Error running '{name}' agent thread: {e}")
             traceback.print_exc()
-    thread = threading.Thread(target=run, daemon=True)
+    thread = threading.Thread(target=run, daemon=True, name=name)
     thread.start()
     return thread
 
 # ==============================================================================
 # SECTION 5: MAIN EXECUTION BLOCK
 # ==============================================================================
-def main():
-    """Synchronous main function to launch and monitor agent servers."""
-    print("\n--- Section 4: Starting A2A Agent Servers ---")
-    scout_thread = run_agent_in_background(
-        lambda: create_agent_a2a_server(github_scout_agent, github_scout_card),
-        SCOUT_PORT, "GitHub Scout"
-    )
-    analyst_thread = run_agent_in_background(
-        lambda: create_agent_a2a_server(github_analyst_agent, github_analyst_card),
-        ANALYST_PORT, "GitHub Analyst"
-    )
-    orchestrator_thread = run_agent_in_background(
-        lambda: create_agent_a2a_server(orchestrator_agent, orchestrator_card),
-        ORCHESTRATOR_PORT, "Orchestrator"
-    )
+def report_startup(report: dict[str, dict], launch_mode: str) -> bool:
+    """Prints the per-agent startup phases, optionally appends them to STARTUP_REPORT_PATH,
+    and returns whether every agent became ready."""
+    print("\n--- Startup Report ---")
+    for name, timings in report.items():
+        if "card_served_at" not in timings:
+            print(f"❌ {name}: not ready ({timings.get('error', 'timed out')})")
+            continue
+        phases = " | ".join(
+            f"{phase} {timings[phase]:.2f}s" for phase in ("imports", "build", "warmup") if phase in timings
+        )
+        print(f"⏱️  {name}: {phases} | port open at {timings['bound_at']:.2f}s "
+              f"| first card served at {timings['card_served_at']:.2f}s")
+    ready = all("card_served_at" in timings for timings in report.values())
+    if ready:
+        slowest = max(timings["card_served_at"] for timings in report.values())
+        print(f"✅ All agents ready in {slowest:.2f}s.")
+
+    if STARTUP_REPORT_PATH:
+        os.makedirs(os.path.dirname(STARTUP_REPORT_PATH) or ".", exist_ok=True)
+        with open(STARTUP_REPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": time.time(), "launch_mode": launch_mode, "ready": ready,
+                                "launcher_imports": MODULE_IMPORT_SECONDS, "agents": report}) + "\n")
+    return ready
+
+def run_agents_in_threads():
+    """Runs every agent in this process, one thread and event loop per agent."""
+    # The handlers go in before any thread starts, so CTRL+C during startup also drains the servers.
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
 
-    print("\n--- Waiting for servers to initialize (10 seconds)... ---")
-    time.sleep(10)
+    launched_at = time.perf_counter()
+    threads = {}
+    try:
+        for create_app, port, name in ((create_scout_app, SCOUT_PORT, "GitHub Scout"),
+                                       (create_analyst_app, ANALYST_PORT, "GitHub Analyst"),
+                                       (create_orchestrator_app, ORCHESTRATOR_PORT, "Orchestrator")):
+            threads[name] = run_agent_in_background(create_app, port, name, stop)
+        if REPLICA_PROCESS_SPECS:
+            # Agents in one process would share their cached agents and MCP pools across event loops.
+            print("⚠️ Local replica ports are only started with LAUNCH_MODE=processes; "
+                  "until they are served the orchestrator keeps them out of rotation.")
+
+        print("\n--- Waiting for every agent to serve its card... ---")
+        report = wait_for_agents(AGENT_URLS, launched_at, timeout=AGENT_STARTUP_TIMEOUT, stop=stop,
+                                 is_alive=lambda name: threads[name].is_alive())
+        if stop.is_set():
+            pass
+        elif report_startup(report, "threads"):
+            print(f"Orchestrator is available at port {ORCHESTRATOR_PORT}.")
+            print("You can now run a client in a separate terminal to interact with it.")
+            print("Press CTRL+C to shut down all servers.")
+            while not stop.wait(1):
+                pass
+        else:
+            print("❌ One or more agent servers failed to start.")
+    finally:
+        stop.set()
+        print(f"\n👋 Shutting down servers, draining in-flight requests (up to {AGENT_DRAIN_TIMEOUT:.0f}s)...")
+
+        # Each server stops accepting connections and waits for in-flight requests.
+        for server in servers:
+            server.should_exit = True
+        deadline = time.monotonic() + AGENT_DRAIN_TIMEOUT + 5
+        for thread in threads.values():
+            thread.join(timeout=max(0.1, deadline - time.monotonic()))
+
+def run_agents_in_processes():
+    """Runs every agent as its own supervised uvicorn process."""
+    specs = AGENT_PROCESS_SPECS + REPLICA_PROCESS_SPECS
+    if STORAGE_BACKEND == "memory" and any(spec.workers > 1 for spec in specs):
+        print("⚠️ Multiple workers with STORAGE_BACKEND=memory: each worker only sees its own tasks.")
+    supervisor = AgentSupervisor(specs, drain_timeout=AGENT_DRAIN_TIMEOUT, max_restarts=AGENT_MAX_RESTARTS)
+    launched_at = time.perf_counter()
+    supervisor.start()
 
-    all_running = (scout_thread.is_alive() and analyst_thread.is_alive() and orchestrator_thread.is_alive())
-    if all_running:
-        print("✅ All agent servers appear to be running.")
+    print("\n--- Waiting for every agent to serve its card... ---")
+    urls = {spec.name: DLAI_LOCAL_URL.format(port=spec.port) for spec in specs}
+    report = wait_for_agents(urls, launched_at, timeout=AGENT_STARTUP_TIMEOUT, stop=supervisor.stop_event,
+                             is_alive=lambda name: not supervisor.has_failed(name), on_poll=supervisor.poll)
+    if not supervisor.stop_event.is_set():
+        if not report_startup(report, "processes"):
+            print("⚠️ One or more agents are not ready yet; the supervisor keeps restarting crashed agents.")
         print(f"Orchestrator is available at port {ORCHESTRATOR_PORT}.")
-        print("You can now run a client in a separate terminal to interact with it.")
         print("Press CTRL+C to shut down all servers.")
-        try:
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            print("\n👋 Shutting down servers...")
+    supervisor.run()
+
+def main():
+    """Synchronous main function to launch and monitor agent servers."""
+    print(f"\n--- Section 4: Starting A2A Agent Servers ({LAUNCH_MODE}) ---")
+    if LAUNCH_MODE == "processes":
+        run_agents_in_processes()
+    elif LAUNCH_MODE == "threads":
+        run_agents_in_threads()
     else:
-        print("❌ One or more agent servers failed to start.")
+        print(f"❌ Error: unknown LAUNCH_MODE '{LAUNCH_MODE}', expected 'threads' or 'processes'.")
 
 
 if __name__ == "__main__":
     if not all([GEMINI_API_KEY, GITHUB_PERSONAL_ACCESS_TOKEN, TAVILY_API_KEY]):
         print("❌ Error: GEMINI_API_KEY, GITHUB_TOKEN, and TAVILY_API_KEY must be set in your .env file.")
     else:
-        genai.configure(api_key=GEMINI_API_KEY)
-        main()
\ No newline at end of file
+        main()
@@ -1,86 +1,417 @@
 # a2a_utils.py (Verbose Version)
+import asyncio
 import httpx
 import json
+import math
+import time
 import uuid
-from typing import Any
+from collections.abc import AsyncIterator
+from collections.abc import Callable
+from dataclasses import dataclass, field
 from a2a.client import A2AClient
-from a2a.types import AgentCard, MessageSendParams, SendMessageRequest
+from a2a.client.errors import A2AClientError, A2AClientHTTPError, A2AClientJSONRPCError
+from a2a.types import (
+    AgentCard,
+    JSONRPCErrorResponse,
+    Message,
+    MessageSendParams,
+    Part,
+    SendMessageRequest,
+    SendStreamingMessageRequest,
+    Task,
+    TaskArtifactUpdateEvent,
+    TaskStatusUpdateEvent,
+)
 from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
 
+from replica_pool import LoadBalancingTransport, ReplicaPool
+
+# JSON-RPC error an agent returns when it is at capacity (see admission.py). Its data
+# holds {"retryable": true, "retry_after": seconds}.
+OVERLOADED_ERROR_CODE = -32050
+MAX_OVERLOAD_WAIT = 60.0
+# Errors raised before a request is written to the connection.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Statuses from a server that no longer serves the agent at the cached card's URL.
+STALE_CARD_STATUS = {404, 405, 410}
+# Final task states in which the agent did not complete the request.
+FAILED_TASK_STATES = ("failed", "rejected", "canceled")
+
+
+class A2ATaskError(Exception):
+    """Raised by `create_task(..., raise_errors=True)` when the call fails or the agent's task does not complete."""
+
+
+@dataclass
+class StreamEvent:
+    """One update yielded by `A2ASimpleClient.create_task_stream`.
+
+    `kind` is one of:
+      - "status":   a task state change, with any text the agent attached to it
+                    and any structured `data` parts (e.g. tool calls and results).
+      - "artifact": a new chunk of the answer text, in arrival order.
+      - "error":    the request failed; `text` holds a readable error message.
+      - "done":     the stream finished; `text` holds the fully assembled answer.
+    """
+    kind: str
+    text: str = ""
+    state: str | None = None
+    elapsed: float = 0.0
+    # Only set on the final "done" event.
+    time_to_first_event: float | None = None
+    time_to_first_token: float | None = None
+    data: list[dict] = field(default_factory=list)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (e.g. pct=95 for p95)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def overload_retry_after(error) -> float | None:
+    """Seconds to wait before retrying a request the agent turned away, or None if `error` is not retryable."""
+    data = error.get("data") if isinstance(error, dict) else getattr(error, "data", None)
+    if not isinstance(data, dict) or not data.get("retryable"):
+        return None
+    return min(float(data.get("retry_after") or 1.0), MAX_OVERLOAD_WAIT)
+
+
+def safe_to_resend(e: BaseException) -> bool:
+    """True if the failed request never reached the agent, or was refused because the
+    cached agent card is stale, so sending it again cannot run the task twice."""
+    for error in (e, e.__cause__):
+        if isinstance(error, NOT_SENT_ERRORS):
+            return True
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in STALE_CARD_STATUS:
+            return True
+    return isinstance(e, A2AClientHTTPError) and e.status_code in STALE_CARD_STATUS
+
+
+def _parts_data(parts: list[Part] | None) -> list[dict]:
+    """Returns the payloads of the data parts of a message, e.g. an ADK agent's tool results."""
+    return [part.root.data for part in parts or [] if getattr(part.root, "kind", None) == "data"]
+
+
+def _parts_text(parts: list[Part] | None) -> str:
+    """Joins the text parts of a message or artifact, skipping data/file parts."""
+    return "".join(
+        part.root.text for part in parts or [] if getattr(part.root, "text", None)
+    )
+
 
 class A2ASimpleClient:
-    def __init__(self, default_timeout: float = 300.0, verbose: bool = False):
-        self._agent_info_cache: dict[str, Any | None] = {}
+    """Sends prompts to A2A agents over pooled, long-lived HTTP connections.
+
+    One keep-alive `httpx.AsyncClient` is kept per agent URL, together with the
+    agent's `AgentCard` and `A2AClient`. The card is re-fetched once it is older
+    than `card_ttl` seconds, or straight away when a call to the agent fails, so
+    steady-state requests cost a single round trip. A request is only sent again
+    if it never reached the agent (see `safe_to_resend`). A request the agent turns away
+    because it is at capacity is sent again after the wait the agent asks for, up
+    to `overload_retries` times.
+
+    Requests for the service URL of one of `replica_pools` are balanced over that
+    agent's replicas (see replica_pool.py).
+
+    Use it as an async context manager, or call `close()` when done.
+    """
+
+    def __init__(
+        self,
+        default_timeout: float = 300.0,
+        verbose: bool = False,
+        card_ttl: float = 300.0,
+        max_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        request_hooks: list[Callable] | None = None,
+        overload_retries: int = 2,
+        replica_pools: list[ReplicaPool] | None = None,
+    ):
+        # agent_url -> (AgentCard, A2AClient, fetched_at)
+        self._agent_info_cache: dict[str, tuple[AgentCard, A2AClient, float]] = {}
+        self._http_clients: dict[str, httpx.AsyncClient] = {}
+        # One lock per agent so concurrent first requests fetch the card once.
+        self._card_locks: dict[str, asyncio.Lock] = {}
         self.default_timeout = default_timeout
         self.verbose = verbose # <-- NEW: Add verbose flag
+        self.card_ttl = card_ttl
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # httpx request hooks, e.g. to forward trace headers from an agent server.
+        self.request_hooks = list(request_hooks or [])
+        self.overload_retries = overload_retries
+        self.replica_pools = list(replica_pools or [])
+
+    async def __aenter__(self) -> "A2ASimpleClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes every pooled connection, stops the replica health checks and forgets the cached agent cards."""
+        clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        self._agent_info_cache.clear()
+        self._card_locks.clear()
+        for httpx_client in clients:
+            await httpx_client.aclose()
+        for pool in self.replica_pools:
+            await pool.close()
+
+    def invalidate(self, agent_url: str) -> None:
+        """Drops the cached agent card so the next call fetches it again."""
+        self._agent_info_cache.pop(agent_url, None)
 
-    async def create_task(self, agent_url: str, message: str) -> str:
-        timeout_config = httpx.Timeout(self.default_timeout)
-        async with httpx.AsyncClient(timeout=timeout_config) as httpx_client:
-            agent_card_data = None
-
-            try:
-                card_url = agent_url.strip('/') + AGENT_CARD_WELL_KNOWN_PATH
-                print(f"   (Client is fetching Agent Card from: {card_url})")
-                agent_card_response = await httpx_client.get(card_url)
-                agent_card_response.raise_for_status()
-                agent_card_data = agent_card_response.json()
-                self._agent_info_cache[agent_url] = agent_card_data
-            
-            except httpx.HTTPStatusError as e:
-                return f"❌ HTTP Error from agent server: {e.response.status_code}\n   URL: {e.request.url}"
-            except httpx.RequestError as e:
-                return f"❌ Network Error trying to contact agent: {e.__class__.__name__}\n   URL: {e.request.url}"
-
-            agent_card = AgentCard(**agent_card_data)
-            client = A2AClient(httpx_client=httpx_client, agent_card=agent_card)
-            
-            request = SendMessageRequest(
-                id=str(uuid.uuid4()),
-                params=MessageSendParams(
-                    message={
-                        "messageId": uuid.uuid4().hex,
-                        "role": "user",
-                        "parts": [{"kind": "text", "text": message}],
-                    }
-                ),
+    def _get_http_client(self, agent_url: str) -> httpx.AsyncClient:
+        httpx_client = self._http_clients.get(agent_url)
+        if httpx_client is None or httpx_client.is_closed:
+            httpx_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.default_timeout),
+                limits=self.limits,
+                event_hooks={"request": self.request_hooks},
+                # The balancing transport wraps its own connection pool, so it gets the limits too.
+                transport=LoadBalancingTransport(self.replica_pools, httpx.AsyncHTTPTransport(limits=self.limits))
+                if self.replica_pools else None,
             )
+            self._http_clients[agent_url] = httpx_client
+        return httpx_client
+
+    async def _get_a2a_client(self, agent_url: str) -> A2AClient:
+        """Returns a cached `A2AClient`, fetching the agent card if it is missing or stale."""
+        cached = self._agent_info_cache.get(agent_url)
+        if cached is not None and time.monotonic() - cached[2] < self.card_ttl:
+            return cached[1]
+
+        async with self._card_locks.setdefault(agent_url, asyncio.Lock()):
+            cached = self._agent_info_cache.get(agent_url)
+            if cached is not None and time.monotonic() - cached[2] < self.card_ttl:
+                return cached[1]
+            return await self._fetch_a2a_client(agent_url)
+
+    async def _fetch_a2a_client(self, agent_url: str) -> A2AClient:
+        httpx_client = self._get_http_client(agent_url)
+        card_url = agent_url.strip('/') + AGENT_CARD_WELL_KNOWN_PATH
+        print(f"   (Client is fetching Agent Card from: {card_url})")
+        agent_card_response = await httpx_client.get(card_url)
+        agent_card_response.raise_for_status()
+
+        agent_card = AgentCard(**agent_card_response.json())
+        client = A2AClient(httpx_client=httpx_client, agent_card=agent_card)
+        self._agent_info_cache[agent_url] = (agent_card, client, time.monotonic())
+        return client
+
+    @staticmethod
+    def _message_params(message: str, context_id: str | None = None, metadata: dict | None = None) -> MessageSendParams:
+        payload = {
+            "messageId": uuid.uuid4().hex,
+            "role": "user",
+            "parts": [{"kind": "text", "text": message}],
+        }
+        if context_id:
+            # Messages with the same context ID continue one conversation (and share its files).
+            payload["contextId"] = context_id
+        # Request metadata travels next to the prompt, for the agent's code rather than its model.
+        return MessageSendParams(message=payload, metadata=metadata)
+
+    @staticmethod
+    def _describe_error(e: Exception, agent_url: str) -> str:
+        if isinstance(e, httpx.HTTPStatusError):
+            return f"❌ HTTP Error from agent server: {e.response.status_code}\n   URL: {e.request.url}"
+        if isinstance(e, httpx.RequestError):
+            return f"❌ Network Error trying to contact agent: {e.__class__.__name__}\n   URL: {e.request.url}"
+        if isinstance(e, A2AClientJSONRPCError):
+            return f"❌ Agent returned an error!\n   Code: {e.error.code}\n   Message: {e.error.message}"
+        return f"❌ Error talking to agent: {e}\n   URL: {agent_url}"
+
+    @staticmethod
+    def _failure(text: str, raise_errors: bool) -> str:
+        if raise_errors:
+            raise A2ATaskError(text)
+        return text
+
+    async def create_task(self, agent_url: str, message: str, context_id: str | None = None,
+                          metadata: dict | None = None, raise_errors: bool = False) -> str:
+        """Sends a prompt and returns the answer text.
+
+        Errors are returned as readable "❌ ..." text, or raised as `A2ATaskError`
+        with `raise_errors=True`, which also raises when the agent's task ends in
+        one of FAILED_TASK_STATES.
+        """
+        request = SendMessageRequest(
+            id=str(uuid.uuid4()),
+            params=self._message_params(message, context_id, metadata),
+        )
+
+        # --- NEW: Verbose Logging ---
+        if self.verbose:
+            print("\n" + "="*20 + " [REQUEST SENT] " + "="*20)
+            # Use model_dump for a clean dictionary representation
+            print(json.dumps(request.model_dump(mode="json"), indent=2))
+            print("="*58 + "\n")
+
+        for overload_attempt in range(self.overload_retries + 1):
+            # A call through a cached card that fails before reaching the agent may
+            # mean the agent restarted or moved, so the card is dropped and the
+            # request is sent once more with a fresh one. A request that may have
+            # reached the agent is never sent again: message/send is not idempotent.
+            retry_allowed = agent_url in self._agent_info_cache
+            while True:
+                try:
+                    client = await self._get_a2a_client(agent_url)
+                    response_dict = (await client.send_message(request)).model_dump(mode="json", exclude_none=True)
+                    break
+                except A2AClientJSONRPCError as e:
+                    response_dict = {"error": e.error.model_dump(mode="json", exclude_none=True)}
+                    break
+                except (httpx.HTTPError, A2AClientError) as e:
+                    self.invalidate(agent_url)
+                    if not (retry_allowed and safe_to_resend(e)):
+                        return self._failure(self._describe_error(e, agent_url), raise_errors)
+                    retry_allowed = False
+            retry_after = overload_retry_after(response_dict.get("error"))
+            if retry_after is None or overload_attempt == self.overload_retries:
+                break
+            await asyncio.sleep(retry_after)
+
+        # --- NEW: Verbose Logging ---
+        if self.verbose:
+            print("\n" + "="*20 + " [RAW RESPONSE RECEIVED] " + "="*15)
+            print(json.dumps(response_dict, indent=2))
+            print("="*58 + "\n")
+
+        if "error" in response_dict:
+            error_info = response_dict["error"]
+            error_message = error_info.get("message", "Unknown error")
+            error_code = error_info.get("code", "N/A")
+            return self._failure(f"❌ Agent returned an error!\n   Code: {error_code}\n   Message: {error_message}",
+                                 raise_errors)
+        status = (response_dict.get("result") or {}).get("status") or {}
+        if raise_errors and status.get("state") in FAILED_TASK_STATES:
+            parts = (status.get("message") or {}).get("parts", [])
+            detail = "".join(part.get("text", "") for part in parts) or "no details"
+            raise A2ATaskError(f"The agent's task {status['state']}: {detail}")
+
+        # The rest of the parsing logic remains the same
+        try:
+            if "result" in response_dict and "artifacts" in response_dict["result"]:
+                full_content = []
+                for artifact in response_dict["result"]["artifacts"]:
+                    for part in artifact.get("parts", []):
+                        if "text" in part:
+                            full_content.append(part["text"])
+
+                if full_content:
+                    return "\n\n".join(full_content)
+
+            return json.dumps(response_dict, indent=2)
+
+        except Exception as e:
+            return f"Error parsing response: {e}\nRaw response: {response_dict}"
+
+
+    async def create_task_stream(
+        self, agent_url: str, message: str, context_id: str | None = None
+    ) -> AsyncIterator[StreamEvent]:
+        """Sends a prompt over `message/stream` and yields updates as they arrive.
+
+        Artifact chunks are assembled incrementally, so the final "done" event
+        carries the same answer text `create_task` would have returned, along
+        with the time to the first event and to the first answer token.
+        """
+        request = SendStreamingMessageRequest(
+            id=str(uuid.uuid4()),
+            params=self._message_params(message, context_id),
+        )
+        if self.verbose:
+            print("\n" + "="*20 + " [STREAM REQUEST SENT] " + "="*13)
+            print(json.dumps(request.model_dump(mode="json"), indent=2))
+            print("="*58 + "\n")
+
+        started = time.perf_counter()
+        first_event_at: float | None = None
+        first_token_at: float | None = None
+        state: str | None = None
+        # artifact_id -> text chunks, in arrival order
+        artifacts: dict[str, list[str]] = {}
+
+        def artifact_chunk(artifact_id: str, text: str, append: bool) -> StreamEvent:
+            nonlocal first_token_at
+            if not append:
+                artifacts[artifact_id] = []
+            artifacts.setdefault(artifact_id, []).append(text)
+            if first_token_at is None:
+                first_token_at = time.perf_counter() - started
+            return StreamEvent("artifact", text=text, state=state, elapsed=time.perf_counter() - started)
+
+        for overload_attempt in range(self.overload_retries + 1):
+            retry_after = None
+            retry_allowed = agent_url in self._agent_info_cache
+            while True:
+                try:
+                    client = await self._get_a2a_client(agent_url)
+                    async for response in client.send_message_streaming(request):
+                        if isinstance(response.root, JSONRPCErrorResponse):
+                            raise A2AClientJSONRPCError(response.root)
+                        event = response.root.result
+                        if first_event_at is None:
+                            first_event_at = time.perf_counter() - started
+                        if self.verbose:
+                            print(f"   [stream event] {event.kind}")
+
+                        if isinstance(event, Task):
+                            state = event.status.state.value
+                            yield StreamEvent("status", state=state, elapsed=time.perf_counter() - started)
+                            for artifact in event.artifacts or []:
+                                text = _parts_text(artifact.parts)
+                                if text:
+                                    yield artifact_chunk(artifact.artifact_id, text, append=False)
+                        elif isinstance(event, TaskStatusUpdateEvent):
+                            state = event.status.state.value
+                            parts = event.status.message.parts if event.status.message else None
+                            yield StreamEvent("status", text=_parts_text(parts), state=state,
+                                              elapsed=time.perf_counter() - started, data=_parts_data(parts))
+                        elif isinstance(event, TaskArtifactUpdateEvent):
+                            text = _parts_text(event.artifact.parts)
+                            if text:
+                                yield artifact_chunk(event.artifact.artifact_id, text, append=bool(event.append))
+                        elif isinstance(event, Message):
+                            text = _parts_text(event.parts)
+                            if text:
+                                yield artifact_chunk(event.message_id, text, append=False)
+                    break
+                except A2AClientJSONRPCError as e:
+                    # An agent at capacity turns the request away before it starts, so it can be sent again.
+                    retry_after = overload_retry_after(e.error)
+                    if retry_after is None or first_event_at is not None or overload_attempt == self.overload_retries:
+                        yield StreamEvent("error", text=self._describe_error(e, agent_url), state=state,
+                                          elapsed=time.perf_counter() - started)
+                        return
+                    break
+                except (httpx.HTTPError, A2AClientError) as e:
+                    self.invalidate(agent_url)
+                    # As in create_task, only a request that never reached the agent is sent again.
+                    if first_event_at is not None or not (retry_allowed and safe_to_resend(e)):
+                        yield StreamEvent("error", text=self._describe_error(e, agent_url), state=state,
+                                          elapsed=time.perf_counter() - started)
+                        return
+                    retry_allowed = False
+            if retry_after is None:
+                break
+            await asyncio.sleep(retry_after)
 
-            # --- NEW: Verbose Logging ---
-            if self.verbose:
-                print("\n" + "="*20 + " [REQUEST SENT] " + "="*20)
-                # Use model_dump for a clean dictionary representation
-                print(json.dumps(request.model_dump(mode="json"), indent=2))
-                print("="*58 + "\n")
-
-            response = await client.send_message(request)
-
-            # --- NEW: Verbose Logging ---
-            response_dict = response.model_dump(mode="json", exclude_none=True)
-            if self.verbose:
-                print("\n" + "="*20 + " [RAW RESPONSE RECEIVED] " + "="*15)
-                print(json.dumps(response_dict, indent=2))
-                print("="*58 + "\n")
-
-            # The rest of the parsing logic remains the same
-            try:
-                if "error" in response_dict:
-                    error_info = response_dict["error"]
-                    error_message = error_info.get("message", "Unknown error")
-                    error_code = error_info.get("code", "N/A")
-                    return f"❌ Agent returned an error!\n   Code: {error_code}\n   Message: {error_message}"
-
-                if "result" in response_dict and "artifacts" in response_dict["result"]:
-                    full_content = []
-                    for artifact in response_dict["result"]["artifacts"]:
-                        for part in artifact.get("parts", []):
-                            if "text" in part:
-                                full_content.append(part["text"])
-                    
-                    if full_content:
-                        return "\n\n".join(full_content)
-
-                return json.dumps(response_dict, indent=2)
-
-            except Exception as e:
-                return f"Error parsing response: {e}\nRaw response: {str(response)}"
\ No newline at end of file
+        yield StreamEvent(
+            "done",
+            text="\n\n".join("".join(chunks) for chunks in artifacts.values()),
+            state=state,
+            elapsed=time.perf_counter() - started,
+            time_to_first_event=first_event_at,
+            time_to_first_token=first_token_at,
+        )
@@ -0,0 +1,230 @@
+# admission.py
+"""Request coalescing and admission control for an agent's A2A request handler.
+
+`CoalescingRequestHandler` is a drop-in `DefaultRequestHandler` that:
+
+  - Coalesces identical requests: a request whose prompt matches one already
+    being executed (after normalizing case and whitespace) waits for that
+    execution and gets the same answer or event stream, instead of starting
+    another run. A request that names its conversation (context ID) only
+    coalesces with the same prompt in that conversation, e.g. a client retry,
+    since the answer and the files written belong to that conversation. Requests
+    without a context ID coalesce with each other. Requests that continue a task
+    are never coalesced.
+  - Admits at most `max_in_flight` executions at once. Up to `max_queue` more wait
+    for a slot for at most `queue_timeout` seconds; beyond that a request fails at
+    once with a retryable OVERLOADED_ERROR_CODE error, so a burst is turned away
+    instead of making every request slower. `A2ASimpleClient` retries these after
+    the `retry_after` the error carries.
+
+Coalesced followers receive the leader's task, with the leader's task and context IDs;
+across conversations this only happens to requests that did not name one.
+"""
+import asyncio
+import contextlib
+import json
+import time
+
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.types import JSONRPCError
+from a2a.utils.errors import ServerError
+
+import telemetry
+from a2a_utils import OVERLOADED_ERROR_CODE
+from artifact_store import current_namespace
+from cache_utils import normalize_query
+
+
+class AgentOverloadedError(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Caps concurrent executions and the number of requests waiting for one.
+
+    `max_in_flight=0` admits everything.
+    """
+
+    def __init__(self, agent_name: str, max_in_flight: int, max_queue: int = 0,
+                 queue_timeout: float = 30.0, retry_after: float = 5.0):
+        self.agent_name = agent_name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+
+    def _reject(self, reason: str) -> AgentOverloadedError:
+        telemetry.metrics.inc("a2a_admission_rejected_total", "Requests turned away because the agent was at capacity.",
+                              {"agent": self.agent_name, "reason": reason})
+        return AgentOverloadedError(
+            f"{self.agent_name} is at capacity ({self.in_flight} running, {self.queued} queued); retry later.",
+            self.retry_after,
+        )
+
+    def _queue_gauge(self, amount: int) -> None:
+        self.queued += amount
+        telemetry.metrics.add("a2a_admission_queue_depth", "Requests waiting for an execution slot.",
+                              {"agent": self.agent_name}, amount)
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        if self._slots is None:
+            yield
+            return
+        if self._slots.locked():
+            if self.queued >= self.max_queue:
+                raise self._reject("queue_full")
+            started = time.perf_counter()
+            self._queue_gauge(1)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("queue_timeout") from None
+            finally:
+                self._queue_gauge(-1)
+                telemetry.metrics.observe("a2a_admission_wait_seconds", "Time requests waited for an execution slot.",
+                                          {"agent": self.agent_name}, time.perf_counter() - started)
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+        }
+
+
+class _SharedStream:
+    """Events of one streamed execution, replayed to every request that joined it."""
+
+    def __init__(self):
+        self.events = []
+        self.error: BaseException | None = None
+        self.done = False
+        self.changed = asyncio.Condition()
+
+    async def publish(self, events) -> None:
+        try:
+            async for event in events:
+                async with self.changed:
+                    self.events.append(event)
+                    self.changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self.changed:
+                self.done = True
+                self.changed.notify_all()
+
+    async def follow(self):
+        seen = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: seen < len(self.events) or self.done)
+                new, done = self.events[seen:], self.done
+            for event in new:
+                yield event
+            seen += len(new)
+            if done and seen == len(self.events):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class CoalescingRequestHandler(DefaultRequestHandler):
+    def __init__(self, *args, agent_name: str, admission: AdmissionController, coalesce: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.agent_name = agent_name
+        self.admission = admission
+        self.coalesce = coalesce
+        # coalescing key -> the running execution
+        self._sends: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _SharedStream] = {}
+
+    def _coalescing_key(self, params) -> str | None:
+        message = params.message
+        if not self.coalesce or message.task_id or message.reference_task_ids:
+            return None
+        texts = [getattr(part.root, "text", None) for part in message.parts]
+        if not texts or None in texts:
+            return None
+        prompt = normalize_query("".join(texts))
+        if not prompt:
+            return None
+        # Requests that carry metadata (e.g. the pipeline's) only match the same metadata.
+        metadata = json.dumps(params.metadata, sort_keys=True, default=str) if params.metadata else ""
+        # Specialists write files into the caller's namespace, so only requests for the same one match.
+        return f"{current_namespace() or ''}|{message.context_id or ''}|{metadata}|{prompt}"
+
+    def _coalesced(self, kind: str) -> None:
+        telemetry.metrics.inc("a2a_requests_coalesced_total", "Requests answered by an identical request already running.",
+                              {"agent": self.agent_name, "kind": kind})
+
+    @staticmethod
+    def _overloaded(e: AgentOverloadedError) -> ServerError:
+        return ServerError(error=JSONRPCError(
+            code=OVERLOADED_ERROR_CODE,
+            message=str(e),
+            data={"retryable": True, "retry_after": e.retry_after},
+        ))
+
+    async def _admitted_send(self, send, params, context):
+        try:
+            async with self.admission.admit():
+                return await send(params, context)
+        except AgentOverloadedError as e:
+            raise self._overloaded(e) from None
+
+    async def _admitted_stream(self, stream, params, context):
+        try:
+            async with self.admission.admit():
+                async for event in stream(params, context):
+                    yield event
+        except AgentOverloadedError as e:
+            raise self._overloaded(e) from None
+
+    async def on_message_send(self, params, context=None):
+        send = super().on_message_send
+        key = self._coalescing_key(params)
+        if key is None:
+            return await self._admitted_send(send, params, context)
+        execution = self._sends.get(key)
+        if execution is None:
+            # The execution is its own task, so a leader that disconnects does not cancel it for the others.
+            execution = asyncio.create_task(self._admitted_send(send, params, context))
+            self._sends[key] = execution
+            execution.add_done_callback(lambda _: self._sends.pop(key, None))
+        else:
+            self._coalesced("send")
+        return await asyncio.shield(execution)
+
+    async def on_message_send_stream(self, params, context=None):
+        stream = super().on_message_send_stream
+        key = self._coalescing_key(params)
+        if key is None:
+            async for event in self._admitted_stream(stream, params, context):
+                yield event
+            return
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream()
+            publisher = asyncio.create_task(shared.publish(self._admitted_stream(stream, params, context)))
+            publisher.add_done_callback(lambda _: self._streams.pop(key, None))
+        else:
+            self._coalesced("stream")
+        async for event in shared.follow():
+            yield event
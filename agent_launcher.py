@@ -0,0 +1,213 @@
+# agent_launcher.py
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import httpx
+
+# Same as a2a.utils.constants.AGENT_CARD_WELL_KNOWN_PATH; importing a2a.utils would
+# pull the SDK's types into the launcher process.
+AGENT_CARD_WELL_KNOWN_PATH = "/.well-known/agent-card.json"
+# Each agent server reports its own import/build/warm-up timings here.
+STARTUP_TIMINGS_PATH = "/startup-timings"
+
+
+@dataclass
+class AgentProcessSpec:
+    """How to serve one agent in its own process.
+
+    `app` is a uvicorn import string for a zero-argument app factory, e.g.
+    "A2A_github_demo_simplified:create_scout_app", imported from `app_dir` (the
+    current directory if unset). With `workers` > 1, uvicorn's own process manager
+    runs that many workers on the port and replaces any worker that dies.
+    """
+    name: str
+    app: str
+    port: int
+    workers: int = 1
+    host: str = "0.0.0.0"
+    app_dir: str | None = None
+    restarts: list[float] = field(default_factory=list)
+
+    def command(self, drain_timeout: float) -> list[str]:
+        return [
+            sys.executable, "-m", "uvicorn", self.app,
+            *(["--app-dir", self.app_dir] if self.app_dir else []),
+            "--factory",
+            "--host", self.host,
+            "--port", str(self.port),
+            "--workers", str(self.workers),
+            "--loop", "asyncio",
+            "--log-level", "info",
+            "--timeout-graceful-shutdown", str(int(drain_timeout)),
+        ]
+
+
+class AgentSupervisor:
+    """Runs each agent as a separate uvicorn process and keeps it running.
+
+    A process that exits unexpectedly is restarted with exponential backoff; an
+    agent that crashes more than `max_restarts` times within `restart_window`
+    seconds is given up on. On SIGINT/SIGTERM every agent receives SIGTERM,
+    which makes uvicorn stop accepting connections and wait up to
+    `drain_timeout` seconds for in-flight requests before exiting.
+    """
+
+    def __init__(self, specs: list[AgentProcessSpec], drain_timeout: float = 30.0,
+                 max_restarts: int = 5, restart_window: float = 60.0):
+        self.specs = specs
+        self.drain_timeout = drain_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.processes: dict[str, subprocess.Popen] = {}
+        self._next_start: dict[str, float] = {}
+        self._failed: set[str] = set()
+        self._stop = threading.Event()
+        self._previous_handlers = {}
+
+    @property
+    def stop_event(self) -> threading.Event:
+        return self._stop
+
+    def start(self) -> None:
+        """Starts every agent and routes SIGINT/SIGTERM to a graceful shutdown."""
+        self._previous_handlers = {
+            sig: signal.signal(sig, self._handle_signal) for sig in (signal.SIGINT, signal.SIGTERM)
+        }
+        for spec in self.specs:
+            self._start(spec)
+
+    def _start(self, spec: AgentProcessSpec) -> None:
+        print(f"🚀 Starting '{spec.name}' agent on port {spec.port} ({spec.workers} worker(s))...")
+        self.processes[spec.name] = subprocess.Popen(spec.command(self.drain_timeout))
+
+    def is_running(self, name: str) -> bool:
+        process = self.processes.get(name)
+        return process is not None and process.poll() is None
+
+    def has_failed(self, name: str) -> bool:
+        return name in self._failed
+
+    def run(self) -> None:
+        """Supervises the agent processes until a shutdown signal arrives or every agent has failed."""
+        try:
+            while not self._stop.wait(0.5):
+                self.poll()
+                if len(self._failed) == len(self.specs):
+                    print("❌ Every agent has failed; giving up.")
+                    break
+        finally:
+            self.shutdown()
+
+    def _handle_signal(self, signum, frame) -> None:
+        if self._stop.is_set():
+            # A second Ctrl+C skips the drain.
+            for process in self.processes.values():
+                if process.poll() is None:
+                    process.kill()
+            return
+        print(f"\n👋 Received {signal.Signals(signum).name}, draining in-flight requests "
+              f"(up to {self.drain_timeout:.0f}s)...")
+        self._stop.set()
+
+    def poll(self) -> None:
+        """Restarts agents that have exited, honouring the backoff and restart limit."""
+        now = time.monotonic()
+        for spec in self.specs:
+            if spec.name in self._failed:
+                continue
+            if spec.name in self._next_start:
+                if now >= self._next_start[spec.name]:
+                    del self._next_start[spec.name]
+                    self._start(spec)
+                continue
+            exit_code = self.processes[spec.name].poll()
+            if exit_code is None:
+                continue
+
+            spec.restarts = [t for t in spec.restarts if now - t < self.restart_window] + [now]
+            if len(spec.restarts) > self.max_restarts:
+                print(f"❌ '{spec.name}' exited with code {exit_code} {len(spec.restarts)} times "
+                      f"in {self.restart_window:.0f}s; not restarting it again.")
+                self._failed.add(spec.name)
+                continue
+            delay = min(30.0, 2 ** (len(spec.restarts) - 1))
+            print(f"⚠️ '{spec.name}' exited with code {exit_code}; restarting in {delay:.0f}s...")
+            self._next_start[spec.name] = now + delay
+
+    def shutdown(self) -> None:
+        """Asks every agent process to drain and exit, killing any that outlive the drain timeout."""
+        self._stop.set()
+        running = [p for p in self.processes.values() if p.poll() is None]
+        for process in running:
+            process.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.drain_timeout + 5
+        for process in running:
+            try:
+                process.wait(timeout=max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if running:
+            print("✅ All agent processes stopped.")
+        for sig, handler in self._previous_handlers.items():
+            signal.signal(sig, handler)
+        self._previous_handlers = {}
+
+
+def wait_for_agents(
+    agent_urls: dict[str, str],
+    started_at: float,
+    timeout: float = 120.0,
+    stop: threading.Event | None = None,
+    is_alive: Callable[[str], bool] | None = None,
+    on_poll: Callable[[], None] | None = None,
+    interval: float = 0.05,
+) -> dict[str, dict]:
+    """Polls every agent until its port accepts connections and its agent card is served.
+
+    Returns one timing dict per agent. `bound_at` and `card_served_at` are seconds
+    since `started_at` (a `time.perf_counter()` value); the agent's own
+    import/build/warm-up durations from STARTUP_TIMINGS_PATH are merged in.
+    Agents that never became ready have no `card_served_at`; agents for which
+    `is_alive` returns False are given up on immediately.
+    """
+    report: dict[str, dict] = {name: {} for name in agent_urls}
+    pending = dict(agent_urls)
+    with httpx.Client(timeout=2.0) as client:
+        while pending and time.perf_counter() - started_at < timeout and not (stop and stop.is_set()):
+            if on_poll:
+                on_poll()
+            for name, url in list(pending.items()):
+                timings = report[name]
+                if is_alive and not is_alive(name):
+                    timings["error"] = "agent exited before it was ready"
+                    del pending[name]
+                    continue
+                if "bound_at" not in timings:
+                    address = httpx.URL(url)
+                    try:
+                        socket.create_connection((address.host, address.port), timeout=0.2).close()
+                    except OSError:
+                        continue
+                    timings["bound_at"] = time.perf_counter() - started_at
+                base_url = url.rstrip("/")
+                try:
+                    response = client.get(base_url + AGENT_CARD_WELL_KNOWN_PATH)
+                except httpx.HTTPError:
+                    continue
+                if response.status_code != 200:
+                    continue
+                timings["card_served_at"] = time.perf_counter() - started_at
+                try:
+                    timings.update(client.get(base_url + STARTUP_TIMINGS_PATH).json())
+                except (httpx.HTTPError, ValueError):
+                    pass
+                del pending[name]
+            time.sleep(interval)
+    return report
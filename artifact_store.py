@@ -0,0 +1,254 @@
+# artifact_store.py
+"""Content-addressed, per-conversation storage for the files the agents write.
+
+Each file is stored once under `.blobs/` by the SHA-256 of its content, so identical
+outputs are deduplicated, and is hard-linked into the namespace of the conversation
+that wrote it:
+
+    output/
+        .blobs/3f/3fa4...        the content, written once
+        <namespace>/repository_list.md
+
+Every write goes to a temporary file that is then renamed into place, so readers
+never see a partial file, and all disk I/O runs in a small thread pool instead of
+the agent's event loop.
+
+Namespaces nothing has been saved to for `max_age` seconds are deleted, along with
+the blobs no remaining file links to. Like the SQLite stores, this runs at most
+once per `eviction_interval` seconds, after a save.
+
+The namespace of a request is the orchestrator's session ID. The orchestrator
+forwards it to the specialists in the NAMESPACE_HEADER of every A2A call, so the
+scout and analyst of one conversation share files while concurrent conversations
+stay apart. A specialist called directly uses its own session ID.
+"""
+import asyncio
+import contextvars
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+NAMESPACE_HEADER = "x-artifact-namespace"
+BLOB_DIR = ".blobs"
+
+_namespace: contextvars.ContextVar[str | None] = contextvars.ContextVar("artifact_namespace", default=None)
+
+# Section boundaries, tried from the coarsest to the finest.
+SECTION_BOUNDARIES = [
+    re.compile(r"^#{1,6}\s"),    # Markdown headings
+    re.compile(r"^\d+[.)]\s"),   # top-level numbered list items
+    re.compile(r"^[-*+]\s"),     # top-level bullet list items
+]
+
+
+def _safe_component(value: str) -> str:
+    """Turns a namespace or filename into a single safe path component."""
+    value = re.sub(r"[^\w.-]", "_", os.path.basename(value.strip()))[:128].lstrip(".")
+    if not value:
+        raise ValueError("Empty artifact name.")
+    return value
+
+
+def split_sections(text: str) -> list[str]:
+    """Splits a Markdown document into sections at the coarsest boundary style that occurs more than once."""
+    lines = text.splitlines()
+    for boundary in SECTION_BOUNDARIES:
+        if sum(1 for line in lines if boundary.match(line)) < 2:
+            continue
+        sections, current = [], []
+        for line in lines:
+            if boundary.match(line) and current:
+                sections.append("\n".join(current))
+                current = []
+            current.append(line)
+        sections.append("\n".join(current))
+        return [section.strip() for section in sections if section.strip()]
+    return [text.strip()] if text.strip() else []
+
+
+@dataclass
+class ArtifactRef:
+    namespace: str
+    name: str
+    digest: str
+    size: int
+    path: str
+    # True if an identical file had already been stored.
+    deduplicated: bool
+
+
+class ArtifactStore:
+    """Saves and reads text artifacts under `root`, one directory per namespace."""
+
+    def __init__(self, root: str, max_workers: int = 4, max_age: float = 7 * 24 * 3600,
+                 eviction_interval: float = 300.0):
+        self.root = root
+        self.max_age = max_age
+        self.eviction_interval = eviction_interval
+        self._blob_root = os.path.join(root, BLOB_DIR)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="artifacts")
+        # Keeps eviction from deleting a blob or namespace directory a save is linking into.
+        self._links_lock = threading.Lock()
+        self._last_eviction = time.monotonic()
+        os.makedirs(self._blob_root, exist_ok=True)
+
+    def path(self, namespace: str | None, name: str) -> str:
+        if namespace is None:
+            return os.path.join(self.root, _safe_component(name))
+        return os.path.join(self.root, _safe_component(namespace), _safe_component(name))
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def save(self, namespace: str, name: str, content: str) -> ArtifactRef:
+        saved = await self._run(self._save, namespace, name, content)
+        if self.max_age > 0 and time.monotonic() - self._last_eviction >= self.eviction_interval:
+            self._last_eviction = time.monotonic()
+            await self.evict()
+        return saved
+
+    async def evict(self) -> int:
+        """Deletes expired namespaces and unreferenced blobs; returns how many files were removed."""
+        return await self._run(self._evict, time.time() - self.max_age)
+
+    async def read(self, namespace: str | None, name: str, offset: int = 0, length: int | None = None) -> str:
+        """Reads `length` bytes from `offset` (the whole file by default).
+
+        Raises FileNotFoundError if the namespace has no such artifact.
+        """
+        return await self._run(self._read, self.path(namespace, name), offset, length)
+
+    async def read_section(self, namespace: str | None, name: str, query: str) -> str | None:
+        """Returns the first section (see `split_sections`) that mentions `query`, ignoring case."""
+        text = await self.read(namespace, name)
+        needle = query.lower().strip()
+        return next((section for section in split_sections(text) if needle in section.lower()), None)
+
+    def _save(self, namespace: str, name: str, content: str) -> ArtifactRef:
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        blob_dir = os.path.join(self._blob_root, digest[:2])
+        blob_path = os.path.join(blob_dir, digest)
+        path = self.path(namespace, name)
+        with self._links_lock:
+            deduplicated = os.path.exists(blob_path)
+            if not deduplicated:
+                os.makedirs(blob_dir, exist_ok=True)
+                self._atomic_write(blob_path, data)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._atomic_link(blob_path, path)
+        return ArtifactRef(namespace, _safe_component(name), digest, len(data), path, deduplicated)
+
+    def _evict(self, cutoff: float) -> int:
+        removed = 0
+        # Hard links share the blob's mtime, so a namespace's age is that of its directory,
+        # which changes whenever a file is saved into it.
+        for entry in os.scandir(self.root):
+            if entry.name == BLOB_DIR or not entry.is_dir(follow_symlinks=False):
+                continue
+            with self._links_lock:
+                try:
+                    if os.stat(entry.path).st_mtime >= cutoff:
+                        continue
+                    removed += len(os.listdir(entry.path))
+                except FileNotFoundError:
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+        for shard in os.scandir(self._blob_root):
+            if not shard.is_dir(follow_symlinks=False):
+                continue
+            for blob in os.scandir(shard.path):
+                with self._links_lock:
+                    try:
+                        stat = os.stat(blob.path)
+                    except FileNotFoundError:
+                        continue
+                    # A blob only linked from .blobs/ is no longer part of any file.
+                    if stat.st_nlink <= 1 and stat.st_mtime < cutoff:
+                        os.unlink(blob.path)
+                        removed += 1
+        return removed
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _atomic_link(blob_path: str, path: str) -> None:
+        """Points `path` at the blob with a hard link, or a copy where links are not supported."""
+        tmp_path = os.path.join(os.path.dirname(path), f".tmp-{os.urandom(8).hex()}")
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            shutil.copyfile(blob_path, tmp_path)
+        try:
+            os.replace(tmp_path, path)
+        finally:
+            # rename() is a no-op when both names already link to the same blob.
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)
+
+    @staticmethod
+    def _read(path: str, offset: int, length: int | None) -> str:
+        with open(path, "rb") as f:
+            if offset:
+                f.seek(offset)
+            data = f.read() if length is None else f.read(length)
+        return data.decode("utf-8", errors="replace")
+
+
+# --- Namespace propagation ---
+
+def current_namespace() -> str | None:
+    return _namespace.get()
+
+
+def bind_session_namespace(callback_context):
+    """before_agent_callback that uses the session ID as the namespace unless the caller sent one."""
+    if _namespace.get() is None:
+        _namespace.set(callback_context.session.id)
+    return None
+
+
+async def inject_namespace_header(request) -> None:
+    """httpx request hook that passes the current namespace on to the agent being called."""
+    namespace = _namespace.get()
+    if namespace is not None:
+        request.headers[NAMESPACE_HEADER] = namespace
+
+
+class NamespaceMiddleware:
+    """ASGI middleware that binds the namespace sent by the calling agent, if any."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        namespace = None
+        if scope["type"] == "http":
+            for name, value in scope.get("headers", []):
+                if name == NAMESPACE_HEADER.encode("latin-1"):
+                    namespace = value.decode("latin-1")
+                    break
+        if namespace is None:
+            await self.app(scope, receive, send)
+            return
+        token = _namespace.set(namespace)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _namespace.reset(token)
@@ -0,0 +1,212 @@
+# context_compaction.py
+"""Shrinks tool results before they are added to the model's context.
+
+`ContextCompactor.after_tool_callback` sits between a tool and the model. For web
+search results it keeps only the title, URL and a short snippet of each page, drops
+pages already returned earlier in the same invocation (or for another query of the
+same batch) and then trims the result to the tool's token budget. Plain-text results,
+such as a file, are cut at a line boundary once they exceed their budget.
+
+With `summarize=True` the snippet is built from the sentences that share the most
+words with the search query instead of the start of the page, a cheap extractive
+summary that needs no model call.
+
+Tokens are estimated as characters / 4, which is close enough to budget with.
+"""
+import json
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import telemetry
+
+CHARS_PER_TOKEN = 4
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def parse_budgets(spec: str) -> dict[str, int]:
+    """Parses "tool:tokens,tool:tokens" into a budget per tool name."""
+    budgets = {}
+    for item in spec.split(","):
+        if ":" in item:
+            tool, tokens = item.split(":", 1)
+            budgets[tool.strip()] = int(tokens)
+    return budgets
+
+
+def _words(text: str) -> set[str]:
+    return set(re.findall(r"[a-z0-9]{3,}", text.lower()))
+
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+def extractive_summary(text: str, query: str, max_chars: int) -> str:
+    """Keeps the sentences sharing the most words with `query`, in their original order."""
+    sentences = [s for s in SENTENCE_BOUNDARY.split(" ".join(text.split())) if s]
+    if len(sentences) <= 1:
+        return _clip(text, max_chars)
+    query_words = _words(query)
+    ranked = sorted(range(len(sentences)), key=lambda i: (-len(query_words & _words(sentences[i])), i))
+    chosen, length = [], 0
+    for i in ranked:
+        if length + len(sentences[i]) > max_chars and chosen:
+            break
+        chosen.append(i)
+        length += len(sentences[i]) + 1
+    return _clip(" ".join(sentences[i] for i in sorted(chosen)), max_chars)
+
+
+class ContextCompactor:
+    """Compacts the results of the tools in `budgets` to at most that many tokens each.
+
+    Use it as an agent's `after_tool_callback`. Tools without a budget are left alone.
+    `stats` reports, per tool, how many tokens were removed before reaching the model.
+    """
+
+    def __init__(self, budgets: dict[str, int], snippet_chars: int = 300, summarize: bool = False,
+                 max_invocations: int = 1024):
+        self.budgets = budgets
+        self.snippet_chars = snippet_chars
+        self.summarize = summarize
+        self.max_invocations = max_invocations
+        self.counts: dict[str, Counter] = {}
+        # invocation_id -> URLs already shown to the model in that invocation
+        self._seen_urls: OrderedDict[str, set[str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _seen(self, invocation_id: str) -> set[str]:
+        with self._lock:
+            seen = self._seen_urls.get(invocation_id)
+            if seen is None:
+                seen = self._seen_urls[invocation_id] = set()
+                while len(self._seen_urls) > self.max_invocations:
+                    self._seen_urls.popitem(last=False)
+            return seen
+
+    def _snippet(self, result: dict, query: str) -> str:
+        content = result.get("content") or result.get("snippet") or ""
+        if self.summarize:
+            return extractive_summary(content, query, self.snippet_chars)
+        return _clip(content, self.snippet_chars)
+
+    def project_results(self, results: list, query: str, seen: set[str]) -> tuple[list[dict], int]:
+        """Keeps title/url/snippet of each result not in `seen`; returns them and the number dropped.
+
+        The URLs kept are added to `seen`, so later lists of the same call skip them too.
+        """
+        projected, duplicates = [], 0
+        for result in results:
+            if not isinstance(result, dict):
+                continue
+            url = result.get("url", "")
+            if url and url in seen:
+                duplicates += 1
+                continue
+            if url:
+                seen.add(url)
+            projected.append({"title": result.get("title", ""), "url": url, "snippet": self._snippet(result, query)})
+        return projected, duplicates
+
+    def _mark_shown(self, seen: set[str], result_lists) -> None:
+        """Adds the URLs of the results that reach the model to the invocation's `seen`."""
+        with self._lock:
+            seen.update(result["url"] for results in result_lists if isinstance(results, list)
+                        for result in results if result.get("url"))
+
+    @staticmethod
+    def fit_results(by_query: dict[str, list[dict]], budget: int) -> dict[str, list[dict]]:
+        """Drops the lowest-ranked result of the longest list until the whole result fits `budget`."""
+        while estimate_tokens(json.dumps(by_query)) > budget:
+            longest = max(by_query, key=lambda q: len(by_query[q]) if isinstance(by_query[q], list) else 0)
+            if not isinstance(by_query[longest], list) or len(by_query[longest]) <= 1:
+                break
+            by_query[longest] = by_query[longest][:-1]
+        return by_query
+
+    @staticmethod
+    def fit_text(text: str, budget: int, hint: str = "") -> str:
+        if estimate_tokens(text) <= budget:
+            return text
+        kept = text[:budget * CHARS_PER_TOKEN].rsplit("\n", 1)[0]
+        return f"{kept}\n… [truncated {estimate_tokens(text) - estimate_tokens(kept)} tokens{hint}]"
+
+    def compact(self, tool_name: str, args: dict, output: str, invocation_id: str = "") -> str:
+        budget = self.budgets[tool_name]
+        try:
+            data = json.loads(output)
+        except ValueError:
+            data = None
+
+        if tool_name == "tavily_search_batch" and isinstance(data, dict):
+            seen = self._seen(invocation_id)
+            # A copy, so results trimmed to fit the budget are not counted as shown.
+            shown = set(seen)
+            by_query, duplicates = {}, 0
+            for query, results in data.items():
+                if isinstance(results, list):
+                    by_query[query], dropped = self.project_results(results, query, shown)
+                    duplicates += dropped
+                else:
+                    by_query[query] = results
+            fitted = self.fit_results(by_query, budget)
+            self._mark_shown(seen, fitted.values())
+            compacted = json.dumps(fitted)
+        elif isinstance(data, list):
+            seen = self._seen(invocation_id)
+            projected, duplicates = self.project_results(data, args.get("query", ""), set(seen))
+            fitted = self.fit_results({"results": projected}, budget)["results"]
+            self._mark_shown(seen, [fitted])
+            compacted = json.dumps(fitted)
+        else:
+            duplicates = 0
+            hint = "; use read_file_section to load one entry" if tool_name == "read_local_file" else ""
+            compacted = self.fit_text(output, budget, hint)
+        if duplicates:
+            compacted += f"\n({duplicates} results already shown above were omitted)"
+        return compacted
+
+    def after_tool_callback(self, tool, args, tool_context, tool_response):
+        if tool.name not in self.budgets:
+            return None
+        output = tool_response.get("result") if isinstance(tool_response, dict) else tool_response
+        if not isinstance(output, str):
+            return None
+        compacted = self.compact(tool.name, args or {}, output, tool_context.invocation_id)
+        raw_tokens, compacted_tokens = estimate_tokens(output), estimate_tokens(compacted)
+        with self._lock:
+            counts = self.counts.setdefault(tool.name, Counter())
+            counts["calls"] += 1
+            counts["raw_tokens"] += raw_tokens
+            counts["compacted_tokens"] += compacted_tokens
+        span = telemetry.current_span()
+        labels = {"agent": (span.server if span else "") or tool_context.agent_name, "tool": tool.name}
+        telemetry.metrics.inc("agent_tool_output_tokens_total", "Estimated tokens returned by tools, before compaction.",
+                              labels, raw_tokens)
+        telemetry.metrics.inc("agent_tool_output_tokens_compacted_total",
+                              "Estimated tokens of tool results after compaction.", labels, compacted_tokens)
+        if compacted == output:
+            return None
+        return {"result": compacted}
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            per_tool = {
+                tool: {**counts, "tokens_saved": counts["raw_tokens"] - counts["compacted_tokens"]}
+                for tool, counts in self.counts.items()
+            }
+        return {
+            "tools": per_tool,
+            "tokens_saved": sum(tool["tokens_saved"] for tool in per_tool.values()),
+            "summarize": self.summarize,
+            "budgets": self.budgets,
+        }
@@ -0,0 +1,353 @@
+# e2e_benchmark.py
+"""Offline end-to-end benchmark of the scout, analyst and orchestrator.
+
+Boots all three agents in this process with `create_agent_a2a_server`, backed by
+deterministic local fakes instead of Gemini, the GitHub MCP server and Tavily:
+  - fake_gemini.py:             a scripted model with configurable latency
+  - fake_github_mcp_server.py:  a stdio MCP server exposing `search_repositories`
+  - fake_tavily.py:             a Tavily client returning canned results
+
+It then drives the orchestrator through `A2ASimpleClient` at the requested
+concurrency and writes a JSON report with end-to-end and per-hop latency
+percentiles (model calls, tool calls, orchestrator -> specialist hops),
+requests/sec and peak RSS, so runs can be compared between commits.
+No API keys, network access or Docker are needed.
+
+    python e2e_benchmark.py --requests 50 --concurrency 8 --output e2e_benchmark.json
+
+The "two-step" and "pipeline" scenarios both produce a full marketing plan per
+request, the first with a scout prompt followed by an analyst prompt in the same
+conversation and the second with one prompt to the orchestrator's pipeline, so
+their end-to-end latencies compare time-to-complete-report directly.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+# The file the scout saves and the analyst reads.
+LIST_FILENAME = "repository_list.md"
+# Tools whose calls show that a job actually researched the repositories.
+RESEARCH_TOOLS = {"tavily_search", "tavily_search_batch"}
+
+SCOUT_PROMPTS = [
+    "Find the top 5 'ai agent application' repos and save the list.",
+    "Search GitHub for the top 5 vector database repositories and save the list.",
+    "Find the top 5 LLM observability repos and save the list.",
+]
+ANALYST_PROMPTS = [
+    "Now, analyze the repositories from the saved list and create the final report.",
+    "Create the marketing plan for the saved repositories.",
+]
+PIPELINE_PROMPTS = [
+    "Find the top 5 'ai agent application' repos and create a marketing plan for them.",
+    "Search GitHub for the top 5 vector database repositories, then write the marketing plan.",
+    "Find the top 5 LLM observability repos and analyze their business potential.",
+]
+
+
+def configure_environment(args: argparse.Namespace, output_dir: str) -> None:
+    """Points the demo at the local fakes. Must run before the demo module is imported."""
+    os.environ.update({
+        "MODEL_NAME": "fake-gemini",
+        "GITHUB_MCP_COMMAND": (f"{sys.executable} {os.path.join(BENCHMARK_DIR, 'fake_github_mcp_server.py')}"
+                               f" --latency {args.mcp_latency}"),
+        "TAVILY_API_KEY": "fake",
+        "TAVILY_CACHE_PATH": "",
+        "TAVILY_CACHE_TTL": str(args.cache_ttl),
+        "GITHUB_SEARCH_CACHE_TTL": str(args.cache_ttl),
+        "OUTPUT_DIR": output_dir,
+        "ORCHESTRATOR_PORT": str(args.base_port),
+        "SCOUT_PORT": str(args.base_port + 1),
+        "ANALYST_PORT": str(args.base_port + 2),
+        "ROUTER_MODE": args.router,
+        "ANALYST_MODE": args.analyst_mode,
+        "STORAGE_BACKEND": args.storage,
+        "STORAGE_DIR": os.path.join(output_dir, "storage"),
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_TAVILY_LATENCY": str(args.tavily_latency),
+        "FAKE_TAVILY_CONTENT_CHARS": str(args.tavily_content_chars),
+        "FAKE_LLM_LATENCY_PER_1K_TOKENS": str(args.llm_latency_per_1k_tokens),
+        "COMPACTION_ENABLED": "1" if args.compaction == "on" else "0",
+        "COALESCE_REQUESTS": "1" if args.coalesce == "on" else "0",
+    })
+    if args.rate_limits == "off":
+        # The fakes have no quotas, so by default nothing is throttled.
+        for provider in ("GEMINI", "GITHUB", "TAVILY"):
+            os.environ.update({f"{provider}_RPM": "0", f"{provider}_MAX_CONCURRENCY": "0"})
+
+
+class HopRecorder:
+    """Times tool calls and orchestrator -> specialist hops through ADK agent callbacks,
+    and counts each conversation's research tool calls."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        # artifact namespace (the job's context ID) -> calls to RESEARCH_TOOLS
+        self.research_calls: Counter = Counter()
+        self._started: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _stop(self, key: tuple, hop: str) -> None:
+        with self._lock:
+            started = self._started.pop(key, None)
+            if started is not None:
+                self.samples[hop].append(time.perf_counter() - started)
+
+    def before_tool(self, tool, args, tool_context):
+        if tool.name in RESEARCH_TOOLS:
+            from artifact_store import current_namespace
+            with self._lock:
+                self.research_calls[current_namespace()] += 1
+        self._started[("tool", tool_context.invocation_id, tool_context.function_call_id)] = time.perf_counter()
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        self._stop(("tool", tool_context.invocation_id, tool_context.function_call_id), f"tool:{tool.name}")
+
+    def before_agent(self, callback_context):
+        self._started[("agent", callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+
+    def after_agent(self, callback_context):
+        self._stop(("agent", callback_context.invocation_id, callback_context.agent_name),
+                   f"remote:{callback_context.agent_name}")
+
+    def attach_tools(self, agent) -> None:
+        from telemetry import append_callback
+        append_callback(agent, "before_tool_callback", self.before_tool)
+        append_callback(agent, "after_tool_callback", self.after_tool, first=True)
+
+    def attach_agent(self, agent) -> None:
+        from telemetry import append_callback
+        append_callback(agent, "before_agent_callback", self.before_agent)
+        append_callback(agent, "after_agent_callback", self.after_agent, first=True)
+
+
+def summarize(values: list[float]) -> dict:
+    from a2a_utils import percentile
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+    }
+
+
+def build_workload(scenario: str, requests: int) -> list[list[str]]:
+    """Returns one job per request; the prompts of a job are sent in order, in one conversation."""
+    if scenario == "scout":
+        pool = [[prompt] for prompt in SCOUT_PROMPTS]
+    elif scenario == "analyst":
+        pool = [[prompt] for prompt in ANALYST_PROMPTS]
+    elif scenario == "two-step":
+        pool = [[scout, ANALYST_PROMPTS[0]] for scout in SCOUT_PROMPTS]
+    elif scenario == "pipeline":
+        pool = [[prompt] for prompt in PIPELINE_PROMPTS]
+    else:
+        pool = [[prompt] for pair in zip(SCOUT_PROMPTS, ANALYST_PROMPTS * 2) for prompt in pair]
+    return [pool[i % len(pool)] for i in range(requests)]
+
+
+async def drive(orchestrator_url: str, jobs: list[list[str]], concurrency: int, timeout: float,
+                seed=None, verify=None) -> tuple[list[dict], float]:
+    """Runs every job in its own conversation. A job that starts with an analyst prompt
+    first has `seed(context_id)` awaited, untimed, to give it a saved repository list.
+    A job that finished is still failed if `verify(context_id, prompts)` returns a reason."""
+    from a2a_utils import A2ASimpleClient
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def run_one(client: A2ASimpleClient, prompts: list[str]) -> None:
+        async with semaphore:
+            result = {"prompt": " -> ".join(prompts), "ok": True}
+            context_id = uuid.uuid4().hex
+            if seed is not None and prompts[0] in ANALYST_PROMPTS:
+                await seed(context_id)
+            started = time.perf_counter()
+            for prompt in prompts:
+                ok = False
+                try:
+                    async for event in client.create_task_stream(
+                        agent_url=orchestrator_url, message=prompt, context_id=context_id
+                    ):
+                        if event.kind == "error":
+                            result["error"] = event.text
+                        elif event.kind == "done":
+                            ok = event.state not in ("failed", "rejected", "canceled")
+                            if "time_to_first_token" not in result:
+                                result["time_to_first_token"] = event.time_to_first_token
+                except Exception as e:
+                    result["error"] = f"{e.__class__.__name__}: {e}"
+                result["ok"] = result["ok"] and ok
+            result["latency"] = time.perf_counter() - started
+            problem = verify(context_id, prompts) if result["ok"] and verify is not None else None
+            if problem:
+                result["ok"], result["error"] = False, problem
+            results.append(result)
+
+    started = time.perf_counter()
+    async with A2ASimpleClient(default_timeout=timeout, max_connections=concurrency) as client:
+        await asyncio.gather(*(run_one(client, prompts) for prompts in jobs))
+    return results, time.perf_counter() - started
+
+
+def main(args: argparse.Namespace) -> None:
+    output_dir = tempfile.mkdtemp(prefix="e2e-bench-")
+    configure_environment(args, output_dir)
+
+    from google.adk.models.registry import LLMRegistry
+
+    import A2A_github_demo_simplified as demo
+    import fake_gemini
+    import telemetry
+    from agent_launcher import wait_for_agents
+    from fake_tavily import FakeTavilyClient
+
+    LLMRegistry.register(fake_gemini.FakeGeminiLlm)
+    fake_tavily = FakeTavilyClient()
+    demo.use_tavily_client(fake_tavily)
+
+    recorder = HopRecorder()
+    scout = demo.build_github_scout()
+    analyst = demo.build_github_analyst()
+    orchestrator = demo.build_orchestrator()
+    for agent in (scout[0], analyst[0], demo.get_repository_researcher_runner().agent):
+        recorder.attach_tools(agent)
+    for remote_agent in orchestrator[0].sub_agents:
+        recorder.attach_agent(remote_agent)
+
+    print(f"🚀 Booting agents on ports {args.base_port}-{args.base_port + 2} with local fakes...")
+    launched_at = time.perf_counter()
+    threads = [
+        demo.run_agent_in_background(lambda: demo.create_agent_a2a_server(*scout), demo.SCOUT_PORT, "GitHub Scout"),
+        demo.run_agent_in_background(lambda: demo.create_agent_a2a_server(*analyst), demo.ANALYST_PORT, "GitHub Analyst"),
+        demo.run_agent_in_background(lambda: demo.create_agent_a2a_server(*orchestrator), demo.ORCHESTRATOR_PORT, "Orchestrator"),
+    ]
+    readiness = wait_for_agents(demo.AGENT_URLS, launched_at, timeout=120)
+    if not all("card_served_at" in timings for timings in readiness.values()):
+        print(f"❌ Agents failed to start: {readiness}")
+        sys.exit(1)
+    startup_s = max(timings["card_served_at"] for timings in readiness.values())
+    print(f"✅ All agents ready in {startup_s:.2f}s.")
+
+    orchestrator_url = demo.AGENT_URLS["Orchestrator"]
+    # The analyst only reads its own conversation's files, so one scout request runs first
+    # and the list it saves is copied into the conversation of every job that starts with the analyst.
+    asyncio.run(drive(orchestrator_url, [SCOUT_PROMPTS[:1]], 1, args.timeout))
+    saved_lists = glob.glob(os.path.join(output_dir, "*", LIST_FILENAME))
+    if not saved_lists:
+        print(f"❌ The warm-up scout request saved no {LIST_FILENAME}.")
+        sys.exit(1)
+    with open(saved_lists[0], encoding="utf-8") as f:
+        repository_list = f.read()
+
+    async def seed(context_id: str) -> None:
+        await demo.local_artifacts.save(context_id, LIST_FILENAME, repository_list)
+
+    def verify(context_id: str, prompts: list[str]) -> str | None:
+        # The fake model reports success either way, so check that the analyst really researched.
+        needs_research = any(prompt in ANALYST_PROMPTS or prompt in PIPELINE_PROMPTS for prompt in prompts)
+        if needs_research and not recorder.research_calls[context_id]:
+            return "No research ran: the analyst made no Tavily searches in this conversation."
+        return None
+
+    recorder.samples.clear()
+    fake_gemini.call_log.clear()
+
+    jobs = build_workload(args.scenario, args.requests)
+    print(f"⏱️  Sending {len(jobs)} '{args.scenario}' requests with concurrency {args.concurrency}...")
+    results, wall_time = asyncio.run(drive(orchestrator_url, jobs, args.concurrency, args.timeout, seed, verify))
+    model_calls = defaultdict(list)
+    prompt_tokens = defaultdict(list)
+    for agent_name, seconds, tokens in fake_gemini.call_log:
+        model_calls[f"model:{agent_name}"].append(seconds)
+        prompt_tokens[agent_name].append(tokens)
+
+    for server in demo.servers:
+        server.should_exit = True
+    for thread in threads:
+        thread.join(timeout=15)
+
+    errors = [r for r in results if not r["ok"]]
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "startup_s": round(startup_s, 3),
+        "requests": len(results),
+        "errors": len(errors),
+        "error_samples": [r.get("error", "") for r in errors[:3]],
+        "wall_time_s": round(wall_time, 3),
+        "requests_per_s": round(len(results) / wall_time, 2) if wall_time else 0.0,
+        "end_to_end": summarize([r["latency"] for r in results]),
+        "time_to_first_token": summarize([r["time_to_first_token"] for r in results if r.get("time_to_first_token")]),
+        "hops": {hop: summarize(values) for hop, values in sorted({**recorder.samples, **model_calls}.items())},
+        # Mean prompt size per model turn; compare --compaction on/off to see its effect on model latency.
+        "prompt_tokens_per_turn": {
+            agent_name: round(sum(tokens) / len(tokens), 1) for agent_name, tokens in sorted(prompt_tokens.items())
+        },
+        "compaction": demo.get_context_compactor().stats,
+        "router": demo.get_orchestrator_router().stats,
+        "tavily_calls": fake_tavily.calls,
+        # Requests that shared an identical running request's execution, or were turned away at capacity.
+        "admission": {
+            "coalesced": telemetry.metrics.total("a2a_requests_coalesced_total"),
+            "rejected": telemetry.metrics.total("a2a_admission_rejected_total"),
+        },
+        "peak_rss_mb": {
+            "agents_process": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "largest_child_process": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        },
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    e2e = report["end_to_end"]
+    print(f"   {report['requests']} requests, {report['errors']} errors, {report['requests_per_s']} req/s")
+    print(f"   end-to-end     p50 {e2e['p50_ms']:9.1f} ms   p95 {e2e['p95_ms']:9.1f} ms   p99 {e2e['p99_ms']:9.1f} ms")
+    for hop, stats in report["hops"].items():
+        print(f"   {hop:<40} p50 {stats['p50_ms']:9.1f} ms   p95 {stats['p95_ms']:9.1f} ms   (n={stats['count']})")
+    for agent_name, tokens in report["prompt_tokens_per_turn"].items():
+        print(f"   prompt tokens per turn, {agent_name:<26} {tokens:9.1f}")
+    print(f"   compaction saved {report['compaction']['tokens_saved']} tokens")
+    print(f"   peak RSS {report['peak_rss_mb']['agents_process']} MB")
+    print(f"✅ Report written to {args.output}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the three-agent system.")
+    parser.add_argument("--requests", type=int, default=30, help="Requests sent to the orchestrator.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once.")
+    parser.add_argument("--scenario", choices=["scout", "analyst", "mixed", "two-step", "pipeline"], default="mixed",
+                        help="'two-step' and 'pipeline' each produce one full report per request.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake model call.")
+    parser.add_argument("--mcp-latency", type=float, default=0.05, help="Seconds per fake search_repositories call.")
+    parser.add_argument("--tavily-latency", type=float, default=0.05, help="Seconds per fake Tavily search.")
+    parser.add_argument("--tavily-content-chars", type=int, default=1500, help="Page content characters per fake search result.")
+    parser.add_argument("--llm-latency-per-1k-tokens", type=float, default=0.02,
+                        help="Extra seconds per fake model call for every 1000 prompt tokens.")
+    parser.add_argument("--compaction", choices=["on", "off"], default="on", help="Compact tool results before the model sees them.")
+    parser.add_argument("--coalesce", choices=["on", "off"], default="on",
+                        help="Let identical concurrent prompts share one execution.")
+    parser.add_argument("--rate-limits", choices=["on", "off"], default="off",
+                        help="'on' keeps the demo's GEMINI/GITHUB/TAVILY_RPM limits, to measure queueing under load.")
+    parser.add_argument("--cache-ttl", type=float, default=0, help="Tavily/GitHub search cache TTL; 0 measures uncached calls.")
+    parser.add_argument("--router", choices=["prerouter", "llm"], default="prerouter")
+    parser.add_argument("--analyst-mode", choices=["parallel", "sequential"], default="parallel")
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--base-port", type=int, default=11030, help="Orchestrator port; scout and analyst use the next two.")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds.")
+    parser.add_argument("--output", default="e2e_benchmark.json", help="Where the JSON report is written.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,158 @@
+# fake_gemini.py
+"""A scripted, offline stand-in for Gemini, used by the end-to-end benchmark.
+
+Register it with ADK and point the agents at it:
+
+    from google.adk.models.registry import LLMRegistry
+    LLMRegistry.register(FakeGeminiLlm)
+    # MODEL_NAME="fake-gemini" before the demo module is imported
+
+Each agent follows a fixed script of tool calls, chosen by the agent name ADK
+puts in the request labels and by how many tool results the current turn has
+collected so far. Every call sleeps FAKE_LLM_LATENCY seconds (default 0.05)
+plus FAKE_LLM_LATENCY_PER_1K_TOKENS seconds per thousand prompt tokens (default 0)
+to mimic a model round trip that slows down as the context grows.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from typing import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.05"))
+FAKE_LLM_LATENCY_PER_1K_TOKENS = float(os.getenv("FAKE_LLM_LATENCY_PER_1K_TOKENS", "0"))
+GITHUB_URL_PATTERN = re.compile(r"https://github\.com/[\w.-]+/[\w.-]+")
+
+# (agent name, call duration, prompt tokens) per call, read by the benchmark.
+call_log: list[tuple[str, float, int]] = []
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _current_turn(llm_request: LlmRequest) -> tuple[str, list[dict]]:
+    """Returns the latest user prompt and the tool results received since it, oldest first."""
+    prompt, results = "", []
+    for content in reversed(llm_request.contents):
+        parts = content.parts or []
+        responses = [part.function_response for part in parts if part.function_response]
+        if responses:
+            results[:0] = [{"name": r.name, "response": r.response or {}} for r in responses]
+            continue
+        text = "".join(part.text or "" for part in parts)
+        if content.role == "user" and text:
+            prompt = text
+            break
+    return prompt, results
+
+
+def _mcp_text(response: dict) -> str:
+    return "".join(item.get("text", "") for item in response.get("content", []) if isinstance(item, dict))
+
+
+def _repository_markdown(search_response: dict) -> str:
+    try:
+        items = json.loads(_mcp_text(search_response)).get("items", [])
+    except ValueError:
+        items = []
+    return "\n".join(
+        f"{rank}. **{item['full_name']}** - {item['html_url']}\n   {item['description']}"
+        for rank, item in enumerate(items, start=1)
+    )
+
+
+def _call(name: str, **args) -> types.Part:
+    return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+
+def _text(text: str) -> types.Part:
+    return types.Part(text=text)
+
+
+def _script_step(agent_name: str, tools: set[str], prompt: str, results: list[dict]) -> types.Part:
+    step = len(results)
+    if agent_name == "team_lead_agent":
+        analyst = re.search(r"analy|report|plan|business", prompt, re.IGNORECASE)
+        scout = re.search(r"find|search|discover", prompt, re.IGNORECASE)
+        if analyst and scout:
+            return _call("transfer_to_agent", agent_name="repository_pipeline")
+        return _call("transfer_to_agent",
+                     agent_name="github_repository_analyst" if analyst else "github_repository_scout")
+
+    if agent_name == "github_scout_agent":
+        if step == 0:
+            return _call("search_repositories", query=prompt[:100], perPage=5)
+        if step == 1:
+            return _call("save_file_locally", filename="repository_list.md",
+                         content=_repository_markdown(results[-1]["response"]))
+        return _text("Intelligence gathered. Top 5 repository details have been saved to repository_list.md.")
+
+    if agent_name == "repository_researcher_agent":
+        name = (GITHUB_URL_PATTERN.findall(prompt) or ["https://github.com/unknown/project"])[0].rsplit("/", 1)[-1]
+        if step == 0:
+            return _call("tavily_search_batch", queries=[
+                f"{name} business use cases", f"{name} target audience", f"{name} competitors"])
+        return _text(f"## {name}\n\n*   **Project Overview:** {name} is an example project.\n"
+                     f"*   **Target Audience:** Developers.\n*   **Potential Business Models:** SaaS offering.\n"
+                     f"*   **Key Messaging:** The fastest way to use {name}.\n"
+                     f"*   **Suggested Marketing Channels:** Content marketing on dev.to.")
+
+    if agent_name == "github_analyst_agent":
+        if "research_repositories_in_parallel" in tools:
+            if step == 0:
+                return _call("research_repositories_in_parallel",
+                             list_filename="repository_list.md", plan_filename="marketing_plan.md")
+        else:
+            if step == 0:
+                return _call("read_local_file", filename="repository_list.md")
+            if step == 1:
+                names = [url.rsplit("/", 1)[-1] for url in GITHUB_URL_PATTERN.findall(
+                    json.dumps(results[0]["response"]))]
+                return _call("tavily_search_batch", queries=[f"{n} business use cases" for n in names[:5]])
+            if step == 2:
+                return _call("save_file_locally", filename="marketing_plan.md",
+                             content="# Marketing Plan\n\nGenerated offline by the fake model.\n")
+        return _text("Business analysis complete. The marketing plan has been saved to output/marketing_plan.md.")
+
+    return _text(f"(fake model) {prompt[:200]}")
+
+
+class FakeGeminiLlm(BaseLlm):
+    """A deterministic `BaseLlm` that plays back the per-agent scripts above."""
+
+    model: str = "fake-gemini"
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"fake-.*"]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        started = time.perf_counter()
+        agent_name = ((llm_request.config.labels if llm_request.config else None) or {}).get("adk_agent_name", "")
+        prompt, results = _current_turn(llm_request)
+        prompt_tokens = sum(
+            _estimate_tokens(p.text or json.dumps(p.function_response.response if p.function_response else {}))
+            for c in llm_request.contents for p in c.parts or []
+        )
+        await asyncio.sleep(FAKE_LLM_LATENCY + FAKE_LLM_LATENCY_PER_1K_TOKENS * prompt_tokens / 1000)
+        part = _script_step(agent_name, set(llm_request.tools_dict), prompt, results)
+
+        output_tokens = _estimate_tokens(part.text or json.dumps(part.function_call.args if part.function_call else {}))
+        call_log.append((agent_name, time.perf_counter() - started, prompt_tokens))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
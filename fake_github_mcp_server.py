@@ -0,0 +1,57 @@
+# fake_github_mcp_server.py
+"""A stand-in for the GitHub MCP server that runs locally over stdio.
+
+It exposes a `search_repositories` tool with deterministic results, so the
+scout, the MCP session pool and benchmarks can run without Docker or a
+GITHUB_TOKEN. Point the scout at it with:
+
+    GITHUB_MCP_COMMAND="python fake_github_mcp_server.py"
+
+Options (the server is started with a minimal environment, so pass them on
+the command line; the environment variables are still read as defaults):
+    --latency        / FAKE_MCP_LATENCY        seconds each search takes (default 0)
+    --startup-delay  / FAKE_MCP_STARTUP_DELAY  seconds to sleep before serving, to mimic container start-up (default 0)
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+SEARCH_LATENCY = float(os.getenv("FAKE_MCP_LATENCY", "0"))
+STARTUP_DELAY = float(os.getenv("FAKE_MCP_STARTUP_DELAY", "0"))
+
+mcp = FastMCP("fake-github", log_level="WARNING")
+
+
+@mcp.tool()
+async def search_repositories(query: str, page: int = 1, perPage: int = 5) -> str:
+    """Search for GitHub repositories."""
+    if SEARCH_LATENCY:
+        await asyncio.sleep(SEARCH_LATENCY)
+    slug = "-".join(query.lower().split()) or "repo"
+    items = []
+    for rank in range((page - 1) * perPage + 1, page * perPage + 1):
+        digest = hashlib.sha1(f"{slug}:{rank}".encode()).hexdigest()[:6]
+        name = f"{slug}-{digest}"
+        items.append({
+            "full_name": f"example-{rank}/{name}",
+            "html_url": f"https://github.com/example-{rank}/{name}",
+            "description": f"Example repository #{rank} for '{query}'.",
+            "stargazers_count": 10_000 // rank,
+        })
+    return json.dumps({"total_count": 1000, "incomplete_results": False, "items": items, "pid": os.getpid()})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=SEARCH_LATENCY)
+    parser.add_argument("--startup-delay", type=float, default=STARTUP_DELAY)
+    args = parser.parse_args()
+    SEARCH_LATENCY, STARTUP_DELAY = args.latency, args.startup_delay
+    if STARTUP_DELAY:
+        time.sleep(STARTUP_DELAY)
+    mcp.run("stdio")
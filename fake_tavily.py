@@ -0,0 +1,41 @@
+# fake_tavily.py
+"""An offline stand-in for `tavily.TavilyClient`, used by the end-to-end benchmark.
+
+Only `search()` is implemented. It returns deterministic results after sleeping
+FAKE_TAVILY_LATENCY seconds (default 0.05), like a network round trip. Each result's
+content is padded to FAKE_TAVILY_CONTENT_CHARS characters (default 1500), about the
+size of an advanced-depth page extract.
+"""
+import hashlib
+import os
+import time
+
+FAKE_TAVILY_LATENCY = float(os.getenv("FAKE_TAVILY_LATENCY", "0.05"))
+FAKE_TAVILY_CONTENT_CHARS = int(os.getenv("FAKE_TAVILY_CONTENT_CHARS", "1500"))
+
+
+class FakeTavilyClient:
+    def __init__(self, api_key: str | None = None, latency: float = FAKE_TAVILY_LATENCY,
+                 content_chars: int = FAKE_TAVILY_CONTENT_CHARS):
+        self.latency = latency
+        self.content_chars = content_chars
+        self.calls = 0
+
+    def search(self, query: str, search_depth: str = "basic", max_results: int = 5, **kwargs) -> dict:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        for rank in range(1, max_results + 1):
+            digest = hashlib.sha1(f"{query}:{rank}".encode()).hexdigest()[:8]
+            content = f"Deterministic {search_depth} search result #{rank} about {query}."
+            filler = f" Page {digest} goes on about related products, pricing and community news."
+            while len(content) < self.content_chars:
+                content += filler
+            results.append({
+                "title": f"Result {rank} for {query}",
+                "url": f"https://example.com/{digest}",
+                "content": content,
+                "score": round(1.0 / rank, 3),
+            })
+        return {"query": query, "results": results}
@@ -0,0 +1,379 @@
+# mcp_pool.py
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Optional
+
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.auth.auth_credential import AuthCredential
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset, ToolPredicate
+from google.adk.tools.mcp_tool.mcp_tool import McpTool
+from google.adk.tools.tool_context import ToolContext
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+from cache_utils import TTLCache, normalize_query
+from rate_limits import NORMAL, RateLimitError, RateLimiter, RetryPolicy, call_with_retries, is_rate_limit_message
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledSession:
+    """One MCP server process and its initialized `ClientSession`.
+
+    The stdio transport uses anyio task groups, which must be entered and exited
+    from the same task, so each session lives inside its own background task
+    that stays parked until `close()` is called or the server process dies.
+    """
+
+    def __init__(self, server_params: StdioServerParameters, timeout: float):
+        self.server_params = server_params
+        self.timeout = timeout
+        self.session: ClientSession | None = None
+        self.created_at = time.monotonic()
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._error: BaseException | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        await asyncio.wait_for(self._ready.wait(), timeout=self.timeout)
+        if not self.alive:
+            raise ConnectionError(f"Failed to start MCP server: {self._error!r}")
+
+    async def _run(self) -> None:
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(read, write, read_timeout_seconds=timedelta(seconds=self.timeout)) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._ready.set()
+
+    async def ping(self, timeout: float) -> bool:
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+            with contextlib.suppress(BaseException):
+                await self._task
+
+
+class McpSessionPool:
+    """A pool of pre-started, health-checked stdio MCP server sessions.
+
+    Concurrent tool calls each lease their own session, so one slow call never
+    queues behind another on the same server process. At least `min_size`
+    sessions are kept warm, at most `max_size` are ever running, and dead or
+    unresponsive processes are replaced in the background.
+
+    The pool starts lazily on first use; call `start()` from the server's
+    startup hook to pay the process start-up and MCP handshake cost before the
+    first request arrives, and `close()` on shutdown. Closing also stops the
+    sessions still leased, so no server process outlives the pool.
+    """
+
+    def __init__(
+        self,
+        server_params: StdioServerParameters,
+        min_size: int = 1,
+        max_size: int = 4,
+        timeout: float = 120.0,
+        health_check_interval: float = 30.0,
+    ):
+        self.server_params = server_params
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.created = 0
+        self.recycled = 0
+        self._idle: list[_PooledSession] = []
+        self._leased: set[_PooledSession] = set()
+        self._size = 0  # running sessions plus sessions being started
+        self._condition = asyncio.Condition()
+        self._health_task: asyncio.Task | None = None
+        self._started = False
+        self._closed = False
+        self._background: set[asyncio.Task] = set()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "leased": self._size - len(self._idle),
+            "created": self.created,
+            "recycled": self.recycled,
+        }
+
+    async def start(self) -> None:
+        """Starts `min_size` sessions and the background health checker."""
+        if not self._started:
+            self._started = True
+            self._closed = False
+            if self.health_check_interval > 0:
+                self._health_task = asyncio.create_task(self._health_check_loop())
+        await self._replenish()
+
+    async def close(self) -> None:
+        """Stops the health checker and shuts down every server process, leased or idle."""
+        self._closed = True
+        self._started = False
+        if self._health_task is not None:
+            self._health_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._health_task
+            self._health_task = None
+        idle, self._idle = self._idle, []
+        leased, self._leased = list(self._leased), set()
+        await asyncio.gather(*(pooled.close() for pooled in idle + leased))
+        self._size -= len(idle) + len(leased)
+        async with self._condition:
+            self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def lease(self):
+        """Leases a session for the duration of the `async with` block."""
+        if not self._started:
+            await self.start()
+        pooled = await self._acquire()
+        healthy = True
+        try:
+            yield pooled.session
+        except Exception:
+            # Tool errors come back as results; an exception usually means the
+            # transport broke, so only keep the session if it still answers.
+            healthy = await pooled.ping(timeout=5)
+            raise
+        finally:
+            await self._release(pooled, healthy)
+
+    async def _acquire(self) -> _PooledSession:
+        async with self._condition:
+            while True:
+                if self._closed:
+                    raise ConnectionError("MCP session pool is closed.")
+                while self._idle:
+                    pooled = self._idle.pop()
+                    if pooled.alive:
+                        self._leased.add(pooled)
+                        return pooled
+                    self._discard(pooled)
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                await self._condition.wait()
+        try:
+            pooled = await self._new_session()
+        except BaseException:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._leased.add(pooled)
+        return pooled
+
+    async def _release(self, pooled: _PooledSession, healthy: bool) -> None:
+        if pooled not in self._leased:
+            return  # close() already shut it down
+        self._leased.discard(pooled)
+        if healthy and pooled.alive and not self._closed:
+            async with self._condition:
+                self._idle.append(pooled)
+                self._condition.notify()
+            return
+        async with self._condition:
+            self._discard(pooled)
+            self._condition.notify()
+        if not self._closed:
+            self._spawn(self._replenish())
+
+    def _spawn(self, coro) -> None:
+        # Keep a reference so background tasks are not garbage-collected mid-flight.
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _discard(self, pooled: _PooledSession) -> None:
+        # Caller holds the condition lock.
+        self._size -= 1
+        self.recycled += 1
+        logger.info("Recycling MCP session started %.0fs ago", time.monotonic() - pooled.created_at)
+        self._spawn(pooled.close())
+
+    async def _new_session(self) -> _PooledSession:
+        pooled = _PooledSession(self.server_params, self.timeout)
+        try:
+            await pooled.start()
+        except BaseException:
+            await pooled.close()
+            raise
+        self.created += 1
+        return pooled
+
+    async def _replenish(self) -> None:
+        """Starts sessions until `min_size` are running."""
+        async with self._condition:
+            missing = max(0, self.min_size - self._size)
+            self._size += missing
+        results = await asyncio.gather(*(self._new_session() for _ in range(missing)), return_exceptions=True)
+        async with self._condition:
+            for result in results:
+                if isinstance(result, BaseException):
+                    self._size -= 1
+                    logger.warning("Failed to start MCP session: %s", result)
+                elif self._closed:
+                    self._size -= 1
+                    self._spawn(result.close())
+                else:
+                    self._idle.append(result)
+            self._condition.notify_all()
+
+    async def _health_check_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            # Only idle sessions are checked; leased ones are checked when they fail.
+            async with self._condition:
+                idle, self._idle = self._idle, []
+            checks = await asyncio.gather(*(pooled.ping(timeout=10) for pooled in idle))
+            async with self._condition:
+                for pooled, healthy in zip(idle, checks):
+                    if healthy:
+                        self._idle.append(pooled)
+                    else:
+                        self._discard(pooled)
+                self._condition.notify_all()
+            await self._replenish()
+
+
+class PooledMcpTool(McpTool):
+    """An `McpTool` that runs each call on a leased pool session.
+
+    Calls to tools named in `cached_tools` are answered from `cache` when the
+    same arguments were seen within the cache TTL. With a `rate_limiter`, each call
+    waits for a slot, and a result reporting a rate limit is retried per `retry_policy`.
+    """
+
+    def __init__(self, *, mcp_tool, pool: McpSessionPool, cache: TTLCache | None = None, cacheable: bool = False,
+                 rate_limiter: RateLimiter | None = None, retry_policy: RetryPolicy | None = None,
+                 priority: int = NORMAL):
+        super().__init__(mcp_tool=mcp_tool, mcp_session_manager=None)
+        self._pool = pool
+        self._cache = cache if cacheable else None
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy
+        self._priority = priority
+
+    def _cache_key(self, args: dict[str, Any]) -> str:
+        normalized = {k: normalize_query(v) if k == "query" and isinstance(v, str) else v for k, v in args.items()}
+        return f"{self.name}:{json.dumps(normalized, sort_keys=True)}"
+
+    async def _run_async_impl(
+        self, *, args, tool_context: ToolContext, credential: AuthCredential
+    ) -> dict[str, Any]:
+        cache_key = self._cache_key(args) if self._cache is not None else None
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        async def call():
+            async with self._pool.lease() as session:
+                response = await session.call_tool(self._mcp_tool.name, arguments=args)
+            # The GitHub MCP server reports API errors, rate limits included, as error results.
+            if response.isError:
+                text = "".join(getattr(item, "text", "") for item in response.content)
+                if is_rate_limit_message(text):
+                    raise RateLimitError(text, result=response)
+            return response
+
+        if self._rate_limiter is None and self._retry_policy is None:
+            response = await call()
+        else:
+            try:
+                response = await call_with_retries(
+                    self._rate_limiter, call, priority=self._priority, policy=self._retry_policy)
+            except RateLimitError as e:
+                response = e.result
+        result = response.model_dump(exclude_none=True, mode="json")
+
+        if cache_key is not None and not response.isError:
+            self._cache.set(cache_key, result)
+        return result
+
+
+class PooledMcpToolset(BaseToolset):
+    """A drop-in replacement for `McpToolset` backed by an `McpSessionPool`."""
+
+    def __init__(
+        self,
+        *,
+        pool: McpSessionPool,
+        tool_filter: Optional[ToolPredicate | list[str]] = None,
+        cached_tools: Optional[list[str]] = None,
+        cache_ttl: float = 600.0,
+        cache_size: int = 256,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        priority: int = NORMAL,
+    ):
+        super().__init__(tool_filter=tool_filter)
+        self.pool = pool
+        self.cached_tools = set(cached_tools or [])
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.priority = priority
+        self._mcp_tools = None
+
+    async def start(self) -> None:
+        """Pre-starts the pool's warm sessions."""
+        await self.pool.start()
+
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> list[BaseTool]:
+        # The tool list is fixed for the lifetime of the server, so it is fetched once.
+        if self._mcp_tools is None:
+            async with self.pool.lease() as session:
+                self._mcp_tools = (await session.list_tools()).tools
+        tools = [
+            PooledMcpTool(
+                mcp_tool=mcp_tool,
+                pool=self.pool,
+                cache=self.cache,
+                cacheable=mcp_tool.name in self.cached_tools,
+                rate_limiter=self.rate_limiter,
+                retry_policy=self.retry_policy,
+                priority=self.priority,
+            )
+            for mcp_tool in self._mcp_tools
+        ]
+        return [tool for tool in tools if self._is_tool_selected(tool, readonly_context)]
+
+    async def close(self) -> None:
+        await self.pool.close()
@@ -0,0 +1,190 @@
+# pipeline.py
+"""Runs the scout and the analyst for one request, overlapping the two.
+
+`RepositoryPipelineAgent` is a sub-agent of the orchestrator. It streams the scout's
+task over A2A and picks each repository out of the scout's `search_repositories`
+result as soon as it arrives, then asks the analyst to research that repository
+while the scout is still formatting and saving its list. Sections stream back to
+the caller in list order as they finish, and the merged plan is the final answer.
+
+The analyst handles pipeline requests without its own LLM turn (see
+`handle_pipeline_request` in the demo module). They are carried in the A2A
+request metadata under PIPELINE_METADATA_KEY, never in the prompt, so no user
+text can trigger one; the prompt only describes the request:
+    {"action": "research", "repository": {"name": ..., "url": ..., "entry": ...}}
+    {"action": "save_plan", "filename": ..., "plan": ...}
+A request the analyst cannot carry out fails its task, which the pipeline sees
+as an `A2ATaskError`.
+"""
+import asyncio
+import json
+import time
+from typing import Any, AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.genai import types
+from pydantic import Field, PrivateAttr
+
+import telemetry
+from a2a_utils import A2ASimpleClient
+from artifact_store import inject_namespace_header
+
+PIPELINE_METADATA_KEY = "repository_pipeline"
+# Where ADK's A2A executor puts the request metadata in the run's RunConfig.custom_metadata.
+A2A_METADATA_KEY = "a2a_metadata"
+FALLBACK_ANALYST_PROMPT = "Now, analyze the repositories from the saved list and create the final report."
+
+
+def pipeline_request_metadata(action: str, **fields) -> dict:
+    return {PIPELINE_METADATA_KEY: {"action": action, **fields}}
+
+
+def decode_pipeline_request(custom_metadata: dict | None) -> dict | None:
+    """Returns the pipeline request in a run's custom metadata, or None for an ordinary prompt."""
+    metadata = (custom_metadata or {}).get(A2A_METADATA_KEY)
+    request = metadata.get(PIPELINE_METADATA_KEY) if isinstance(metadata, dict) else None
+    return request if isinstance(request, dict) and "action" in request else None
+
+
+def _mcp_text(response: dict) -> str:
+    content = response.get("content", [])
+    if isinstance(content, str):
+        return content
+    return "".join(item.get("text", "") for item in content if isinstance(item, dict))
+
+
+def extract_repository_records(data_parts: list[dict]) -> list[dict]:
+    """Finds the repositories in the scout's streamed `search_repositories` results.
+
+    ADK agents stream each tool result as a data part holding the function
+    response; the GitHub MCP server's result is JSON text with an `items` list.
+    """
+    records = []
+    for data in data_parts:
+        if data.get("name") != "search_repositories" or not isinstance(data.get("response"), dict):
+            continue
+        try:
+            items = json.loads(_mcp_text(data["response"])).get("items", [])
+        except (ValueError, AttributeError):
+            continue
+        for item in items:
+            if not isinstance(item, dict) or not item.get("html_url"):
+                continue
+            name = item.get("full_name") or item["html_url"].removeprefix("https://github.com/")
+            description = item.get("description") or ""
+            records.append({
+                "name": name,
+                "url": item["html_url"],
+                "entry": f"**{name}** - {item['html_url']}\n   {description}".rstrip(),
+            })
+    return records
+
+
+class RepositoryPipelineAgent(BaseAgent):
+    """Finds repositories with the scout and researches them with the analyst in one request."""
+
+    scout_url: str
+    analyst_url: str
+    parallelism: int = 5
+    plan_filename: str = "marketing_plan.md"
+    timeout: float = 600.0
+    # replica_pool.ReplicaPool for the scout and/or analyst, if they run several replicas.
+    replica_pools: list[Any] = Field(default_factory=list)
+
+    # Created on first use, so its connections belong to the serving event loop.
+    _client: A2ASimpleClient | None = PrivateAttr(default=None)
+
+    def _get_client(self) -> A2ASimpleClient:
+        if self._client is None:
+            self._client = A2ASimpleClient(
+                default_timeout=self.timeout,
+                max_connections=self.parallelism + 2,
+                request_hooks=[telemetry.inject_trace_headers, inject_namespace_header],
+                replica_pools=self.replica_pools,
+            )
+        return self._client
+
+    def _event(self, ctx: InvocationContext, text: str) -> Event:
+        return Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+        )
+
+    async def _call(self, remote_agent: str, agent_url: str, message: str, metadata: dict | None = None) -> str:
+        """Returns the agent's answer; raises `A2ATaskError` if the call or the agent's task fails."""
+        with telemetry.remote_call(remote_agent):
+            return await self._get_client().create_task(agent_url=agent_url, message=message, metadata=metadata,
+                                                        raise_errors=True)
+
+    async def _research(self, semaphore: asyncio.Semaphore, repository: dict) -> str:
+        async with semaphore:
+            try:
+                section = await self._call("github_repository_analyst", self.analyst_url,
+                                           f"Research {repository['url']} for the marketing plan.",
+                                           pipeline_request_metadata("research", repository=repository))
+            except Exception as e:
+                return f"## {repository['name']}\n\n_Research failed: {str(e).strip()}_"
+        return section.strip()
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        prompt = "".join(part.text or "" for part in (ctx.user_content.parts if ctx.user_content else None) or [])
+        client = self._get_client()
+        semaphore = asyncio.Semaphore(self.parallelism)
+        started = time.perf_counter()
+        research: dict[str, asyncio.Task] = {}
+        first_found_at = None
+
+        try:
+            # 1. Stream the scout's task and start researching each repository as soon as it is found.
+            with telemetry.remote_call("github_repository_scout"):
+                async for event in client.create_task_stream(agent_url=self.scout_url, message=prompt):
+                    if event.kind == "error":
+                        yield self._event(ctx, f"The scout failed: {event.text}")
+                        return
+                    new = [r for r in extract_repository_records(event.data) if r["url"] not in research]
+                    for repository in new:
+                        research[repository["url"]] = asyncio.create_task(self._research(semaphore, repository))
+                    if new:
+                        first_found_at = first_found_at or time.perf_counter() - started
+                        names = ", ".join(repository["name"] for repository in new)
+                        yield self._event(ctx, f"Found {len(new)} repositories, researching them now: {names}")
+            scout_done_at = time.perf_counter() - started
+
+            if not research:
+                # The scout's results could not be read; fall back to the saved-list flow.
+                yield self._event(ctx, "The scout finished; asking the analyst to analyze the saved list...")
+                try:
+                    answer = await self._call("github_repository_analyst", self.analyst_url, FALLBACK_ANALYST_PROMPT)
+                except Exception as e:
+                    answer = f"The analyst failed: {e}"
+                yield self._event(ctx, answer)
+                return
+
+            # 2. Stream each section back in list order as it becomes available.
+            sections = []
+            for task in research.values():
+                section = await task
+                sections.append(section)
+                yield self._event(ctx, section)
+
+            # 3. Have the analyst save the merged plan next to the scout's list.
+            plan = "# Marketing Plan\n\n" + "\n\n---\n\n".join(sections) + "\n"
+            try:
+                saved = await self._call("github_repository_analyst", self.analyst_url,
+                                         f"Save the merged marketing plan to {self.plan_filename}.",
+                                         pipeline_request_metadata("save_plan", filename=self.plan_filename, plan=plan))
+            except Exception as e:
+                saved = f"_The plan could not be saved: {e}_"
+            elapsed = time.perf_counter() - started
+            yield self._event(ctx, (
+                f"{plan}\n{saved.strip()}\n\n_Researched {len(sections)} repositories in {elapsed:.1f}s; "
+                f"the first was found after {first_found_at:.1f}s and the scout finished after {scout_done_at:.1f}s._"
+            ))
+        finally:
+            for task in research.values():
+                task.cancel()
+
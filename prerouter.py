@@ -0,0 +1,245 @@
+# prerouter.py
+import json
+import math
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from cache_utils import TTLCache, normalize_query
+
+SCOUT = "github_repository_scout"
+ANALYST = "github_repository_analyst"
+PIPELINE = "repository_pipeline"
+
+# Prompts that name exactly one of these intents are routed without any scoring. A prompt
+# that asks to find repositories and then analyze them matches the scout, the analyst and
+# the pipeline; it goes to the pipeline only if the classifier agrees (see `route`).
+DEFAULT_RULES = {
+    SCOUT: [r"\b(find|search|discover|locate|look(ing)? (for|up))\b", r"\btop\s+\d+\b"],
+    ANALYST: [r"\banaly[sz](e|is|ing)\b", r"\b(report|marketing|business|evaluate|assess)\b"],
+    PIPELINE: [r"\b(find|search|discover|locate)\b.*\b(then|and)\s+(then\s+)?"
+               r"(analy[sz]e|(create|write|generate|produce|build|make)\b.*\b(report|marketing plan|business plan))\b"],
+}
+
+# Seed examples for the classifier, taken from the orchestrator's instruction and the README.
+DEFAULT_TRAINING_EXAMPLES = [
+    ("Find the top 5 'ai agent application' repos and save the list.", SCOUT),
+    ("Find the top repos for 'AI agents'", SCOUT),
+    ("Search GitHub for popular vector database projects", SCOUT),
+    ("Which repositories are trending for retrieval augmented generation?", SCOUT),
+    ("Discover open-source LLM observability tools on GitHub", SCOUT),
+    ("Look for the most starred Rust web frameworks", SCOUT),
+    ("Get me a list of repositories about browser automation", SCOUT),
+    ("What are the best GitHub projects for speech recognition?", SCOUT),
+    ("Now, analyze the repositories from the saved list and create the final report.", ANALYST),
+    ("Analyze the saved list", ANALYST),
+    ("Create the marketing plan", ANALYST),
+    ("Write a business analysis of the projects we collected", ANALYST),
+    ("Generate a go-to-market strategy for the repositories in the list", ANALYST),
+    ("Who is the target audience for these projects and how could they make money?", ANALYST),
+    ("Evaluate the commercial potential of the saved repositories", ANALYST),
+    ("Turn the repository list into a marketing report", ANALYST),
+    ("Find the top 5 'ai agent application' repos and create a marketing plan for them.", PIPELINE),
+    ("Search for vector database projects, then write the business report", PIPELINE),
+    ("Discover LLM observability repositories and analyze their commercial potential", PIPELINE),
+]
+
+
+def tokenize(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class NaiveBayesClassifier:
+    """A tiny multinomial Naive Bayes text classifier with Laplace smoothing.
+
+    It trains in microseconds on a few dozen examples and predicts in well under a
+    millisecond, which is all a two-way routing decision needs.
+    """
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self._doc_counts: Counter[str] = Counter()
+        self._word_counts: dict[str, Counter[str]] = defaultdict(Counter)
+        self._vocabulary: set[str] = set()
+
+    def fit(self, examples: list[tuple[str, str]]) -> "NaiveBayesClassifier":
+        for text, label in examples:
+            words = tokenize(text)
+            self._doc_counts[label] += 1
+            self._word_counts[label].update(words)
+            self._vocabulary.update(words)
+        return self
+
+    def predict(self, text: str) -> tuple[str | None, float]:
+        """Returns the most likely label and its posterior probability."""
+        if not self._doc_counts:
+            return None, 0.0
+        words = [word for word in tokenize(text) if word in self._vocabulary]
+        total_docs = sum(self._doc_counts.values())
+        vocabulary_size = len(self._vocabulary)
+        log_scores = {}
+        for label, doc_count in self._doc_counts.items():
+            counts = self._word_counts[label]
+            denominator = sum(counts.values()) + self.alpha * vocabulary_size
+            log_scores[label] = math.log(doc_count / total_docs) + sum(
+                math.log((counts[word] + self.alpha) / denominator) for word in words
+            )
+        best = max(log_scores, key=log_scores.get)
+        # Softmax over the log scores gives the posterior of the winning label.
+        normalizer = sum(math.exp(score - log_scores[best]) for score in log_scores.values())
+        return best, 1.0 / normalizer
+
+
+@dataclass
+class RouteDecision:
+    agent: str | None  # None means the prompt is ambiguous and the LLM should decide
+    confidence: float
+    source: str        # "cache", "rule", "classifier", "llm" or "none"
+
+
+class PreRouter:
+    """Routes orchestrator prompts to a sub-agent without an LLM call when it is confident.
+
+    Plug it into an `Agent` with `before_model_callback=router.before_model_callback`
+    and `after_model_callback=router.after_model_callback`. For a confident
+    decision the before-model callback answers with a `transfer_to_agent` call,
+    so ADK hands the request straight to the chosen `RemoteA2aAgent`. Ambiguous
+    prompts go to the LLM as usual, and its choice is cached too.
+
+    Decisions are cached on the normalized prompt. `stats` reports how often the
+    LLM was skipped and, once prompts have been routed by the LLM, how much time
+    that saved at the LLM routing latency actually measured.
+    """
+
+    def __init__(
+        self,
+        agents: list[str],
+        rules: Optional[dict[str, list[str]]] = None,
+        training_examples: Optional[list[tuple[str, str]]] = None,
+        threshold: float = 0.75,
+        cache_size: int = 1024,
+        cache_ttl: float = 24 * 3600,
+    ):
+        self.agents = agents
+        self.threshold = threshold
+        self.rules = {
+            agent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for agent, patterns in (rules if rules is not None else DEFAULT_RULES).items()
+            if agent in agents
+        }
+        examples = training_examples if training_examples is not None else DEFAULT_TRAINING_EXAMPLES
+        self.classifier = NaiveBayesClassifier().fit([(t, a) for t, a in examples if a in agents])
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.counts: Counter[str] = Counter()
+        self._fast_path_seconds = 0.0
+        self._llm_latency_total = 0.0
+        self._pending: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    @staticmethod
+    def load_training_examples(path: str) -> list[tuple[str, str]]:
+        """Reads extra labelled prompts from a JSONL file of {"prompt": ..., "agent": ...} objects."""
+        examples = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    examples.append((row["prompt"], row["agent"]))
+        return examples
+
+    def route(self, prompt: str) -> RouteDecision:
+        """Decides locally, without calling the LLM."""
+        cached = self.cache.get(normalize_query(prompt))
+        if cached is not None:
+            return RouteDecision(cached, 1.0, "cache")
+
+        matched = [agent for agent, patterns in self.rules.items() if any(p.search(prompt) for p in patterns)]
+        agent, confidence = self.classifier.predict(prompt)
+        if PIPELINE in matched:
+            # Running both specialists is the costliest route, so a pattern match alone does not
+            # decide it: the scout and analyst patterns must match too, and the classifier agree.
+            if {SCOUT, ANALYST} <= set(matched) and agent == PIPELINE and confidence >= self.threshold:
+                return RouteDecision(PIPELINE, confidence, "rule")
+            return RouteDecision(None, confidence, "none")
+        if len(matched) == 1:
+            return RouteDecision(matched[0], 1.0, "rule")
+
+        if agent is not None and confidence >= self.threshold:
+            return RouteDecision(agent, confidence, "classifier")
+        return RouteDecision(None, confidence, "none")
+
+    @property
+    def average_llm_latency(self) -> float | None:
+        """Mean latency of the LLM routing turns measured so far, or None before the first."""
+        llm_calls = self.counts["llm"]
+        return self._llm_latency_total / llm_calls if llm_calls else None
+
+    @property
+    def latency_saved(self) -> float | None:
+        """Seconds the fast path saved: each local decision at the measured average LLM routing
+        latency, less the time the local decisions took. None until an LLM routing turn is measured."""
+        average = self.average_llm_latency
+        if average is None:
+            return None
+        fast_path = sum(self.counts.values()) - self.counts["llm"]
+        return max(0.0, fast_path * average - self._fast_path_seconds)
+
+    @property
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        fast_path = total - self.counts["llm"]
+        return {
+            "requests": total,
+            "cache_hits": self.counts["cache"],
+            "rule_hits": self.counts["rule"],
+            "classifier_hits": self.counts["classifier"],
+            "llm_fallbacks": self.counts["llm"],
+            "hit_rate": fast_path / total if total else 0.0,
+            # Both None until an LLM routing turn has been measured.
+            "average_llm_routing_latency_s": self.average_llm_latency,
+            "latency_saved_s": self.latency_saved,
+        }
+
+    def before_model_callback(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        # Only the first LLM turn of an invocation is a routing decision.
+        last = llm_request.contents[-1] if llm_request.contents else None
+        if last is None or last.role != "user" or any(part.function_response for part in last.parts or []):
+            return None
+        user_content = callback_context.user_content
+        prompt = "".join(part.text or "" for part in (user_content.parts if user_content else None) or [])
+        if not prompt.strip():
+            return None
+
+        started = time.perf_counter()
+        decision = self.route(prompt)
+        if decision.agent is None:
+            self._pending[callback_context.invocation_id] = (prompt, time.perf_counter())
+            # Failed LLM calls never reach the after-model callback; don't let them pile up.
+            while len(self._pending) > 1024:
+                self._pending.popitem(last=False)
+            return None
+
+        self.counts[decision.source] += 1
+        self.cache.set(normalize_query(prompt), decision.agent)
+        self._fast_path_seconds += time.perf_counter() - started
+        return LlmResponse(content=types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": decision.agent}))
+        ]))
+
+    def after_model_callback(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        if llm_response.partial or callback_context.invocation_id not in self._pending:
+            return None
+        prompt, started = self._pending.pop(callback_context.invocation_id)
+        self.counts["llm"] += 1
+        self._llm_latency_total += time.perf_counter() - started
+        for part in (llm_response.content.parts if llm_response.content else None) or []:
+            call = part.function_call
+            if call and call.name == "transfer_to_agent" and (call.args or {}).get("agent_name") in self.agents:
+                self.cache.set(normalize_query(prompt), call.args["agent_name"])
+        return None
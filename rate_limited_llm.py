@@ -0,0 +1,73 @@
+# rate_limited_llm.py
+"""An ADK model that sends every call through a shared `rate_limits.RateLimiter`.
+
+    Agent(model=RateLimitedLlm(model="gemini-2.5-flash", limiter=..., priorities={...}), ...)
+
+The wrapped model is resolved from `model` through ADK's LLM registry, so Gemini and
+the offline fake work alike. The queue priority comes from the calling agent's name,
+which ADK puts in the request labels. A call that fails with a rate limit or a
+transient error is retried per `retry_policy`. Responses are handed to the caller
+after the call has finished and its slot is free again, so with `stream=True`
+the chunks arrive together.
+"""
+import asyncio
+import itertools
+from typing import Any, AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from rate_limits import BULK, RateLimiter, RetryPolicy
+
+
+class RateLimitedLlm(BaseLlm):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    limiter: RateLimiter
+    # agent name -> queue priority; other agents get `default_priority`.
+    priorities: dict[str, int] = Field(default_factory=dict)
+    default_priority: int = BULK
+    retry_policy: RetryPolicy = Field(default_factory=RetryPolicy)
+
+    _llm: Any = PrivateAttr(default=None)
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        # Built directly, never looked up by model name.
+        return []
+
+    def _wrapped(self) -> BaseLlm:
+        if self._llm is None:
+            self._llm = LLMRegistry.new_llm(self.model)
+        return self._llm
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        agent_name = ((llm_request.config.labels if llm_request.config else None) or {}).get("adk_agent_name", "")
+        priority = self.priorities.get(agent_name, self.default_priority)
+        for attempt in itertools.count():
+            try:
+                # The slot is held only while the model produces its output. ADK runs the
+                # turn's tool calls, transfers and sub-agents while this generator is paused
+                # at a yield, and those may need a slot themselves, so the responses are
+                # passed on once the slot has been released.
+                async with self.limiter.slot(priority):
+                    responses = [
+                        response async for response in self._wrapped().generate_content_async(llm_request, stream)
+                    ]
+                break
+            except Exception as e:
+                delay = self.retry_policy.next_delay(attempt, e)
+                if delay is None:
+                    raise
+                self.limiter.record_retry(e)
+            await asyncio.sleep(delay)
+        for response in responses:
+            yield response
+
+    def connect(self, llm_request: LlmRequest):
+        return self._wrapped().connect(llm_request)
@@ -0,0 +1,367 @@
+# rate_limits.py
+"""Shared rate limiting and retries for the external APIs the agents call.
+
+Each provider (Gemini, GitHub, Tavily) gets one `RateLimiter` per process: a token
+bucket refilled at `rate_per_minute`, plus a cap on concurrent calls. Callers wait
+in a priority queue, so an interactive orchestrator routing turn is served before
+queued bulk analyst research. The limiter is thread-safe and works from any event
+loop as well as from plain threads (the Tavily searches run in a thread pool).
+
+With `state_path` set, the token bucket lives in a small JSON file guarded by an
+advisory file lock, so every process on the host draws from the same budget. The
+concurrency cap and queue ordering stay per process.
+
+`call_with_retries` (and `call_with_retries_sync`) retry rate-limited and transient
+failures with full-jitter exponential backoff, waiting for the server's Retry-After
+instead when it sends one.
+"""
+import asyncio
+import contextlib
+import email.utils
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are per process only.
+    fcntl = None
+
+import telemetry
+
+# Queue priorities; lower is served first.
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk"}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = ("Timeout", "ConnectError", "ConnectionError", "RemoteProtocolError", "ServerDisconnected")
+RATE_LIMIT_MESSAGE = re.compile(r"rate limit|too many requests|\b429\b|resource[ _]exhausted", re.IGNORECASE)
+RETRY_AFTER_MESSAGE = re.compile(
+    r"retry[ -]after\W{0,3}(\d+(?:\.\d+)?)|retryDelay\W{0,4}(\d+(?:\.\d+)?)s", re.IGNORECASE)
+MAX_RETRY_AFTER = 300.0
+
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class RateLimitError(Exception):
+    """A call that reported a rate limit in its result rather than by raising.
+
+    `result` is the original result, returned to the caller once retries run out.
+    """
+
+    def __init__(self, message: str, result=None, retry_after: float | None = None):
+        super().__init__(message)
+        self.result = result
+        self.retry_after = retry_after
+
+
+def status_code(exc: BaseException) -> int | None:
+    """The HTTP status of an SDK or HTTP-client error, if it carries one."""
+    for attribute in ("status_code", "code", "status"):
+        value = getattr(exc, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None) or getattr(response, "status", None)
+    return value if isinstance(value, int) else None
+
+
+def _parse_retry_after(value: str) -> float | None:
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """Seconds the server asked us to wait: a Retry-After header, or a delay named in the error text."""
+    if isinstance(getattr(exc, "retry_after", None), (int, float)):
+        return float(exc.retry_after)
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            return _parse_retry_after(value)
+    match = RETRY_AFTER_MESSAGE.search(str(exc))
+    if match:
+        return float(match.group(1) or match.group(2))
+    return None
+
+
+def is_rate_limit_message(text: str) -> bool:
+    """True if an error message returned in a tool result (rather than raised) reports a rate limit."""
+    return bool(RATE_LIMIT_MESSAGE.search(text))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, RateLimitError):
+        return True
+    if status_code(exc) in RETRYABLE_STATUS:
+        return True
+    return any(name in cls.__name__ for cls in type(exc).__mro__ for name in TRANSIENT_ERRORS)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def next_delay(self, attempt: int, exc: BaseException) -> float | None:
+        """Seconds to wait before retrying after `exc` on the 0-based `attempt`, or None to give up."""
+        if attempt + 1 >= self.max_attempts or not is_retryable(exc):
+            return None
+        delay = retry_after(exc)
+        if delay is not None:
+            return min(delay, MAX_RETRY_AFTER)
+        # Full jitter keeps callers that failed together from retrying together.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class _Waiter:
+    __slots__ = ("wake", "granted", "cancelled")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+        self.cancelled = False
+
+
+class RateLimiter:
+    """A token bucket plus a concurrency cap, served in priority order.
+
+    `rate_per_minute=0` disables the bucket and `max_concurrency=0` the cap. `burst`
+    is how many calls may start back to back after an idle period (default: 10
+    seconds' worth, at least 1).
+    """
+
+    def __init__(self, name: str, rate_per_minute: float = 0, max_concurrency: int = 0,
+                 burst: float | None = None, state_path: str | None = None):
+        self.name = name
+        self.rate = rate_per_minute / 60
+        self.capacity = burst if burst is not None else max(1.0, self.rate * 10)
+        self.max_concurrency = max_concurrency
+        self.state_path = state_path
+        if state_path:
+            os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    # --- Token bucket ---
+
+    def _refill(self, tokens: float, elapsed: float) -> float:
+        return min(self.capacity, tokens + elapsed * self.rate)
+
+    def _take_local_token(self) -> float:
+        now = time.monotonic()
+        self._tokens = self._refill(self._tokens, now - self._updated)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _take_shared_token(self) -> float:
+        with open(self.state_path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = {"tokens": self.capacity, "updated": time.time()}
+                now = time.time()
+                tokens = self._refill(state["tokens"], max(0.0, now - state["updated"]))
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+                if not wait:
+                    tokens -= 1
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "updated": now}))
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _take_token(self) -> float:
+        """Takes one token; returns 0, or the seconds until one will be available."""
+        if self.rate <= 0:
+            return 0.0
+        if self.state_path and fcntl is not None:
+            return self._take_shared_token()
+        return self._take_local_token()
+
+    # --- Queue ---
+
+    def _dispatch(self, caller: _Waiter | None = None) -> float | None:
+        """Grants slots to queued waiters in priority order while tokens and slots allow.
+
+        Returns how long `caller` should wait before trying again: the time to the
+        next token, or None if it waits for a slot to be released. A waiter at the
+        head of the queue that is only waiting for a token is woken up to wait for
+        it, since no release will come to wake it.
+        """
+        with self._lock:
+            while self._waiters:
+                _, _, waiter = self._waiters[0]
+                if waiter.cancelled:
+                    heapq.heappop(self._waiters)
+                    continue
+                if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                    return None
+                wait = self._take_token()
+                if wait:
+                    if waiter is not caller:
+                        waiter.wake()
+                    return wait
+                heapq.heappop(self._waiters)
+                waiter.granted = True
+                self._in_flight += 1
+                waiter.wake()
+            return None
+
+    def _enqueue(self, priority: int, wake) -> _Waiter:
+        waiter = _Waiter(wake)
+        with self._lock:
+            heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._gauge(priority, 1)
+        return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Removes a cancelled waiter, handing its slot on if it had already been granted one."""
+        with self._lock:
+            granted, waiter.cancelled = waiter.granted, True
+        if granted:
+            self.release()
+
+    def _gauge(self, priority: int, amount: int) -> None:
+        telemetry.metrics.add("rate_limiter_queue_depth", "Calls waiting for a rate limiter slot.",
+                              {"provider": self.name, "priority": PRIORITY_NAMES.get(priority, str(priority))}, amount)
+
+    def _granted(self, priority: int, started: float) -> None:
+        self._gauge(priority, -1)
+        telemetry.metrics.observe("rate_limiter_wait_seconds", "Time calls spent queued for a rate limiter slot.",
+                                  {"provider": self.name, "priority": PRIORITY_NAMES.get(priority, str(priority))},
+                                  time.monotonic() - started, WAIT_BUCKETS)
+
+    async def acquire(self, priority: int = NORMAL) -> None:
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        started = time.monotonic()
+        waiter = self._enqueue(priority, lambda: loop.call_soon_threadsafe(woken.set))
+        try:
+            while not waiter.granted:
+                woken.clear()
+                delay = self._dispatch(waiter)
+                if waiter.granted:
+                    break
+                try:
+                    await asyncio.wait_for(woken.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._gauge(priority, -1)
+            self._abandon(waiter)
+            raise
+        self._granted(priority, started)
+
+    def acquire_sync(self, priority: int = NORMAL) -> None:
+        woken = threading.Event()
+        started = time.monotonic()
+        waiter = self._enqueue(priority, woken.set)
+        try:
+            while not waiter.granted:
+                woken.clear()
+                delay = self._dispatch(waiter)
+                if waiter.granted:
+                    break
+                woken.wait(delay)
+        except BaseException:
+            self._gauge(priority, -1)
+            self._abandon(waiter)
+            raise
+        self._granted(priority, started)
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = NORMAL):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.contextmanager
+    def slot_sync(self, priority: int = NORMAL):
+        self.acquire_sync(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record_retry(self, exc: BaseException) -> None:
+        telemetry.metrics.inc("rate_limiter_retries_total", "Calls retried after a rate limit or transient error.",
+                              {"provider": self.name, "status": str(status_code(exc) or type(exc).__name__)})
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queued": sum(1 for _, _, waiter in self._waiters if not waiter.cancelled),
+                "rate_per_minute": self.rate * 60,
+                "max_concurrency": self.max_concurrency,
+            }
+
+
+async def call_with_retries(limiter: RateLimiter | None, call, *, priority: int = NORMAL,
+                            policy: RetryPolicy | None = None):
+    """Awaits `call()` inside a limiter slot, retrying per `policy`. The backoff happens outside the slot."""
+    policy = policy or RetryPolicy()
+    for attempt in itertools.count():
+        try:
+            async with limiter.slot(priority) if limiter else contextlib.nullcontext():
+                return await call()
+        except Exception as e:
+            delay = policy.next_delay(attempt, e)
+            if delay is None:
+                raise
+            if limiter:
+                limiter.record_retry(e)
+        await asyncio.sleep(delay)
+
+
+def call_with_retries_sync(limiter: RateLimiter | None, call, *, priority: int = NORMAL,
+                           policy: RetryPolicy | None = None):
+    """The blocking twin of `call_with_retries`, for code running in worker threads."""
+    policy = policy or RetryPolicy()
+    for attempt in itertools.count():
+        try:
+            with limiter.slot_sync(priority) if limiter else contextlib.nullcontext():
+                return call()
+        except Exception as e:
+            delay = policy.next_delay(attempt, e)
+            if delay is None:
+                raise
+            if limiter:
+                limiter.record_retry(e)
+        time.sleep(delay)
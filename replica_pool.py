@@ -0,0 +1,316 @@
+# replica_pool.py
+"""Client-side load balancing over several replicas of one agent.
+
+A `ReplicaPool` stands for one agent reachable at a single logical URL (the URL in
+its agent card) and served by several replica endpoints. `LoadBalancingTransport`
+is an httpx transport that sends each request for that URL to one of the replicas:
+
+  - Least outstanding requests: the replica with the fewest requests in flight
+    from this process wins, ties broken at random. A streamed response counts as
+    outstanding until the stream is closed.
+  - Session affinity: requests naming a task or context (taskId/contextId in the
+    JSON-RPC body, or the task ID of tasks/get and friends) go to the replica
+    that served that task or context before, since tasks live in that replica's
+    task store. The IDs are learned from the start of each response.
+  - Health checks: every `health_interval` seconds each replica's agent card is
+    fetched; a replica that does not serve a card with the expected agent name
+    is taken out of rotation until it does.
+  - Outlier ejection: after `failure_threshold` consecutive connection errors or
+    5xx responses a replica is ejected for `ejection_time` seconds, doubling with
+    each repeated ejection, but never more than `max_ejected_fraction` of the
+    pool at once. A request that cannot connect is retried once on another replica.
+
+If no replica is available, requests are spread over all of them anyway rather
+than failing outright.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Same as a2a.utils.constants.AGENT_CARD_WELL_KNOWN_PATH.
+AGENT_CARD_WELL_KNOWN_PATH = "/.well-known/agent-card.json"
+# JSON-RPC methods whose params.id is a task ID.
+TASK_METHODS = {"tasks/get", "tasks/cancel", "tasks/resubscribe", "tasks/pushNotificationConfig/get",
+                "tasks/pushNotificationConfig/set", "tasks/pushNotificationConfig/list",
+                "tasks/pushNotificationConfig/delete"}
+RESPONSE_IDS = re.compile(rb'"(contextId|taskId)"\s*:\s*"([^"]+)"')
+# How much of a response is scanned for the task and context IDs it assigned.
+SNIFF_BYTES = 64 * 1024
+
+
+def _origin(url: str) -> tuple[str, str, int]:
+    parts = urlsplit(url)
+    return parts.scheme, parts.hostname or "", parts.port or (443 if parts.scheme == "https" else 80)
+
+
+@dataclass
+class Replica:
+    url: str
+    outstanding: int = 0
+    # Until the first health check, every replica is assumed to be up.
+    healthy: bool = True
+    card_name: str | None = None
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+
+    @property
+    def origin(self) -> tuple[str, str, int]:
+        return _origin(self.url)
+
+
+class ReplicaPool:
+    """Replicas of the agent at `service_url`; see the module docstring."""
+
+    def __init__(self, name: str, service_url: str, replica_urls: list[str], *, expected_card_name: str | None = None,
+                 health_interval: float = 10.0, failure_threshold: int = 3, ejection_time: float = 30.0,
+                 max_ejected_fraction: float = 0.5, max_affinities: int = 10_000):
+        self.name = name
+        self.service_url = service_url
+        # The service URL itself is a replica unless it is listed already.
+        urls = list(dict.fromkeys([service_url, *replica_urls], None))
+        self.replicas = [Replica(url) for url in urls]
+        self.expected_card_name = expected_card_name
+        self.health_interval = health_interval
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.max_ejected_fraction = max_ejected_fraction
+        self.max_affinities = max_affinities
+        # "task:<id>" / "context:<id>" -> replica that holds it
+        self._affinity: OrderedDict[str, Replica] = OrderedDict()
+        self._health_task: asyncio.Task | None = None
+
+    @property
+    def origin(self) -> tuple[str, str, int]:
+        return _origin(self.service_url)
+
+    def _labels(self, replica: Replica) -> dict:
+        return {"service": self.name, "replica": replica.url}
+
+    # --- Choosing a replica ---
+
+    def available(self) -> list[Replica]:
+        now = time.monotonic()
+        up = [r for r in self.replicas if r.healthy and r.ejected_until <= now]
+        return up or [r for r in self.replicas if r.ejected_until <= now] or self.replicas
+
+    def choose(self, affinity_keys: list[str] = (), exclude: tuple[Replica, ...] = ()) -> Replica:
+        candidates = [r for r in self.available() if r not in exclude] or self.available()
+        for key in affinity_keys:
+            replica = self._affinity.get(key)
+            if replica in candidates:
+                self._affinity.move_to_end(key)
+                return replica
+        fewest = min(r.outstanding for r in candidates)
+        replica = random.choice([r for r in candidates if r.outstanding == fewest])
+        for key in affinity_keys:
+            self.bind(key, replica)
+        return replica
+
+    def bind(self, key: str, replica: Replica) -> None:
+        self._affinity[key] = replica
+        self._affinity.move_to_end(key)
+        while len(self._affinity) > self.max_affinities:
+            self._affinity.popitem(last=False)
+
+    # --- Bookkeeping ---
+
+    def started(self, replica: Replica) -> None:
+        replica.outstanding += 1
+        telemetry.metrics.add("a2a_replica_outstanding_requests", "Requests in flight to an agent replica.",
+                              self._labels(replica), 1)
+
+    def finished(self, replica: Replica) -> None:
+        replica.outstanding -= 1
+        telemetry.metrics.add("a2a_replica_outstanding_requests", "Requests in flight to an agent replica.",
+                              self._labels(replica), -1)
+
+    def record(self, replica: Replica, ok: bool) -> None:
+        telemetry.metrics.inc("a2a_replica_requests_total", "Requests sent to an agent replica.",
+                              {**self._labels(replica), "outcome": "ok" if ok else "error"})
+        if ok:
+            replica.consecutive_failures = 0
+            return
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures < self.failure_threshold:
+            return
+        now = time.monotonic()
+        ejected = sum(1 for r in self.replicas if r.ejected_until > now)
+        if ejected + 1 > self.max_ejected_fraction * len(self.replicas):
+            return
+        replica.ejected_until = now + self.ejection_time * 2 ** min(replica.ejections, 4)
+        replica.ejections += 1
+        replica.consecutive_failures = 0
+        telemetry.metrics.inc("a2a_replica_ejections_total", "Times a failing agent replica was taken out of rotation.",
+                              self._labels(replica))
+        logger.warning("Ejected replica %s of %s for %.0fs after repeated failures.",
+                       replica.url, self.name, replica.ejected_until - now)
+
+    # --- Health checks ---
+
+    async def check_health(self, client: httpx.AsyncClient) -> None:
+        """Fetches every replica's agent card and updates which replicas are healthy."""
+        async def check(replica: Replica) -> None:
+            try:
+                response = await client.get(replica.url.rstrip("/") + AGENT_CARD_WELL_KNOWN_PATH)
+                response.raise_for_status()
+                replica.card_name = response.json().get("name")
+                # The first card seen defines which agent this pool is for.
+                if self.expected_card_name is None:
+                    self.expected_card_name = replica.card_name
+                healthy = replica.card_name == self.expected_card_name
+            except (httpx.HTTPError, ValueError, AttributeError):
+                healthy = False
+            if healthy != replica.healthy:
+                logger.info("Replica %s of %s is now %s.", replica.url, self.name, "healthy" if healthy else "unhealthy")
+                telemetry.metrics.add("a2a_replica_unhealthy", "Agent replicas failing their health check.",
+                                      self._labels(replica), -1 if healthy else 1)
+            replica.healthy = healthy
+
+        await asyncio.gather(*(check(replica) for replica in self.replicas))
+
+    async def _health_loop(self) -> None:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
+            while True:
+                await self.check_health(client)
+                await asyncio.sleep(self.health_interval)
+
+    def ensure_health_checks(self) -> None:
+        """Starts the health checks on the running event loop, once."""
+        if self.health_interval > 0 and (self._health_task is None or self._health_task.done()):
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def close(self) -> None:
+        """Stops the health checks; the next request through the pool starts them again."""
+        task, self._health_task = self._health_task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    @property
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "service_url": self.service_url,
+            "agent": self.expected_card_name,
+            "replicas": [
+                {
+                    "url": r.url,
+                    "healthy": r.healthy,
+                    "outstanding": r.outstanding,
+                    "ejected_for_s": round(max(0.0, r.ejected_until - now), 1),
+                    "ejections": r.ejections,
+                }
+                for r in self.replicas
+            ],
+            "affinities": len(self._affinity),
+        }
+
+
+def _affinity_keys(request: httpx.Request) -> list[str]:
+    """The task and context a JSON-RPC request refers to, most specific first."""
+    if request.method != "POST":
+        return []
+    try:
+        body = json.loads(request.content)
+    except (httpx.RequestNotRead, ValueError):
+        return []
+    params = body.get("params") if isinstance(body, dict) else None
+    if not isinstance(params, dict):
+        return []
+    if body.get("method") in TASK_METHODS and params.get("id"):
+        return [f"task:{params['id']}"]
+    message = params.get("message")
+    if not isinstance(message, dict):
+        return []
+    keys = []
+    if message.get("taskId"):
+        keys.append(f"task:{message['taskId']}")
+    if message.get("contextId"):
+        keys.append(f"context:{message['contextId']}")
+    return keys
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Passes a response body through, learning the IDs it assigns and ending the request on close."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, pool: ReplicaPool, replica: Replica):
+        self._stream = stream
+        self._pool = pool
+        self._replica = replica
+        self._scanned = b""
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if len(self._scanned) < SNIFF_BYTES:
+                self._scanned += chunk
+                for kind, value in RESPONSE_IDS.findall(self._scanned[:SNIFF_BYTES]):
+                    key = f"{'task' if kind == b'taskId' else 'context'}:{value.decode('utf-8', 'replace')}"
+                    self._pool.bind(key, self._replica)
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._pool.finished(self._replica)
+        await self._stream.aclose()
+
+
+class LoadBalancingTransport(httpx.AsyncBaseTransport):
+    """Sends requests for each pool's service URL to one of its replicas; other requests pass through."""
+
+    def __init__(self, pools: list[ReplicaPool], transport: httpx.AsyncBaseTransport | None = None):
+        self._pools = {pool.origin: pool for pool in pools}
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        pool = self._pools.get(_origin(str(request.url)))
+        if pool is None:
+            return await self._transport.handle_async_request(request)
+        pool.ensure_health_checks()
+        keys = _affinity_keys(request)
+        tried: tuple[Replica, ...] = ()
+        while True:
+            replica = pool.choose(keys, exclude=tried)
+            scheme, host, port = replica.origin
+            request.url = request.url.copy_with(scheme=scheme, host=host, port=port)
+            request.headers["Host"] = f"{host}:{port}"
+            pool.started(replica)
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.ConnectError:
+                pool.finished(replica)
+                pool.record(replica, ok=False)
+                tried += (replica,)
+                # Nothing was sent, so the request can go to another replica, once.
+                if len(tried) < 2 and len(pool.replicas) > 1:
+                    continue
+                raise
+            except BaseException:
+                pool.finished(replica)
+                raise
+            pool.record(replica, ok=response.status_code < 500)
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=_TrackedStream(response.stream, pool, replica),
+                extensions=response.extensions,
+            )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
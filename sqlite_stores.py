@@ -0,0 +1,490 @@
+# sqlite_stores.py
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Optional
+
+import aiosqlite
+from a2a.server.context import ServerCallContext
+from a2a.server.tasks import TaskStore
+from a2a.types import Task
+from google.adk.artifacts.base_artifact_service import ArtifactVersion, BaseArtifactService
+from google.adk.events.event import Event
+from google.adk.memory.base_memory_service import BaseMemoryService, SearchMemoryResponse
+from google.adk.memory.memory_entry import MemoryEntry
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.sqlite_session_service import CREATE_SCHEMA_SQL, SqliteSessionService
+from google.genai import types
+
+
+class SqlitePool:
+    """A small pool of aiosqlite connections to one WAL-mode database file.
+
+    aiosqlite runs each connection on its own thread, so queries never block
+    the agent's event loop. WAL mode lets readers proceed while a writer
+    commits. Connections are opened lazily, on the loop that first uses them.
+    `close()` closes every connection, including ones still checked out.
+    """
+
+    def __init__(self, path: str, size: int = 4, schema: str = ""):
+        self.path = path
+        self.size = size
+        self.schema = schema
+        self._idle: asyncio.Queue[aiosqlite.Connection] | None = None
+        self._opened = 0
+        self._open_lock: asyncio.Lock | None = None
+        # Every connection the pool opened and has not closed, idle or checked out.
+        self._connections: set[aiosqlite.Connection] = set()
+
+    async def _open(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path)
+        db.row_factory = aiosqlite.Row
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute("PRAGMA foreign_keys=ON")
+        await db.execute("PRAGMA busy_timeout=5000")
+        if self.schema and self._opened == 0:
+            await db.executescript(self.schema)
+        self._opened += 1
+        self._connections.add(db)
+        return db
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._open_lock = asyncio.Lock()
+        if self._idle.empty() and self._opened < self.size:
+            async with self._open_lock:
+                if self._opened < self.size:
+                    await self._idle.put(await self._open())
+        db = await self._idle.get()
+        try:
+            yield db
+        finally:
+            # A connection the pool closed while it was checked out is not handed out again.
+            if db in self._connections:
+                # Never hand the next caller a connection with a half-finished transaction.
+                if db.in_transaction:
+                    await db.rollback()
+                self._idle.put_nowait(db)
+
+    async def close(self) -> None:
+        connections, self._connections = self._connections, set()
+        for db in connections:
+            await db.close()
+        self._opened = 0
+        self._idle = None
+
+
+class _Evictor:
+    """Decides when a store is due for an eviction pass, so eviction runs at
+    most once per `interval` seconds instead of on every write."""
+
+    def __init__(self, max_items: int, max_age: float, interval: float):
+        self.max_items = max_items
+        self.max_age = max_age
+        self.interval = interval
+        self._last_run = 0.0
+
+    def due(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_run < self.interval:
+            return False
+        self._last_run = now
+        return True
+
+
+# ------------------------------------------------------------------------------
+# A2A task store
+# ------------------------------------------------------------------------------
+TASKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    context_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    update_time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_update_time ON tasks (update_time);
+"""
+
+
+class SqliteTaskStore(TaskStore):
+    """An A2A `TaskStore` persisted to SQLite.
+
+    Tasks older than `max_age` seconds are evicted, as are the least recently
+    updated tasks beyond the newest `max_tasks`.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, max_tasks: int = 10_000,
+                 max_age: float = 7 * 24 * 3600, eviction_interval: float = 60.0):
+        self.pool = SqlitePool(path, size=pool_size, schema=TASKS_SCHEMA)
+        self._evictor = _Evictor(max_tasks, max_age, eviction_interval)
+
+    async def save(self, task: Task, context: ServerCallContext | None = None) -> None:
+        async with self.pool.connection() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO tasks (id, context_id, data, update_time) VALUES (?, ?, ?, ?)",
+                (task.id, task.context_id, task.model_dump_json(exclude_none=True), time.time()),
+            )
+            await db.commit()
+        if self._evictor.due():
+            await self.evict()
+
+    async def get(self, task_id: str, context: ServerCallContext | None = None) -> Task | None:
+        async with self.pool.connection() as db:
+            async with db.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)) as cursor:
+                row = await cursor.fetchone()
+        return Task.model_validate_json(row["data"]) if row else None
+
+    async def delete(self, task_id: str, context: ServerCallContext | None = None) -> None:
+        async with self.pool.connection() as db:
+            await db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            await db.commit()
+
+    async def evict(self) -> int:
+        async with self.pool.connection() as db:
+            cursor = await db.execute("DELETE FROM tasks WHERE update_time < ?", (time.time() - self._evictor.max_age,))
+            evicted = cursor.rowcount
+            cursor = await db.execute(
+                "DELETE FROM tasks WHERE id NOT IN (SELECT id FROM tasks ORDER BY update_time DESC LIMIT ?)",
+                (self._evictor.max_items,),
+            )
+            evicted += cursor.rowcount
+            await db.commit()
+        return evicted
+
+
+# ------------------------------------------------------------------------------
+# ADK session service
+# ------------------------------------------------------------------------------
+class PooledSqliteSessionService(SqliteSessionService):
+    """ADK's `SqliteSessionService` with pooled WAL connections, an in-process
+    LRU hot cache of active sessions, and size/age-based eviction.
+
+    The stock service opens a new connection and re-runs its schema script for
+    every call. Here connections are reused, and a cached session is served
+    after a single `update_time` lookup instead of reloading and re-parsing its
+    whole event history.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, hot_cache_size: int = 256,
+                 max_sessions: int = 10_000, max_age: float = 7 * 24 * 3600,
+                 eviction_interval: float = 60.0):
+        super().__init__(path)
+        self.pool = SqlitePool(path, size=pool_size, schema=CREATE_SCHEMA_SQL)
+        self.hot_cache_size = hot_cache_size
+        self.hot_hits = 0
+        self.hot_misses = 0
+        self._hot: OrderedDict[tuple[str, str, str], Session] = OrderedDict()
+        self._evictor = _Evictor(max_sessions, max_age, eviction_interval)
+
+    @asynccontextmanager
+    async def _get_db_connection(self):
+        async with self.pool.connection() as db:
+            yield db
+
+    def _remember(self, session: Session) -> None:
+        key = (session.app_name, session.user_id, session.id)
+        self._hot[key] = session
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_cache_size:
+            self._hot.popitem(last=False)
+
+    async def create_session(self, *, app_name: str, user_id: str,
+                             state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        self._remember(session.model_copy(deep=True))
+        if self._evictor.due():
+            await self.evict()
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        cached = self._hot.get(key) if config is None else None
+        if cached is not None:
+            async with self._get_db_connection() as db:
+                async with db.execute(
+                    "SELECT update_time FROM sessions WHERE app_name=? AND user_id=? AND id=?", key
+                ) as cursor:
+                    row = await cursor.fetchone()
+            if row is None:
+                self._hot.pop(key, None)
+                return None
+            if row["update_time"] == cached.last_update_time:
+                self._hot.move_to_end(key)
+                self.hot_hits += 1
+                return cached.model_copy(deep=True)
+        self.hot_misses += 1
+
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if session is not None and config is None:
+            self._remember(session.model_copy(deep=True))
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._hot.pop((app_name, user_id, session_id), None)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session, event)
+        if event.partial:
+            return event
+        delta = event.actions.state_delta if event.actions else None
+        if delta and any(k.startswith(("app:", "user:")) for k in delta):
+            # App/user state is shared between sessions, so other cached copies are now stale.
+            self._hot.clear()
+        self._remember(session.model_copy(deep=True))
+        return event
+
+    async def evict(self) -> int:
+        """Deletes sessions (and, via cascade, their events) that are too old or
+        beyond the newest `max_sessions`."""
+        async with self._get_db_connection() as db:
+            rows = await db.execute_fetchall(
+                "SELECT app_name, user_id, id FROM sessions WHERE update_time < ? "
+                "UNION SELECT app_name, user_id, id FROM sessions WHERE rowid NOT IN "
+                "(SELECT rowid FROM sessions ORDER BY update_time DESC LIMIT ?)",
+                (time.time() - self._evictor.max_age, self._evictor.max_items),
+            )
+            keys = [(row["app_name"], row["user_id"], row["id"]) for row in rows]
+            await db.executemany("DELETE FROM sessions WHERE app_name=? AND user_id=? AND id=?", keys)
+            await db.commit()
+        for key in keys:
+            self._hot.pop(key, None)
+        return len(keys)
+
+
+# ------------------------------------------------------------------------------
+# ADK artifact service
+# ------------------------------------------------------------------------------
+ARTIFACTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    artifact_version TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, filename, version)
+);
+CREATE INDEX IF NOT EXISTS artifacts_create_time ON artifacts (create_time);
+"""
+
+
+class SqliteArtifactService(BaseArtifactService):
+    """An ADK artifact service persisted to SQLite.
+
+    Like `InMemoryArtifactService`, filenames starting with "user:" are shared
+    by all of a user's sessions. Artifact versions older than `max_age`
+    seconds, or beyond the newest `max_artifacts`, are evicted.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, max_artifacts: int = 10_000,
+                 max_age: float = 7 * 24 * 3600, eviction_interval: float = 60.0):
+        self.pool = SqlitePool(path, size=pool_size, schema=ARTIFACTS_SCHEMA)
+        self._evictor = _Evictor(max_artifacts, max_age, eviction_interval)
+
+    @staticmethod
+    def _scope(filename: str, session_id: Optional[str]) -> str:
+        if filename.startswith("user:"):
+            return ""
+        if session_id is None:
+            raise ValueError("Session ID must be provided for session-scoped artifacts.")
+        return session_id
+
+    async def save_artifact(self, *, app_name: str, user_id: str, filename: str, artifact: types.Part,
+                            session_id: Optional[str] = None,
+                            custom_metadata: Optional[dict[str, Any]] = None) -> int:
+        scope = self._scope(filename, session_id)
+        async with self.pool.connection() as db:
+            async with db.execute(
+                "SELECT COALESCE(MAX(version) + 1, 0) FROM artifacts "
+                "WHERE app_name=? AND user_id=? AND session_id=? AND filename=?",
+                (app_name, user_id, scope, filename),
+            ) as cursor:
+                version = (await cursor.fetchone())[0]
+            mime_type = (artifact.inline_data.mime_type if artifact.inline_data
+                         else "text/plain" if artifact.text is not None
+                         else artifact.file_data.mime_type if artifact.file_data else None)
+            artifact_version = ArtifactVersion(
+                version=version,
+                canonical_uri=f"sqlite://{app_name}/{user_id}/{scope or 'user'}/{filename}/versions/{version}",
+                custom_metadata=custom_metadata or {},
+                mime_type=mime_type,
+            )
+            await db.execute(
+                "INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (app_name, user_id, scope, filename, version, artifact.model_dump_json(exclude_none=True),
+                 artifact_version.model_dump_json(exclude_none=True), time.time()),
+            )
+            await db.commit()
+        if self._evictor.due():
+            await self.evict()
+        return version
+
+    async def _select_version(self, column: str, app_name: str, user_id: str, filename: str,
+                              session_id: Optional[str], version: Optional[int]):
+        scope = self._scope(filename, session_id)
+        query = (f"SELECT {column} FROM artifacts WHERE app_name=? AND user_id=? AND session_id=? AND filename=? "
+                 + ("AND version=?" if version is not None else "ORDER BY version DESC LIMIT 1"))
+        params = (app_name, user_id, scope, filename) + ((version,) if version is not None else ())
+        async with self.pool.connection() as db:
+            async with db.execute(query, params) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def load_artifact(self, *, app_name: str, user_id: str, filename: str,
+                            session_id: Optional[str] = None, version: Optional[int] = None) -> Optional[types.Part]:
+        data = await self._select_version("data", app_name, user_id, filename, session_id, version)
+        return types.Part.model_validate_json(data) if data else None
+
+    async def get_artifact_version(self, *, app_name: str, user_id: str, filename: str,
+                                   session_id: Optional[str] = None,
+                                   version: Optional[int] = None) -> Optional[ArtifactVersion]:
+        data = await self._select_version("artifact_version", app_name, user_id, filename, session_id, version)
+        return ArtifactVersion.model_validate_json(data) if data else None
+
+    async def list_artifact_keys(self, *, app_name: str, user_id: str,
+                                 session_id: Optional[str] = None) -> list[str]:
+        async with self.pool.connection() as db:
+            rows = await db.execute_fetchall(
+                "SELECT DISTINCT filename FROM artifacts WHERE app_name=? AND user_id=? AND session_id IN ('', ?)",
+                (app_name, user_id, session_id or ""),
+            )
+        return sorted(row["filename"] for row in rows)
+
+    async def delete_artifact(self, *, app_name: str, user_id: str, filename: str,
+                              session_id: Optional[str] = None) -> None:
+        scope = self._scope(filename, session_id)
+        async with self.pool.connection() as db:
+            await db.execute(
+                "DELETE FROM artifacts WHERE app_name=? AND user_id=? AND session_id=? AND filename=?",
+                (app_name, user_id, scope, filename),
+            )
+            await db.commit()
+
+    async def list_artifact_versions(self, *, app_name: str, user_id: str, filename: str,
+                                     session_id: Optional[str] = None) -> list[ArtifactVersion]:
+        scope = self._scope(filename, session_id)
+        async with self.pool.connection() as db:
+            rows = await db.execute_fetchall(
+                "SELECT artifact_version FROM artifacts WHERE app_name=? AND user_id=? AND session_id=? "
+                "AND filename=? ORDER BY version",
+                (app_name, user_id, scope, filename),
+            )
+        return [ArtifactVersion.model_validate_json(row["artifact_version"]) for row in rows]
+
+    async def list_versions(self, *, app_name: str, user_id: str, filename: str,
+                            session_id: Optional[str] = None) -> list[int]:
+        versions = await self.list_artifact_versions(
+            app_name=app_name, user_id=user_id, filename=filename, session_id=session_id)
+        return [v.version for v in versions]
+
+    async def evict(self) -> int:
+        async with self.pool.connection() as db:
+            cursor = await db.execute("DELETE FROM artifacts WHERE create_time < ?",
+                                      (time.time() - self._evictor.max_age,))
+            evicted = cursor.rowcount
+            cursor = await db.execute(
+                "DELETE FROM artifacts WHERE rowid NOT IN "
+                "(SELECT rowid FROM artifacts ORDER BY create_time DESC LIMIT ?)",
+                (self._evictor.max_items,),
+            )
+            evicted += cursor.rowcount
+            await db.commit()
+        return evicted
+
+
+# ------------------------------------------------------------------------------
+# ADK memory service
+# ------------------------------------------------------------------------------
+MEMORIES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    author TEXT,
+    timestamp REAL NOT NULL,
+    content TEXT NOT NULL,
+    words TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS memories_timestamp ON memories (timestamp);
+"""
+
+
+def _words(text: str) -> set[str]:
+    return {word.lower() for word in re.findall(r"[A-Za-z]+", text)}
+
+
+class SqliteMemoryService(BaseMemoryService):
+    """A keyword-matching memory service persisted to SQLite, mirroring
+    `InMemoryMemoryService`. Memories older than `max_age` seconds, or beyond
+    the newest `max_memories`, are evicted."""
+
+    def __init__(self, path: str, pool_size: int = 2, max_memories: int = 100_000,
+                 max_age: float = 30 * 24 * 3600, eviction_interval: float = 300.0):
+        self.pool = SqlitePool(path, size=pool_size, schema=MEMORIES_SCHEMA)
+        self._evictor = _Evictor(max_memories, max_age, eviction_interval)
+
+    async def add_session_to_memory(self, session: Session) -> None:
+        rows = []
+        for event in session.events:
+            if not event.content or not event.content.parts:
+                continue
+            text = " ".join(part.text for part in event.content.parts if part.text)
+            rows.append((session.app_name, session.user_id, session.id, event.id, event.author,
+                         event.timestamp, event.content.model_dump_json(exclude_none=True),
+                         " " + " ".join(sorted(_words(text))) + " "))
+        async with self.pool.connection() as db:
+            await db.execute("DELETE FROM memories WHERE app_name=? AND user_id=? AND session_id=?",
+                             (session.app_name, session.user_id, session.id))
+            await db.executemany("INSERT OR REPLACE INTO memories VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            await db.commit()
+        if self._evictor.due():
+            await self.evict()
+
+    async def search_memory(self, *, app_name: str, user_id: str, query: str) -> SearchMemoryResponse:
+        response = SearchMemoryResponse()
+        query_words = sorted(_words(query))
+        if not query_words:
+            return response
+        # Words are stored space-delimited, so a padded LIKE matches whole words only.
+        match = " OR ".join("words LIKE ?" for _ in query_words)
+        async with self.pool.connection() as db:
+            rows = await db.execute_fetchall(
+                f"SELECT author, timestamp, content FROM memories WHERE app_name=? AND user_id=? AND ({match}) "
+                "ORDER BY timestamp",
+                (app_name, user_id, *(f"% {word} %" for word in query_words)),
+            )
+        for row in rows:
+            response.memories.append(MemoryEntry(
+                content=types.Content.model_validate_json(row["content"]),
+                author=row["author"],
+                timestamp=datetime.fromtimestamp(row["timestamp"]).isoformat(),
+            ))
+        return response
+
+    async def evict(self) -> int:
+        async with self.pool.connection() as db:
+            cursor = await db.execute("DELETE FROM memories WHERE timestamp < ?",
+                                      (time.time() - self._evictor.max_age,))
+            evicted = cursor.rowcount
+            cursor = await db.execute(
+                "DELETE FROM memories WHERE rowid NOT IN "
+                "(SELECT rowid FROM memories ORDER BY timestamp DESC LIMIT ?)",
+                (self._evictor.max_items,),
+            )
+            evicted += cursor.rowcount
+            await db.commit()
+        return evicted
@@ -0,0 +1,173 @@
+# storage_benchmark.py
+"""Compares the in-memory ADK/A2A stores with the SQLite stores in sqlite_stores.py.
+
+Each simulated request does what an agent server does per A2A message: save
+the task, create or load the session, append a user and an agent event, save
+an artifact, and finally reload the task. Requests run with bounded
+concurrency, and the report covers per-operation latency percentiles, overall
+throughput and the Python heap still held once the run is over.
+
+    python storage_benchmark.py --requests 2000 --concurrency 16 --output storage_benchmark.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import Message, Part, Role, Task, TaskState, TaskStatus, TextPart
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.events.event import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types as genai_types
+
+from a2a_utils import percentile
+from sqlite_stores import PooledSqliteSessionService, SqliteArtifactService, SqliteTaskStore
+
+APP_NAME = "benchmark_agent"
+PAYLOAD = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20
+
+
+def build_stores(backend: str, directory: str, max_items: int) -> dict:
+    if backend == "memory":
+        return {
+            "task_store": InMemoryTaskStore(),
+            "session_service": InMemorySessionService(),
+            "artifact_service": InMemoryArtifactService(),
+        }
+    db_path = os.path.join(directory, "benchmark.sqlite3")
+    return {
+        "task_store": SqliteTaskStore(db_path, max_tasks=max_items, eviction_interval=1),
+        "session_service": PooledSqliteSessionService(db_path, max_sessions=max_items, eviction_interval=1),
+        "artifact_service": SqliteArtifactService(db_path, max_artifacts=max_items, eviction_interval=1),
+    }
+
+
+def make_event(author: str, text: str) -> Event:
+    role = "user" if author == "user" else "model"
+    return Event(
+        invocation_id=uuid.uuid4().hex,
+        author=author,
+        content=genai_types.Content(role=role, parts=[genai_types.Part(text=text)]),
+    )
+
+
+async def one_request(stores: dict, request_id: int, sessions: int, timings: dict) -> None:
+    async def timed(name, coro):
+        start = time.perf_counter()
+        result = await coro
+        timings[name].append(time.perf_counter() - start)
+        return result
+
+    # Requests cycle through a fixed set of users/sessions, like follow-up turns.
+    user_id = f"user-{request_id % sessions}"
+    session_id = f"session-{request_id % sessions}"
+    task = Task(
+        id=uuid.uuid4().hex,
+        context_id=session_id,
+        status=TaskStatus(state=TaskState.working),
+        history=[Message(role=Role.user, message_id=uuid.uuid4().hex,
+                         parts=[Part(root=TextPart(text=PAYLOAD))])],
+    )
+    sessions_svc = stores["session_service"]
+    await timed("task_save", stores["task_store"].save(task))
+    session = await timed("session_get", sessions_svc.get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id))
+    if session is None:
+        session = await timed("session_create", sessions_svc.create_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id))
+    await timed("event_append", sessions_svc.append_event(session, make_event("user", PAYLOAD)))
+    await timed("event_append", sessions_svc.append_event(session, make_event(APP_NAME, PAYLOAD)))
+    await timed("artifact_save", stores["artifact_service"].save_artifact(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id,
+        filename="report.md", artifact=genai_types.Part(text=PAYLOAD)))
+    await timed("task_get", stores["task_store"].get(task.id))
+
+
+async def run_backend(backend: str, requests: int, concurrency: int, sessions: int, max_items: int) -> dict:
+    directory = tempfile.mkdtemp(prefix=f"storage-bench-{backend}-")
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        stores = build_stores(backend, directory, max_items)
+        timings = defaultdict(list)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def guarded(request_id):
+            async with semaphore:
+                await one_request(stores, request_id, sessions, timings)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(guarded(i) for i in range(requests)))
+        wall_time = time.perf_counter() - start
+
+        hot_cache = {}
+        if hasattr(stores["session_service"], "hot_hits"):
+            hot_cache = {"hits": stores["session_service"].hot_hits, "misses": stores["session_service"].hot_misses}
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        for store in stores.values():
+            if hasattr(store, "pool"):
+                await store.pool.close()
+        disk_bytes = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "backend": backend,
+        "requests": requests,
+        "wall_time_s": round(wall_time, 3),
+        "requests_per_s": round(requests / wall_time, 1),
+        "retained_heap_mb": round((current - baseline) / 2**20, 2),
+        "peak_heap_mb": round((peak - baseline) / 2**20, 2),
+        "disk_mb": round(disk_bytes / 2**20, 2),
+        "session_hot_cache": hot_cache,
+        "latency_ms": {
+            name: {
+                "p50": round(percentile(values, 50) * 1000, 3),
+                "p95": round(percentile(values, 95) * 1000, 3),
+                "p99": round(percentile(values, 99) * 1000, 3),
+            }
+            for name, values in sorted(timings.items())
+        },
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    results = []
+    for backend in args.backends:
+        print(f"⏱️  Benchmarking '{backend}' stores ({args.requests} requests, concurrency {args.concurrency})...")
+        result = await run_backend(backend, args.requests, args.concurrency, args.sessions, args.max_items)
+        results.append(result)
+        print(f"   {result['requests_per_s']} req/s, "
+              f"{result['retained_heap_mb']} MB heap retained, {result['disk_mb']} MB on disk")
+        for name, stats in result["latency_ms"].items():
+            print(f"   {name:<15} p50 {stats['p50']:8.3f} ms   p95 {stats['p95']:8.3f} ms   p99 {stats['p99']:8.3f} ms")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark in-memory vs SQLite task/session storage.")
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"], choices=["memory", "sqlite"])
+    parser.add_argument("--requests", type=int, default=1000, help="Simulated A2A requests per backend.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once.")
+    parser.add_argument("--sessions", type=int, default=200, help="Distinct sessions the requests cycle through.")
+    parser.add_argument("--max-items", type=int, default=500, help="SQLite eviction bound for tasks, sessions and artifacts.")
+    parser.add_argument("--output", default="storage_benchmark.json", help="Where the JSON report is written.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
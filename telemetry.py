@@ -0,0 +1,427 @@
+# telemetry.py
+"""Per-hop tracing and Prometheus metrics for the agent servers.
+
+Every A2A request gets a W3C `traceparent`: an incoming one is continued, otherwise a
+new trace is started. Spans are recorded for the request itself, every LLM turn,
+every tool call and every call to a remote agent, and the trace context is forwarded
+on outgoing A2A requests so the specialists' spans join the orchestrator's trace.
+
+Finished spans feed latency histograms and a bounded ring buffer of recent spans.
+Each agent app serves them at METRICS_PATH (Prometheus text format) and TRACES_PATH
+(JSON, filterable with `?trace_id=`). Recording a span is a few dict operations
+under a lock, so this stays enabled in production; set TELEMETRY_ENABLED=0 to skip it.
+"""
+import contextvars
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") != "0"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000")) # Recent spans kept per process
+METRICS_PATH = "/metrics"
+TRACES_PATH = "/traces"
+TRACEPARENT_HEADER = "traceparent"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Spans whose "after" callback never fires (e.g. the tool raised) are dropped past this many.
+MAX_OPEN_SPANS = 10_000
+
+
+@dataclass
+class SpanContext:
+    trace_id: str
+    span_id: str
+    # The agent server handling the request; used as the `agent` label.
+    server: str = ""
+
+
+_current_span: contextvars.ContextVar[SpanContext | None] = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str] | None:
+    """Returns (trace_id, parent_span_id) from a W3C traceparent header, or None if it is invalid."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+
+def format_traceparent(span: SpanContext) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def current_span() -> SpanContext | None:
+    return _current_span.get()
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+@dataclass
+class _Metric:
+    name: str
+    kind: str
+    help: str
+    buckets: tuple = ()
+    # label key -> value (counter/gauge) or [bucket counts..., sum, count] (histogram)
+    series: dict = field(default_factory=dict)
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format.
+
+    Every agent in the process shares one registry, so each series carries an
+    `agent` label and `render(agent=...)` only returns that agent's series (plus
+    any series without an `agent` label).
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _metric(self, name: str, kind: str, help: str, buckets: tuple = ()) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = _Metric(name, kind, help, buckets)
+        return metric
+
+    def inc(self, name: str, help: str, labels: dict, amount: float = 1.0) -> None:
+        with self._lock:
+            series = self._metric(name, "counter", help).series
+            key = _label_key(labels)
+            series[key] = series.get(key, 0.0) + amount
+
+    def add(self, name: str, help: str, labels: dict, amount: float) -> None:
+        """Adds `amount` (which may be negative) to a gauge."""
+        with self._lock:
+            series = self._metric(name, "gauge", help).series
+            key = _label_key(labels)
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, help: str, labels: dict, value: float, buckets: tuple = LATENCY_BUCKETS) -> None:
+        with self._lock:
+            metric = self._metric(name, "histogram", help, buckets)
+            key = _label_key(labels)
+            counts = metric.series.get(key)
+            if counts is None:
+                counts = metric.series[key] = [0] * len(metric.buckets) + [0.0, 0]
+            for i, bound in enumerate(metric.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def total(self, name: str, **labels) -> float:
+        """Sums a counter or gauge over every series whose labels include `labels`."""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None or metric.kind == "histogram":
+                return 0.0
+            return sum(value for key, value in metric.series.items() if labels.items() <= dict(key).items())
+
+    def render(self, agent: str | None = None) -> str:
+        lines = []
+        with self._lock:
+            for metric in self._metrics.values():
+                series = {
+                    key: value for key, value in metric.series.items()
+                    if agent is None or dict(key).get("agent", agent) == agent
+                }
+                if not series:
+                    continue
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for key, value in series.items():
+                    if metric.kind != "histogram":
+                        lines.append(f"{metric.name}{_format_labels(key)} {value}")
+                        continue
+                    for bound, count in zip(metric.buckets, value):
+                        lines.append(f"{metric.name}_bucket{_format_labels(key, (('le', str(bound)),))} {count}")
+                    lines.append(f"{metric.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {value[-1]}")
+                    lines.append(f"{metric.name}_sum{_format_labels(key)} {value[-2]}")
+                    lines.append(f"{metric.name}_count{_format_labels(key)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """Records finished spans into a bounded ring buffer and their durations into `metrics`."""
+
+    def __init__(self, metrics: MetricsRegistry, buffer_size: int = TRACE_BUFFER_SIZE):
+        self.metrics = metrics
+        self._spans: deque[dict] = deque(maxlen=buffer_size)
+        # (kind, invocation, key) -> (span, parent, started_at, started_wall)
+        self._open: dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+
+    def start(self, key: tuple, server: str = "") -> SpanContext:
+        """Opens a child span of the current one and makes it current, e.g. so remote calls carry its ID."""
+        parent = _current_span.get()
+        span = SpanContext(
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            server=(parent.server if parent else "") or server,
+        )
+        with self._lock:
+            if len(self._open) >= MAX_OPEN_SPANS:
+                self._open.pop(next(iter(self._open)))
+            self._open[key] = (span, parent, time.perf_counter(), time.time())
+        _current_span.set(span)
+        return span
+
+    def finish(self, key: tuple, name: str, attributes: dict | None = None) -> tuple[SpanContext, float] | None:
+        """Closes the span opened under `key`, restores its parent as current and returns it with its duration."""
+        with self._lock:
+            opened = self._open.pop(key, None)
+        if opened is None:
+            return None
+        span, parent, started, started_wall = opened
+        duration = time.perf_counter() - started
+        _current_span.set(parent)
+        self.record(span, parent, name, started_wall, duration, attributes)
+        return span, duration
+
+    def record(self, span: SpanContext, parent: SpanContext | None, name: str,
+               started_wall: float, duration: float, attributes: dict | None = None) -> None:
+        entry = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": parent.span_id if parent else None,
+            "name": name,
+            "agent": span.server,
+            "start": started_wall,
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if attributes:
+            entry["attributes"] = attributes
+        with self._lock:
+            self._spans.append(entry)
+
+    def spans(self, trace_id: str | None = None, limit: int = 200) -> list[dict]:
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id:
+            spans = [span for span in spans if span["trace_id"] == trace_id]
+        return spans[-limit:]
+
+
+metrics = MetricsRegistry()
+tracer = Tracer(metrics)
+
+
+def _labels(span: SpanContext, **labels) -> dict:
+    return {"agent": span.server, **labels}
+
+
+# --- ADK agent callbacks ---
+# Each pair opens a span in its "before" callback and closes it in the "after" one. The
+# callbacks always return None, so they never change what the agent does.
+
+def before_model(callback_context, llm_request):
+    tracer.start(("llm", callback_context.invocation_id, callback_context.agent_name), callback_context.agent_name)
+
+def after_model(callback_context, llm_response):
+    if getattr(llm_response, "partial", False):
+        return None
+    finished = tracer.finish(("llm", callback_context.invocation_id, callback_context.agent_name),
+                             f"llm:{callback_context.agent_name}")
+    if finished is None:
+        return None
+    span, duration = finished
+    metrics.observe("agent_llm_call_duration_seconds", "Duration of one LLM turn.",
+                    _labels(span, llm_agent=callback_context.agent_name), duration)
+    usage = llm_response.usage_metadata
+    if usage is not None:
+        for kind, count in (("prompt", usage.prompt_token_count), ("completion", usage.candidates_token_count)):
+            if count:
+                metrics.inc("agent_llm_tokens_total", "LLM tokens used.",
+                            _labels(span, llm_agent=callback_context.agent_name, type=kind), count)
+    return None
+
+def before_tool(tool, args, tool_context):
+    tracer.start(("tool", tool_context.invocation_id, tool_context.function_call_id), tool_context.agent_name)
+
+def after_tool(tool, args, tool_context, tool_response):
+    finished = tracer.finish(("tool", tool_context.invocation_id, tool_context.function_call_id),
+                             f"tool:{tool.name}")
+    if finished is not None:
+        span, duration = finished
+        metrics.observe("agent_tool_call_duration_seconds", "Duration of one tool call.",
+                        _labels(span, tool=tool.name), duration)
+    return None
+
+def _finish_remote_call(key: tuple, remote_agent: str) -> None:
+    finished = tracer.finish(key, f"remote:{remote_agent}")
+    if finished is not None:
+        span, duration = finished
+        metrics.observe("agent_remote_call_duration_seconds", "Duration of one call to a remote A2A agent.",
+                        _labels(span, remote_agent=remote_agent), duration)
+
+def before_remote_agent(callback_context):
+    tracer.start(("remote", callback_context.invocation_id, callback_context.agent_name), callback_context.agent_name)
+
+def after_remote_agent(callback_context):
+    _finish_remote_call(("remote", callback_context.invocation_id, callback_context.agent_name),
+                        callback_context.agent_name)
+    return None
+
+@contextmanager
+def remote_call(remote_agent: str):
+    """Records a span for a remote agent call made outside of `RemoteA2aAgent`, e.g. by the pipeline."""
+    key = ("remote", secrets.token_hex(8), remote_agent)
+    tracer.start(key)
+    try:
+        yield
+    finally:
+        _finish_remote_call(key, remote_agent)
+
+
+def append_callback(agent, attribute: str, callback, first: bool = False) -> None:
+    """Adds `callback` to an agent's callback list, after the existing ones unless `first`.
+
+    ADK stops at the first callback that returns a value, so order matters.
+    """
+    existing = getattr(agent, attribute)
+    if existing is None:
+        callbacks = []
+    elif isinstance(existing, list):
+        callbacks = list(existing)
+    else:
+        callbacks = [existing]
+    setattr(agent, attribute, [callback] + callbacks if first else callbacks + [callback])
+
+
+_instrumented_agents: set[int] = set()
+
+def instrument_agent(agent) -> None:
+    """Adds span callbacks for LLM turns and tool calls to `agent`, its sub-agents
+    and, for remote A2A sub-agents, the calls made to them. Safe to call twice."""
+    if not TELEMETRY_ENABLED or id(agent) in _instrumented_agents:
+        return
+    _instrumented_agents.add(id(agent))
+    if hasattr(agent, "before_model_callback"):
+        # "Before" callbacks go last, so a callback that short-circuits the call (e.g. the
+        # pre-router) skips the span too; "after" callbacks go first, so one that replaces
+        # the result (e.g. context compaction) cannot leave the span open.
+        append_callback(agent, "before_model_callback", before_model)
+        append_callback(agent, "after_model_callback", after_model, first=True)
+        append_callback(agent, "before_tool_callback", before_tool)
+        append_callback(agent, "after_tool_callback", after_tool, first=True)
+    for sub_agent in getattr(agent, "sub_agents", []):
+        if type(sub_agent).__name__ == "RemoteA2aAgent":
+            if id(sub_agent) not in _instrumented_agents:
+                _instrumented_agents.add(id(sub_agent))
+                append_callback(sub_agent, "before_agent_callback", before_remote_agent)
+                append_callback(sub_agent, "after_agent_callback", after_remote_agent, first=True)
+        else:
+            instrument_agent(sub_agent)
+
+
+async def inject_trace_headers(request) -> None:
+    """httpx request hook that forwards the current trace to the agent being called."""
+    span = _current_span.get()
+    if span is not None and TELEMETRY_ENABLED:
+        request.headers[TRACEPARENT_HEADER] = format_traceparent(span)
+
+
+class TelemetryMiddleware:
+    """ASGI middleware that opens the root span of every request and counts requests.
+
+    It is a plain ASGI middleware rather than a Starlette `BaseHTTPMiddleware`, so
+    streamed responses are neither buffered nor cut short and the measured
+    duration covers the whole stream.
+    """
+
+    SKIPPED_PATHS = (METRICS_PATH, TRACES_PATH)
+
+    def __init__(self, app, agent_name: str):
+        self.app = app
+        self.agent_name = agent_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.SKIPPED_PATHS or not TELEMETRY_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+        parent = SpanContext(incoming[0], incoming[1], self.agent_name) if incoming else None
+        span = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8), self.agent_name)
+        token = _current_span.set(span)
+        traceparent = format_traceparent(span).encode("latin-1")
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"traceparent", traceparent)]}
+            await send(message)
+
+        in_flight = {"agent": self.agent_name}
+        metrics.add("a2a_requests_in_flight", "A2A requests being handled.", in_flight, 1)
+        started, started_wall = time.perf_counter(), time.time()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            duration = time.perf_counter() - started
+            _current_span.reset(token)
+            metrics.add("a2a_requests_in_flight", "A2A requests being handled.", in_flight, -1)
+            labels = {"agent": self.agent_name, "method": scope["method"], "path": self.route_path(scope)}
+            metrics.inc("a2a_requests_total", "A2A requests handled.", {**labels, "status": str(status)})
+            metrics.observe("a2a_request_duration_seconds", "Duration of an A2A request, including streaming.",
+                            labels, duration)
+            tracer.record(span, parent, f"{scope['method']} {scope['path']}", started_wall, duration,
+                          {"status": status})
+
+    @staticmethod
+    def route_path(scope) -> str:
+        """The matched route's template, so the `path` label cannot grow with every URL a client tries."""
+        # Starlette's router records the matched route in the scope; unmatched paths have none.
+        return getattr(scope.get("route"), "path", None) or "other"
+
+
+def add_telemetry_routes(app, agent_name: str) -> None:
+    """Serves this agent's metrics at METRICS_PATH and recent spans at TRACES_PATH."""
+    from starlette.responses import JSONResponse, PlainTextResponse
+
+    app.add_route(
+        METRICS_PATH,
+        lambda request: PlainTextResponse(metrics.render(agent=agent_name), media_type="text/plain; version=0.0.4"),
+        methods=["GET"],
+    )
+    def traces(request):
+        try:
+            limit = int(request.query_params.get("limit", "200"))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return JSONResponse({"error": "limit must be a positive integer"}, status_code=400)
+        return JSONResponse(tracer.spans(request.query_params.get("trace_id"), limit))
+
+    app.add_route(TRACES_PATH, traces, methods=["GET"])
+    if TELEMETRY_ENABLED:
+        app.add_middleware(TelemetryMiddleware, agent_name=agent_name)
@@ -0,0 +1,31 @@
+# tests/test_a2a_client.py
+import pytest
+
+pytest.importorskip("a2a")
+
+from A2A_client import load_prompts
+
+
+def test_load_prompts_accepts_strings_and_objects(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('"Find agent repos"\n\n{"id": "b", "prompt": "Analyze them", "context_id": "c1"}\n',
+                    encoding="utf-8")
+
+    assert load_prompts(str(path)) == [
+        {"prompt": "Find agent repos", "id": 1},
+        {"id": "b", "prompt": "Analyze them", "context_id": "c1"},
+    ]
+
+
+def test_load_prompts_names_every_invalid_line(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('"ok"\n{"prompt": \n{"id": 3}\n[1, 2]\n', encoding="utf-8")
+
+    with pytest.raises(ValueError) as error:
+        load_prompts(str(path))
+
+    message = str(error.value)
+    assert f"{path}:2: invalid JSON" in message
+    assert f'{path}:3: missing a non-empty "prompt" string' in message
+    assert f"{path}:4: expected a JSON string or object, got list" in message
+    assert f"{path}:1" not in message
@@ -0,0 +1,212 @@
+# tests/test_a2a_utils.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+pytest.importorskip("a2a")
+
+from a2a_utils import A2ASimpleClient, A2ATaskError
+
+AGENT_URL = "http://agent.test/"
+AGENT_CARD = {
+    "name": "Test Agent",
+    "description": "Answers test prompts.",
+    "url": AGENT_URL,
+    "version": "1.0.0",
+    "capabilities": {},
+    "defaultInputModes": ["text"],
+    "defaultOutputModes": ["text"],
+    "skills": [],
+}
+
+
+def task_result(request_id, state: str, text: str) -> dict:
+    task = {"kind": "task", "id": "task-1", "contextId": "context-1", "status": {"state": state}}
+    if state == "completed":
+        task["artifacts"] = [{"artifactId": "answer", "parts": [{"kind": "text", "text": text}]}]
+    else:
+        task["status"]["message"] = {"kind": "message", "messageId": "status", "role": "agent",
+                                     "parts": [{"kind": "text", "text": text}]}
+    return {"jsonrpc": "2.0", "id": request_id, "result": task}
+
+
+def fake_agent(reply, sent: list | None = None) -> A2ASimpleClient:
+    """A client whose HTTP calls for AGENT_URL go to `reply(body)` instead of the network."""
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json=AGENT_CARD)
+        body = json.loads(request.content)
+        if sent is not None:
+            sent.append(body)
+        return reply(body)
+
+    client = A2ASimpleClient()
+    client._http_clients[AGENT_URL] = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    return client
+
+
+def test_metadata_is_sent_with_the_request():
+    sent = []
+    client = fake_agent(lambda body: httpx.Response(200, json=task_result(body["id"], "completed", "done")), sent)
+
+    answer = asyncio.run(client.create_task(AGENT_URL, "Save the plan.", metadata={"action": "save_plan"}))
+
+    assert answer == "done"
+    assert sent[0]["params"]["metadata"] == {"action": "save_plan"}
+
+
+def test_raise_errors_reports_a_failed_task():
+    client = fake_agent(lambda body: httpx.Response(200, json=task_result(body["id"], "failed", "research broke")))
+
+    with pytest.raises(A2ATaskError, match="research broke"):
+        asyncio.run(client.create_task(AGENT_URL, "Research it.", raise_errors=True))
+
+
+def test_errors_are_returned_as_text_by_default():
+    client = fake_agent(lambda body: httpx.Response(
+        200, json={"jsonrpc": "2.0", "id": body["id"], "error": {"code": -32603, "message": "boom"}}))
+
+    answer = asyncio.run(client.create_task(AGENT_URL, "Research it."))
+
+    assert answer.startswith("❌") and "boom" in answer
+
+
+def flaky_agent(failure) -> tuple[A2ASimpleClient, list]:
+    """An agent whose second message/send fails with `failure(body)`; the others succeed."""
+    sent = []
+
+    def reply(body):
+        if len(sent) == 2:
+            return failure(body)
+        return httpx.Response(200, json=task_result(body["id"], "completed", f"answer {len(sent)}"))
+
+    return fake_agent(reply, sent), sent
+
+
+def send_twice(client: A2ASimpleClient) -> str:
+    async def run():
+        await client.create_task(AGENT_URL, "First prompt.")  # caches the card
+        return await client.create_task(AGENT_URL, "Second prompt.")
+
+    return asyncio.run(run())
+
+
+def test_request_that_may_have_reached_the_agent_is_not_sent_again():
+    def read_timeout(body):
+        raise httpx.ReadTimeout("no response")
+
+    client, sent = flaky_agent(read_timeout)
+
+    answer = send_twice(client)
+
+    assert answer.startswith("❌")
+    assert len(sent) == 2
+
+
+def test_request_stopped_by_a_stale_card_is_sent_again():
+    client, sent = flaky_agent(lambda body: httpx.Response(404))
+
+    answer = send_twice(client)
+
+    assert answer == "answer 3"
+    assert [body["params"]["message"]["parts"][0]["text"] for body in sent] == [
+        "First prompt.", "Second prompt.", "Second prompt."]
+
+
+def test_request_that_could_not_connect_is_sent_again():
+    connect_failures = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json=AGENT_CARD)
+        body = json.loads(request.content)
+        if body["params"]["message"]["parts"][0]["text"] == "Second prompt." and not connect_failures:
+            connect_failures.append(body)
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200, json=task_result(body["id"], "completed", "answer"))
+
+    client = A2ASimpleClient()
+    client._http_clients[AGENT_URL] = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+    assert send_twice(client) == "answer"
+    assert len(connect_failures) == 1
+
+
+def sse_reply(events: list[tuple[float, dict]]):
+    """A message/stream reply that sends each (delay, JSON-RPC result or error) as a server-sent event."""
+
+    def reply(body):
+        async def stream():
+            for delay, payload in events:
+                await asyncio.sleep(delay)
+                message = {"jsonrpc": "2.0", "id": body["id"], **payload}
+                yield f"data: {json.dumps(message)}\n\n".encode()
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream())
+
+    return reply
+
+
+def status_update(state: str, text: str = "", final: bool = False) -> dict:
+    status = {"state": state}
+    if text:
+        status["message"] = {"kind": "message", "messageId": f"status-{state}", "role": "agent",
+                             "parts": [{"kind": "text", "text": text}]}
+    return {"result": {"kind": "status-update", "taskId": "task-1", "contextId": "context-1", "status": status,
+                       "final": final}}
+
+
+def artifact_update(text: str, append: bool) -> dict:
+    return {"result": {"kind": "artifact-update", "taskId": "task-1", "contextId": "context-1", "append": append,
+                       "artifact": {"artifactId": "answer", "parts": [{"kind": "text", "text": text}]}}}
+
+
+def collect_stream(client: A2ASimpleClient) -> list:
+    async def run():
+        return [event async for event in client.create_task_stream(AGENT_URL, "Stream it.")]
+
+    return asyncio.run(run())
+
+
+def test_stream_yields_events_in_order_and_assembles_the_answer():
+    client = fake_agent(sse_reply([
+        (0, {"result": {"kind": "task", "id": "task-1", "contextId": "context-1", "status": {"state": "submitted"}}}),
+        (0, status_update("working", "Searching...")),
+        (0.2, artifact_update("Hello ", append=False)),
+        (0, artifact_update("world", append=True)),
+        (0, status_update("completed", final=True)),
+    ]))
+
+    events = collect_stream(client)
+
+    assert [(event.kind, event.state) for event in events] == [
+        ("status", "submitted"), ("status", "working"), ("artifact", "working"), ("artifact", "working"),
+        ("status", "completed"), ("done", "completed")]
+    assert events[1].text == "Searching..."
+    done = events[-1]
+    assert done.text == "Hello world"
+    assert done.time_to_first_event < 0.2 <= done.time_to_first_token <= done.elapsed
+
+
+def test_stream_reports_an_error_event_and_no_done_event():
+    client = fake_agent(sse_reply([
+        (0, status_update("working")),
+        (0, {"error": {"code": -32603, "message": "agent crashed"}}),
+    ]))
+
+    events = collect_stream(client)
+
+    assert [event.kind for event in events] == ["status", "error"]
+    assert "agent crashed" in events[-1].text
+
+
+def test_stream_without_an_answer_is_done_with_empty_text():
+    client = fake_agent(sse_reply([(0, status_update("failed", "research broke", final=True))]))
+
+    events = collect_stream(client)
+
+    assert [(event.kind, event.state) for event in events] == [("status", "failed"), ("done", "failed")]
+    assert events[-1].text == "" and events[-1].time_to_first_token is None
@@ -0,0 +1,68 @@
+# tests/test_admission.py
+import asyncio
+import uuid
+
+import pytest
+
+pytest.importorskip("a2a")
+
+from a2a.server.agent_execution import AgentExecutor
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.types import Message, MessageSendParams, Part, Role, TextPart
+from a2a.utils import new_agent_text_message
+
+from admission import AdmissionController, CoalescingRequestHandler
+
+
+class CountingExecutor(AgentExecutor):
+    def __init__(self):
+        self.runs = 0
+
+    async def execute(self, context, event_queue):
+        self.runs += 1
+        await asyncio.sleep(0.1)
+        await event_queue.enqueue_event(
+            new_agent_text_message(f"run {self.runs}", context.context_id, context.task_id))
+
+    async def cancel(self, context, event_queue):
+        pass
+
+
+def send_params(prompt: str, context_id: str | None = None) -> MessageSendParams:
+    return MessageSendParams(message=Message(
+        role=Role.user, parts=[Part(root=TextPart(text=prompt))], message_id=uuid.uuid4().hex, context_id=context_id))
+
+
+def send_all(*params: MessageSendParams) -> tuple[int, list]:
+    executor = CountingExecutor()
+    handler = CoalescingRequestHandler(executor, InMemoryTaskStore(), agent_name="test_agent",
+                                       admission=AdmissionController("test_agent", max_in_flight=0))
+
+    async def run():
+        return await asyncio.gather(*(handler.on_message_send(p) for p in params))
+
+    replies = asyncio.run(run())
+    return executor.runs, replies
+
+
+def test_same_prompt_in_different_conversations_runs_separately():
+    runs, replies = send_all(send_params("Find agent repos", "conversation-a"),
+                             send_params("find  agent repos", "conversation-b"))
+
+    assert runs == 2
+    assert {reply.context_id for reply in replies} == {"conversation-a", "conversation-b"}
+
+
+def test_retry_in_the_same_conversation_is_coalesced():
+    runs, replies = send_all(send_params("Find agent repos", "conversation-a"),
+                             send_params("Find agent repos", "conversation-a"))
+
+    assert runs == 1
+    assert replies[0] == replies[1]
+
+
+def test_prompts_without_a_conversation_are_coalesced():
+    runs, replies = send_all(send_params("Find agent repos"), send_params("FIND agent repos"))
+
+    assert runs == 1
+    assert replies[0].context_id == replies[1].context_id
@@ -0,0 +1,89 @@
+# tests/test_agent_launcher.py
+import sys
+
+import pytest
+
+import agent_launcher
+from agent_launcher import AgentProcessSpec, AgentSupervisor
+
+
+class CrashingSpec(AgentProcessSpec):
+    """A spec whose process exits with code 3 right away."""
+
+    def command(self, drain_timeout: float) -> list[str]:
+        return [sys.executable, "-c", "raise SystemExit(3)"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(agent_launcher.time, "monotonic", clock)
+    return clock
+
+
+def crash_and_poll(supervisor: AgentSupervisor, name: str) -> None:
+    supervisor.processes[name].wait()
+    supervisor.poll()
+
+
+def test_command_imports_the_app_from_app_dir():
+    spec = AgentProcessSpec("Scout", "demo:create_scout_app", 10001, app_dir="/srv/agents")
+
+    command = spec.command(drain_timeout=5)
+
+    assert command[command.index("--app-dir") + 1] == "/srv/agents"
+    assert "--app-dir" not in AgentProcessSpec("Scout", "demo:create_scout_app", 10001).command(5)
+
+
+def test_crashed_agent_is_restarted_with_exponential_backoff(clock):
+    supervisor = AgentSupervisor([CrashingSpec("Scout", "unused", 0)], max_restarts=5)
+    supervisor._start(supervisor.specs[0])
+    delays = []
+    for _ in range(3):
+        first = supervisor.processes["Scout"]
+        crash_and_poll(supervisor, "Scout")
+        delays.append(supervisor._next_start["Scout"] - clock.now)
+        clock.now += delays[-1] - 0.1
+        supervisor.poll()
+        assert supervisor.processes["Scout"] is first  # not restarted before the delay is up
+        clock.now += 0.1
+        supervisor.poll()
+        assert supervisor.processes["Scout"] is not first
+
+    supervisor.processes["Scout"].wait()
+    assert delays == [1, 2, 4]
+
+
+def test_agent_crashing_too_often_is_given_up_on(clock):
+    supervisor = AgentSupervisor([CrashingSpec("Scout", "unused", 0)], max_restarts=2, restart_window=60)
+    supervisor._start(supervisor.specs[0])
+    for _ in range(2):
+        crash_and_poll(supervisor, "Scout")
+        clock.now = supervisor._next_start["Scout"]
+        supervisor.poll()
+
+    crash_and_poll(supervisor, "Scout")
+
+    assert supervisor.has_failed("Scout")
+    assert "Scout" not in supervisor._next_start
+
+
+def test_crashes_outside_the_restart_window_are_forgotten(clock):
+    supervisor = AgentSupervisor([CrashingSpec("Scout", "unused", 0)], max_restarts=2, restart_window=60)
+    supervisor._start(supervisor.specs[0])
+    for _ in range(4):
+        crash_and_poll(supervisor, "Scout")
+        assert supervisor._next_start["Scout"] - clock.now == 1
+        clock.now += 61
+        supervisor.poll()
+
+    supervisor.processes["Scout"].wait()
+    assert not supervisor.has_failed("Scout")
@@ -0,0 +1,50 @@
+# tests/test_artifact_store.py
+import asyncio
+import os
+import time
+
+import pytest
+
+from artifact_store import ArtifactStore
+
+
+def test_namespaces_do_not_see_each_other(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+
+    async def run():
+        await store.save("alice", "repository_list.md", "alice's list")
+        assert await store.read("alice", "repository_list.md") == "alice's list"
+        with pytest.raises(FileNotFoundError):
+            await store.read("bob", "repository_list.md")
+
+    asyncio.run(run())
+
+
+def test_evict_removes_expired_namespaces_and_their_blobs(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_age=3600)
+
+    async def run():
+        old = await store.save("old", "plan.md", "old plan")
+        await store.save("old", "shared.md", "same content")
+        await store.save("new", "shared.md", "same content")
+        await store.save("new", "other.md", "fresh")
+        await store.save("new", "plan.md", "new plan")
+        an_hour_ago = time.time() - 7200
+        os.utime(os.path.join(str(tmp_path), "old"), (an_hour_ago, an_hour_ago))
+        os.utime(os.path.join(str(tmp_path), ".blobs", old.digest[:2], old.digest), (an_hour_ago, an_hour_ago))
+
+        assert await store.evict() == 3
+        assert not os.path.exists(os.path.join(str(tmp_path), "old"))
+        assert not os.path.exists(os.path.join(str(tmp_path), ".blobs", old.digest[:2], old.digest))
+        assert await store.read("new", "shared.md") == "same content"
+        assert await store.read("new", "plan.md") == "new plan"
+
+    asyncio.run(run())
+
+
+def test_saves_stay_inside_their_namespace(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+
+    asyncio.run(store.save("alice", "repository_list.md", "alice's list"))
+
+    assert sorted(os.listdir(str(tmp_path))) == [".blobs", "alice"]
@@ -0,0 +1,80 @@
+# tests/test_cache_utils.py
+import asyncio
+import json
+
+import pytest
+
+import cache_utils
+from cache_utils import TTLCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache_utils.time, "time", clock)
+    return clock
+
+
+def test_normalize_query_ignores_case_and_spacing():
+    assert normalize_query("  LangChain \t Competitors\n") == normalize_query("langchain competitors") == "langchain competitors"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(ttl=60)
+    cache.set("q", ["result"])
+
+    clock.now += 59
+    assert cache.get("q") == ["result"]
+    clock.now += 2
+    assert cache.get("q") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_dropped_beyond_maxsize():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_persisted_entries_are_shared_and_still_expire(tmp_path, clock):
+    path = str(tmp_path / "cache" / "tavily.db")
+    TTLCache(ttl=60, path=path).set("q", {"results": [1, 2]})
+
+    other_process = TTLCache(ttl=60, path=path)
+    assert other_process.get("q") == {"results": [1, 2]}
+    clock.now += 61
+    assert TTLCache(ttl=60, path=path).get("q") is None
+
+
+def test_tavily_batch_searches_each_normalized_query_once(monkeypatch):
+    pytest.importorskip("google.adk")
+    import A2A_github_demo_simplified as demo
+    from fake_tavily import FakeTavilyClient
+
+    fake_tavily = FakeTavilyClient(latency=0)
+    monkeypatch.setattr(demo, "TAVILY_API_KEY", "fake")
+    monkeypatch.setattr(demo, "_tavily_client", fake_tavily)
+    monkeypatch.setattr(demo, "tavily_cache", TTLCache(ttl=60))
+
+    async def run():
+        first = await demo.tavily_search_batch(["LangChain  competitors", "langchain competitors", " ", "langchain pricing"])
+        again = await demo.tavily_search_batch(["langchain COMPETITORS"])
+        return json.loads(first), json.loads(again)
+
+    first, again = asyncio.run(run())
+
+    assert len(first) == 2 and all(isinstance(results, list) for results in first.values())
+    assert list(again.values()) == [first["langchain competitors"]]
+    assert fake_tavily.calls == 2
@@ -0,0 +1,49 @@
+# tests/test_context_compaction.py
+import json
+
+from context_compaction import ContextCompactor, estimate_tokens
+
+
+def search_results(query: str, count: int, content_chars: int = 2000) -> list[dict]:
+    return [
+        {"title": f"{query} {rank}", "url": f"https://example.com/{query}/{rank}", "content": "word " * (content_chars // 5),
+         "score": 1.0 / rank, "raw_content": "x" * content_chars}
+        for rank in range(1, count + 1)
+    ]
+
+
+def test_results_are_projected_to_title_url_and_snippet():
+    compactor = ContextCompactor({"tavily_search": 1000}, snippet_chars=100)
+
+    compacted = json.loads(compactor.compact("tavily_search", {"query": "q"}, json.dumps(search_results("q", 2)), "inv"))
+
+    assert [set(result) for result in compacted] == [{"title", "url", "snippet"}] * 2
+    assert all(len(result["snippet"]) <= 101 for result in compacted)
+
+
+def test_results_shown_earlier_in_the_invocation_are_omitted():
+    compactor = ContextCompactor({"tavily_search": 1000, "tavily_search_batch": 1000}, snippet_chars=50)
+    output = json.dumps(search_results("q", 3))
+
+    first = compactor.compact("tavily_search", {"query": "q"}, output, "inv")
+    again = compactor.compact("tavily_search_batch", {}, json.dumps({"other": search_results("q", 3)}), "inv")
+    elsewhere = compactor.compact("tavily_search", {"query": "q"}, output, "another-inv")
+
+    assert len(json.loads(first)) == 3
+    assert again.startswith('{"other": []}') and "(3 results already shown above were omitted)" in again
+    assert elsewhere == first
+
+
+def test_budget_trims_results_and_trimmed_results_are_shown_later():
+    compactor = ContextCompactor({"tavily_search": 150}, snippet_chars=300)
+    output = json.dumps(search_results("q", 5))
+
+    first = compactor.compact("tavily_search", {"query": "q"}, output, "inv")
+    second = compactor.compact("tavily_search", {"query": "q"}, output, "inv")
+
+    assert estimate_tokens(first) <= 150
+    shown_first = [result["url"] for result in json.loads(first)]
+    assert 0 < len(shown_first) < 5
+    second_results = json.loads(second.split("\n(")[0])
+    assert second_results and not {result["url"] for result in second_results} & set(shown_first)
+    assert f"({len(shown_first)} results already shown above were omitted)" in second
@@ -0,0 +1,99 @@
+# tests/test_mcp_pool.py
+import asyncio
+import json
+import os
+import signal
+import sys
+
+import pytest
+
+pytest.importorskip("mcp")
+pytest.importorskip("google.adk")
+
+from mcp import StdioServerParameters
+
+from mcp_pool import McpSessionPool
+
+FAKE_SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fake_github_mcp_server.py")
+
+
+def fake_server_pool(**kwargs) -> McpSessionPool:
+    params = StdioServerParameters(command=sys.executable, args=[FAKE_SERVER], env={"PATH": os.environ["PATH"]})
+    return McpSessionPool(params, timeout=30, **kwargs)
+
+
+async def server_pid(session) -> int:
+    result = await session.call_tool("search_repositories", arguments={"query": "mcp pool"})
+    return json.loads(result.content[0].text)["pid"]
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=60))
+
+
+def test_leased_session_is_returned_and_reused():
+    async def check():
+        pool = fake_server_pool(min_size=1, max_size=2, health_check_interval=0)
+        try:
+            await pool.start()
+            async with pool.lease() as session:
+                first = await server_pid(session)
+                assert pool.stats["leased"] == 1
+            async with pool.lease() as session:
+                assert await server_pid(session) == first
+            assert pool.stats == {"size": 1, "idle": 1, "leased": 0, "created": 1, "recycled": 0}
+        finally:
+            await pool.close()
+
+    run(check())
+
+
+def test_concurrent_leases_get_their_own_server_up_to_max_size():
+    async def check():
+        pool = fake_server_pool(min_size=1, max_size=2, health_check_interval=0)
+        try:
+            async with pool.lease() as a, pool.lease() as b:
+                assert await server_pid(a) != await server_pid(b)
+                assert pool.stats["leased"] == 2
+        finally:
+            await pool.close()
+
+    run(check())
+
+
+def test_dead_idle_server_is_evicted_and_replaced():
+    async def check():
+        pool = fake_server_pool(min_size=1, max_size=1, health_check_interval=0.2)
+        try:
+            await pool.start()
+            async with pool.lease() as session:
+                dead = await server_pid(session)
+            os.kill(dead, signal.SIGKILL)
+            while pool.stats["recycled"] < 1 or pool.stats["idle"] < 1:
+                await asyncio.sleep(0.1)
+            async with pool.lease() as session:
+                assert await server_pid(session) != dead
+            assert pool.stats["created"] == 2
+        finally:
+            await pool.close()
+
+    run(check())
+
+
+def test_close_also_stops_leased_sessions():
+    def alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+    async def check():
+        pool = fake_server_pool(min_size=1, max_size=2, health_check_interval=0)
+        async with pool.lease() as session:
+            pid = await server_pid(session)
+            await pool.close()
+            assert not alive(pid)
+        assert pool.stats["size"] == 0
+
+    run(check())
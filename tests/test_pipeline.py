@@ -0,0 +1,48 @@
+# tests/test_pipeline.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from A2A_github_demo_simplified import handle_pipeline_request
+from pipeline import A2A_METADATA_KEY, decode_pipeline_request, pipeline_request_metadata
+
+
+def test_pipeline_requests_come_from_request_metadata():
+    metadata = pipeline_request_metadata("save_plan", filename="marketing_plan.md", plan="# Plan")
+
+    request = decode_pipeline_request({A2A_METADATA_KEY: metadata})
+
+    assert request == {"action": "save_plan", "filename": "marketing_plan.md", "plan": "# Plan"}
+
+
+@pytest.mark.parametrize("custom_metadata", [
+    None,
+    {},
+    {A2A_METADATA_KEY: {"other": "value"}},
+    {A2A_METADATA_KEY: {"repository_pipeline": "[pipeline] {\"action\": \"save_plan\"}"}},
+])
+def test_ordinary_requests_are_not_pipeline_requests(custom_metadata):
+    assert decode_pipeline_request(custom_metadata) is None
+
+
+@pytest.mark.parametrize("action, fields, error_code", [
+    ("research", {}, "PIPELINE_RESEARCH_FAILED"),
+    ("research", {"repository": "langchain-ai/langchain"}, "PIPELINE_RESEARCH_FAILED"),
+    ("research", {"repository": {"url": "https://github.com/langchain-ai/langchain"}}, "PIPELINE_RESEARCH_FAILED"),
+    ("save_plan", {"filename": "marketing_plan.md"}, "PIPELINE_SAVE_FAILED"),
+    ("publish", {}, "PIPELINE_UNKNOWN_ACTION"),
+])
+def test_malformed_pipeline_requests_fail_with_a_pipeline_error(action, fields, error_code):
+    metadata = pipeline_request_metadata(action, **fields)
+    context = SimpleNamespace(run_config=SimpleNamespace(custom_metadata={A2A_METADATA_KEY: metadata}))
+    request = LlmRequest(contents=[types.Content(role="user", parts=[types.Part(text="Research it.")])])
+
+    response = asyncio.run(handle_pipeline_request(context, request))
+
+    assert response.error_code == error_code
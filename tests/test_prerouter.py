@@ -0,0 +1,55 @@
+# tests/test_prerouter.py
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from prerouter import ANALYST, PIPELINE, SCOUT, PreRouter
+
+
+@pytest.fixture
+def router() -> PreRouter:
+    return PreRouter(agents=[SCOUT, ANALYST, PIPELINE])
+
+
+@pytest.mark.parametrize("prompt, agent", [
+    ("Find the top 5 'ai agent application' repos and save the list.", SCOUT),
+    ("Now, analyze the repositories from the saved list and create the final report.", ANALYST),
+    ("Find the top 5 'ai agent application' repos and create a marketing plan for them.", PIPELINE),
+    ("Find the top 5 LLM observability repos and analyze their business potential.", PIPELINE),
+])
+def test_clear_prompts_are_routed_locally(router, prompt, agent):
+    assert router.route(prompt).agent == agent
+
+
+def test_search_mentioning_a_report_is_not_sent_to_the_pipeline(router):
+    # "report tools" is what to search for, not a request for a report.
+    assert router.route("Search for vector database and report tools").agent != PIPELINE
+
+
+def _routing_turn(router: PreRouter, invocation_id: str, prompt: str, llm_seconds: float = 0.0) -> None:
+    """Runs the router's callbacks around one orchestrator routing turn; the LLM is only "called" if needed."""
+    content = types.Content(role="user", parts=[types.Part(text=prompt)])
+    context = SimpleNamespace(invocation_id=invocation_id, user_content=content)
+    if router.before_model_callback(context, SimpleNamespace(contents=[content])) is None:
+        time.sleep(llm_seconds)
+        call = types.FunctionCall(name="transfer_to_agent", args={"agent_name": SCOUT})
+        router.after_model_callback(context, LlmResponse(content=types.Content(role="model", parts=[
+            types.Part(function_call=call)])))
+
+
+def test_latency_saved_is_only_reported_from_measured_llm_routing(router):
+    _routing_turn(router, "1", "Find the top 5 vector database repos.")
+    assert router.stats["rule_hits"] == 1
+    assert router.stats["average_llm_routing_latency_s"] is None
+    assert router.stats["latency_saved_s"] is None
+
+    _routing_turn(router, "2", "Hello there", llm_seconds=0.05)
+    assert router.stats["llm_fallbacks"] == 1
+    assert router.stats["average_llm_routing_latency_s"] >= 0.05
+    assert 0.0 < router.stats["latency_saved_s"] <= router.stats["average_llm_routing_latency_s"]
@@ -0,0 +1,40 @@
+# tests/test_rate_limited_llm.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from google.adk.agents import Agent
+from google.adk.models.registry import LLMRegistry
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from fake_gemini import FakeGeminiLlm
+from rate_limited_llm import RateLimitedLlm
+from rate_limits import RateLimiter
+
+LLMRegistry.register(FakeGeminiLlm)
+
+
+def test_sub_agent_gets_the_only_slot_while_its_parent_transfers():
+    # The parent's transfer_to_agent runs the sub-agent's model call while the
+    # parent's model generator is paused at its yield; holding the one slot
+    # across that yield would deadlock.
+    limiter = RateLimiter("gemini", max_concurrency=1)
+    scout = Agent(name="github_repository_scout", model=RateLimitedLlm(model="fake-gemini", limiter=limiter),
+                  instruction="Find repositories.")
+    lead = Agent(name="team_lead_agent", model=RateLimitedLlm(model="fake-gemini", limiter=limiter),
+                 instruction="Delegate.", sub_agents=[scout])
+    runner = InMemoryRunner(agent=lead)
+
+    async def run():
+        session = await runner.session_service.create_session(app_name=runner.app_name, user_id="user")
+        message = types.Content(role="user", parts=[types.Part(text="Find the top 5 agent repos.")])
+        return [event async for event in runner.run_async(user_id="user", session_id=session.id, new_message=message)]
+
+    events = asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+    assert any(event.author == "github_repository_scout" and event.content and event.content.parts[0].text
+               for event in events)
+    assert limiter.stats["in_flight"] == 0
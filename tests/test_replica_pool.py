@@ -0,0 +1,130 @@
+# tests/test_replica_pool.py
+import asyncio
+import json
+from collections import Counter
+
+import httpx
+import pytest
+
+from replica_pool import LoadBalancingTransport, ReplicaPool
+
+SCOUT_URL, ANALYST_URL = "http://localhost:10001/", "http://localhost:10002/"
+SCOUT_REPLICA, ANALYST_REPLICA = "http://localhost:10011/", "http://localhost:10012/"
+
+
+class Replicas:
+    """Stands in for two replicas of the scout and two of the analyst, recording which port served each request."""
+
+    def __init__(self):
+        self.served: list[int] = []
+        self.failing: set[int] = set()
+        self.contexts = 0
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        port = request.url.port
+        self.served.append(port)
+        if port in self.failing:
+            return httpx.Response(500)
+        message = json.loads(request.content)["params"]["message"]
+        context_id = message.get("contextId")
+        if context_id is None:
+            self.contexts += 1
+            context_id = f"context-{self.contexts}"
+        return httpx.Response(200, json={"result": {"kind": "task", "id": f"task-{port}", "contextId": context_id}})
+
+
+def balanced_client(replicas: Replicas) -> tuple[httpx.AsyncClient, list[ReplicaPool]]:
+    pools = [
+        ReplicaPool("github_repository_scout", SCOUT_URL, [SCOUT_REPLICA], health_interval=0, failure_threshold=2),
+        ReplicaPool("github_repository_analyst", ANALYST_URL, [ANALYST_REPLICA], health_interval=0, failure_threshold=2),
+    ]
+    transport = LoadBalancingTransport(pools, httpx.MockTransport(replicas.handle))
+    return httpx.AsyncClient(transport=transport), pools
+
+
+def send(client: httpx.AsyncClient, url: str, context_id: str | None = None):
+    message = {"role": "user", "parts": [{"kind": "text", "text": "hi"}], "messageId": "m"}
+    if context_id:
+        message["contextId"] = context_id
+    return client.post(url, json={"jsonrpc": "2.0", "id": 1, "method": "message/send", "params": {"message": message}})
+
+
+def test_requests_are_spread_over_both_replicas_of_each_role():
+    replicas = Replicas()
+
+    async def run():
+        client, _ = balanced_client(replicas)
+        async with client:
+            for url in (SCOUT_URL, ANALYST_URL):
+                # While one request is still streaming, the next goes to the idle replica.
+                request = client.build_request("POST", url, json={"params": {"message": {}}})
+                first = await client.send(request, stream=True)
+                await send(client, url)
+                await first.aclose()
+
+    asyncio.run(run())
+
+    assert Counter(replicas.served) == {10001: 1, 10011: 1, 10002: 1, 10012: 1}
+
+
+def test_follow_up_in_the_same_context_goes_to_the_same_replica():
+    replicas = Replicas()
+
+    async def run():
+        client, _ = balanced_client(replicas)
+        async with client:
+            context_id = (await send(client, SCOUT_URL)).json()["result"]["contextId"]
+            for _ in range(10):
+                await send(client, SCOUT_URL, context_id)
+
+    asyncio.run(run())
+
+    assert len(set(replicas.served)) == 1
+
+
+def test_ejected_replica_stops_receiving_requests():
+    replicas = Replicas()
+    replicas.failing.add(10011)
+
+    async def run():
+        client, pools = balanced_client(replicas)
+        async with client:
+            while pools[0].stats["replicas"][1]["ejections"] == 0:
+                await send(client, SCOUT_URL)
+            replicas.served.clear()
+            for _ in range(10):
+                assert (await send(client, SCOUT_URL)).status_code == 200
+
+    asyncio.run(run())
+
+    assert replicas.served == [10001] * 10
+
+
+def test_closing_the_client_stops_the_health_checks():
+    pytest.importorskip("a2a")
+    from a2a_utils import A2ASimpleClient
+
+    async def run():
+        pool = ReplicaPool("orchestrator", "http://localhost:10000/", ["http://localhost:10010/"], health_interval=60)
+        async with A2ASimpleClient(replica_pools=[pool]):
+            pool.ensure_health_checks()
+            health_task = pool._health_task
+        await asyncio.sleep(0)
+        return health_task
+
+    assert asyncio.run(run()).cancelled()
+
+
+def test_replica_serving_another_agent_is_unhealthy():
+    def cards(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"name": "GitHub Analyst" if request.url.port == 10001 else "GitHub Scout"})
+
+    pool = ReplicaPool("github_repository_scout", SCOUT_URL, [SCOUT_REPLICA], expected_card_name="GitHub Scout")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(cards)) as client:
+            await pool.check_health(client)
+
+    asyncio.run(run())
+
+    assert [replica["healthy"] for replica in pool.stats["replicas"]] == [False, True]
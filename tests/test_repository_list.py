@@ -0,0 +1,46 @@
+# tests/test_repository_list.py
+import pytest
+
+pytest.importorskip("google.adk")
+
+from A2A_github_demo_simplified import parse_repository_list
+
+NUMBERED_WITH_LINKED_DESCRIPTION = """# Top 3 LLM framework repositories
+
+1. **langchain**
+   - URL: https://github.com/langchain-ai/langchain
+   - Description: Build context-aware agents; pairs with https://github.com/langchain-ai/langgraph for orchestration.
+2. **llama_index**
+   - URL: https://github.com/run-llama/llama_index
+   - Description: A data framework for LLM apps.
+3. **autogen**
+   - URL: https://github.com/microsoft/autogen
+   - Description: Multi-agent conversations, successor to https://github.com/microsoft/FLAML's agent module.
+"""
+
+BULLETS_WITH_LINKS_ON_THE_HEADER_LINE = """- [crewAI](https://github.com/crewAIInc/crewAI): role-playing agents, compare https://github.com/microsoft/autogen
+- [haystack](https://github.com/deepset-ai/haystack): pipelines for search and RAG
+"""
+
+
+def test_links_in_descriptions_stay_in_their_entry():
+    entries = parse_repository_list(NUMBERED_WITH_LINKED_DESCRIPTION)
+
+    assert [entry["name"] for entry in entries] == ["langchain-ai/langchain", "run-llama/llama_index", "microsoft/autogen"]
+    assert "langchain-ai/langgraph" in entries[0]["entry"]
+    assert entries[0]["entry"].startswith("1. **langchain**") and "Description:" in entries[0]["entry"]
+
+
+def test_primary_repository_is_the_first_link_on_the_header_line():
+    entries = parse_repository_list(BULLETS_WITH_LINKS_ON_THE_HEADER_LINE)
+
+    assert [entry["url"] for entry in entries] == [
+        "https://github.com/crewAIInc/crewAI", "https://github.com/deepset-ai/haystack"]
+    assert "microsoft/autogen" in entries[0]["entry"]
+
+
+def test_unstructured_list_falls_back_to_one_line_per_repository():
+    entries = parse_repository_list("Found https://github.com/a/one and\nalso https://github.com/b/two.git.")
+
+    assert [(entry["name"], entry["entry"]) for entry in entries] == [
+        ("a/one", "Found https://github.com/a/one and"), ("b/two", "also https://github.com/b/two.git.")]
@@ -0,0 +1,129 @@
+# tests/test_sqlite_stores.py
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("a2a")
+pytest.importorskip("google.adk")
+
+from a2a.types import Task, TaskState, TaskStatus
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+from google.genai import types
+
+from sqlite_stores import PooledSqliteSessionService, SqlitePool, SqliteTaskStore
+
+
+def task(task_id: str) -> Task:
+    return Task(id=task_id, context_id="context", status=TaskStatus(state=TaskState.completed))
+
+
+def user_event(text: str, state_delta: dict | None = None) -> Event:
+    return Event(author="user", invocation_id="invocation",
+                 content=types.Content(role="user", parts=[types.Part(text=text)]),
+                 actions=EventActions(state_delta=state_delta or {}))
+
+
+def test_task_store_evicts_beyond_max_tasks_and_max_age(tmp_path):
+    store = SqliteTaskStore(str(tmp_path / "tasks.db"), max_tasks=2, max_age=3600, eviction_interval=3600)
+
+    async def run():
+        for task_id in ("a", "b", "c", "d"):
+            await store.save(task(task_id))
+        async with store.pool.connection() as db:
+            await db.execute("UPDATE tasks SET update_time = ? WHERE id = 'd'", (time.time() - 7200,))
+            await db.commit()
+        evicted = await store.evict()
+        kept = [task_id for task_id in "abcd" if await store.get(task_id) is not None]
+        await store.pool.close()
+        return evicted, kept
+
+    evicted, kept = asyncio.run(run())
+
+    # "d" is too old; of the rest only the two most recently updated are kept.
+    assert evicted == 2
+    assert kept == ["b", "c"]
+
+
+def test_session_service_evicts_old_and_surplus_sessions(tmp_path):
+    service = PooledSqliteSessionService(str(tmp_path / "sessions.db"), max_sessions=1, max_age=3600,
+                                         eviction_interval=3600)
+
+    async def run():
+        for session_id in ("old", "older", "new"):
+            await service.create_session(app_name="app", user_id="user", session_id=session_id)
+            await asyncio.sleep(0.01)
+        evicted = await service.evict()
+        found = [session_id for session_id in ("old", "older", "new")
+                 if await service.get_session(app_name="app", user_id="user", session_id=session_id)]
+        await service.pool.close()
+        return evicted, found
+
+    evicted, found = asyncio.run(run())
+
+    assert evicted == 2
+    assert found == ["new"]
+
+
+def test_hot_cache_serves_unchanged_sessions_and_drops_shared_state(tmp_path):
+    service = PooledSqliteSessionService(str(tmp_path / "sessions.db"))
+
+    async def run():
+        first = await service.create_session(app_name="app", user_id="user", session_id="one")
+        await service.create_session(app_name="app", user_id="user", session_id="two")
+        await service.get_session(app_name="app", user_id="user", session_id="one")
+        hits = service.hot_hits
+        await service.append_event(first, user_event("hi", {"app:theme": "dark"}))
+        cached_after_shared_write = set(service._hot)
+        await service.delete_session(app_name="app", user_id="user", session_id="one")
+        await service.pool.close()
+        return hits, cached_after_shared_write, set(service._hot)
+
+    hits, cached_after_shared_write, cached_after_delete = asyncio.run(run())
+
+    assert hits == 1
+    # App state is shared, so every other cached session is dropped; only the written one is re-cached.
+    assert cached_after_shared_write == {("app", "user", "one")}
+    assert cached_after_delete == set()
+
+
+def test_sessions_written_by_another_worker_are_not_served_stale(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = PooledSqliteSessionService(path), PooledSqliteSessionService(path)
+
+    async def run():
+        await worker_a.create_session(app_name="app", user_id="user", session_id="shared")
+        await worker_a.get_session(app_name="app", user_id="user", session_id="shared")
+        await asyncio.sleep(0.01)
+        session = await worker_b.get_session(app_name="app", user_id="user", session_id="shared")
+        await worker_b.append_event(session, user_event("written by worker b"))
+        seen_by_a = await worker_a.get_session(app_name="app", user_id="user", session_id="shared")
+        await worker_b.delete_session(app_name="app", user_id="user", session_id="shared")
+        deleted = await worker_a.get_session(app_name="app", user_id="user", session_id="shared")
+        await worker_a.pool.close()
+        await worker_b.pool.close()
+        return seen_by_a, deleted
+
+    seen_by_a, deleted = asyncio.run(run())
+
+    assert [event.content.parts[0].text for event in seen_by_a.events] == ["written by worker b"]
+    assert deleted is None
+
+
+def test_pool_close_also_closes_checked_out_connections(tmp_path):
+    pool = SqlitePool(str(tmp_path / "pool.db"), size=2)
+
+    async def run():
+        async with pool.connection() as idle:
+            pass
+        async with pool.connection() as leased:
+            async with pool.connection() as other:
+                await pool.close()
+        return idle, leased, other
+
+    connections = asyncio.run(run())
+
+    assert len({id(db) for db in connections}) == 2
+    assert all(db._connection is None for db in connections)
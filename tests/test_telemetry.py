@@ -0,0 +1,50 @@
+# tests/test_telemetry.py
+import pytest
+
+pytest.importorskip("starlette")
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
+
+import telemetry
+from telemetry import TRACES_PATH, add_telemetry_routes, metrics
+
+pytestmark = pytest.mark.skipif(not telemetry.TELEMETRY_ENABLED, reason="TELEMETRY_ENABLED=0")
+
+
+def agent_app(agent_name: str) -> TestClient:
+    app = Starlette()
+    app.add_route("/tasks/{task_id}", lambda request: PlainTextResponse("ok"), methods=["GET"])
+    add_telemetry_routes(app, agent_name)
+    return TestClient(app)
+
+
+def test_request_metrics_are_labelled_by_route_template():
+    client = agent_app("route-label-agent")
+
+    for path in ("/tasks/1", "/tasks/2", "/no/such/path", "/another/unknown/path"):
+        client.get(path)
+
+    requests = lambda path: metrics.total("a2a_requests_total", agent="route-label-agent", path=path)
+    assert requests("/tasks/{task_id}") == 2
+    assert requests("other") == 2
+    assert requests("/tasks/1") == 0
+
+
+@pytest.mark.parametrize("limit", ["abc", "0", "-5"])
+def test_traces_reject_an_invalid_limit(limit):
+    response = agent_app("traces-agent").get(TRACES_PATH, params={"limit": limit})
+
+    assert response.status_code == 400
+
+
+def test_traces_return_at_most_limit_spans():
+    client = agent_app("traces-agent")
+    for _ in range(3):
+        client.get("/tasks/1")
+
+    response = client.get(TRACES_PATH, params={"limit": "2"})
+
+    assert response.status_code == 200
+    assert len(response.json()) == 2